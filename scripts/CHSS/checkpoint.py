@@ -0,0 +1,125 @@
+'''
+Per-city checkpoint for incremental CHSS updates (extract_rm2_tm2.py --incremental).
+
+For every city the checkpoint records a fingerprint of its boundaries (plus the zonal settings) and,
+per (variable, month) slice already in the Parquet store, the fingerprint of the NetCDF file it was
+reduced from (the catalog SHA-256, or size + mtime without a catalog). plan() compares that with the
+files on disk and returns only the files and cities that need reducing: new months, re-downloaded
+files, and every slice of a city whose boundaries changed. The checkpoint is saved after the store
+partitions are written, so an interrupted update is simply redone on the next run.
+
+Stored as <parquet root>/_chss_checkpoint.json (the leading underscore keeps pyarrow from reading it
+as data).
+'''
+
+import os
+import json
+import hashlib
+
+from era5_io import FILE_PATTERN, month_range
+
+
+CHECKPOINT_NAME = "_chss_checkpoint.json"
+
+
+def file_fingerprint(path, record=None):
+    if record and "sha256" in record:
+        return record["sha256"]
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def file_months(path, record=None):
+    """"YYYY-MM" months a file covers: its catalog time range, else the month in its name."""
+    if record and "time_start" in record:
+        start = tuple(int(part) for part in record["time_start"][:7].split("-"))
+        end = tuple(int(part) for part in record["time_end"][:7].split("-"))
+        return [f"{y}-{m:02d}" for y, m in month_range(start, end)]
+    match = FILE_PATTERN.match(path.name)
+    return [f"{match.group('year')}-{match.group('month')}"] if match else []
+
+
+def zone_fingerprint(city_zones, settings):
+    digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode())
+    for zone in sorted(city_zones, key=lambda z: z["shapefile"]):
+        digest.update(zone["shapefile"].encode())
+        digest.update(zone["geometry"].wkb)
+    return digest.hexdigest()
+
+
+class Checkpoint:
+    def __init__(self, root):
+        self.path = os.path.join(root, CHECKPOINT_NAME)
+        self.cities = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                self.cities = json.load(f).get("cities", {})
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"cities": self.cities}, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def plan(self, nc_files, zones, settings, records=None):
+        """
+        What an incremental run has to reduce, as a dict:
+            files    {var: [paths]} with at least one stale slice for some city
+            cities   cities to reduce them for
+            rebuild  cities whose boundaries/settings changed (all their slices are stale again)
+            slices   {var: set of "YYYY-MM"} re-reduced by this run
+            months   {file name: "YYYY-MM" months it covers} of those files
+            prints   {"var|YYYY-MM": fingerprint} of every slice on disk
+            zones    {city: zone fingerprint}
+        records: catalog entries by file name (era5_catalog.py), for checksums and time ranges.
+        """
+        records = records or {}
+        prints, slice_files = {}, {}
+        for var, paths in nc_files.items():
+            for path in paths:
+                record = records.get(path.name)
+                fingerprint = file_fingerprint(path, record)
+                for month in file_months(path, record):
+                    # a month downloaded as several request areas is one slice made of all its files
+                    key = f"{var}|{month}"
+                    prints[key] = f"{prints[key]}+{fingerprint}" if key in prints else fingerprint
+                    slice_files.setdefault(key, []).append((var, path))
+
+        by_city = {}
+        for zone in zones:
+            by_city.setdefault(zone["city"], []).append(zone)
+        zone_prints = {city: zone_fingerprint(city_zones, settings) for city, city_zones in by_city.items()}
+
+        stale, rebuild = set(), set()
+        cities = set()
+        for city, fingerprint in zone_prints.items():
+            entry = self.cities.get(city)
+            if entry is None or entry["zones"] != fingerprint:
+                rebuild.add(city)
+                city_stale = set(prints)
+            else:
+                city_stale = {key for key, value in prints.items() if entry["slices"].get(key) != value}
+            if city_stale:
+                cities.add(city)
+                stale |= city_stale
+
+        files = {}
+        for key in sorted(stale):
+            for var, path in slice_files[key]:
+                if path not in files.setdefault(var, []):
+                    files[var].append(path)
+        months = {path.name: file_months(path, records.get(path.name)) for paths in files.values() for path in paths}
+        slices = {var: {month for path in paths for month in months[path.name]} for var, paths in files.items()}
+        return {"files": files, "cities": cities, "rebuild": rebuild, "slices": slices, "months": months,
+                "prints": prints, "zones": zone_prints}
+
+    def commit(self, plan):
+        """Record the slices of plan as reduced for its cities (call after the store is written)."""
+        done = {f"{var}|{month}": plan["prints"][f"{var}|{month}"]
+                for var, months in plan["slices"].items() for month in months if f"{var}|{month}" in plan["prints"]}
+        for city in plan["cities"]:
+            entry = self.cities.get(city)
+            if entry is None or city in plan["rebuild"]:
+                entry = self.cities[city] = {"zones": plan["zones"][city], "slices": {}}
+            entry["slices"].update(done)
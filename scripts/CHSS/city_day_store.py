@@ -0,0 +1,147 @@
+'''
+Wide city-day table for the CHSS extraction.
+
+The extractor writes each (zones x days) block of means straight into preallocated float arrays
+(one per variable) and the final wide table (city, shapefile, date, d2m, t2m) is written ONCE:
+as Parquet partitioned by city and year, with the old per-city CSV as an optional export.
+This replaces the long one-row-per-day/variable CSV and the pivot.py pass over it.
+
+Parquet layout (hive partitioning, readable with pd.read_parquet(root) or pyarrow.dataset):
+    root/city=<city>/year=<year>/data.parquet
+'''
+
+import os
+
+import numpy as np
+import pandas as pd
+
+
+VARIABLE_ORDER = ["d2m", "t2m"]  # alphabetical, same column order pivot.py produced
+PARTITION_FILE = "data.parquet"
+
+
+class CityDayTable:
+    """Preallocated (variable x zone x day) arrays for a fixed date range."""
+
+    def __init__(self, zones, start, end, variables=VARIABLE_ORDER):
+        self.zones = [(z["city"], z["shapefile"]) for z in zones]
+        self.zone_index = {zone: i for i, zone in enumerate(self.zones)}
+        self.variables = list(variables)
+        self.dates = pd.date_range(start, end, freq="D")
+        self.start = self.dates[0].to_datetime64().astype("datetime64[D]")
+        self.values = np.full((len(self.variables), len(self.zones), len(self.dates)), np.nan, dtype="float64")
+
+    def put(self, weights, var, times, means):
+        """Store a (zones, time) block of means reduced with `weights` (any subset of the zones)."""
+        days = (np.asarray(times).astype("datetime64[D]") - self.start).astype("int64")
+        in_range = (days >= 0) & (days < len(self.dates))
+        rows = np.array([self.zone_index[zone] for zone in weights.zones], dtype="int64")
+        v = self.variables.index(var)
+        # NaN means (zones outside this file's request area) never overwrite values from another file
+        index = np.ix_(rows, days[in_range])
+        block = means[:, in_range]
+        self.values[v][index] = np.where(np.isnan(block), self.values[v][index], block)
+
+    def to_frame(self):
+        """Wide table; days with no valid value for any variable are dropped (as before)."""
+        n_zones, n_days = len(self.zones), len(self.dates)
+        frame = pd.DataFrame({
+            "city": np.repeat(np.array([z[0] for z in self.zones], dtype=object), n_days),
+            "shapefile": np.repeat(np.array([z[1] for z in self.zones], dtype=object), n_days),
+            "date": np.tile(self.dates.values, n_zones),
+        })
+        for v, var in enumerate(self.variables):
+            frame[var] = self.values[v].ravel()
+        frame = frame[frame[self.variables].notna().any(axis=1)]
+        return frame.sort_values(["city", "shapefile", "date"], kind="stable").reset_index(drop=True)
+
+
+def partition_path(root, city, year):
+    return os.path.join(root, f"city={city}", f"year={year}", PARTITION_FILE)
+
+
+def write_partition(part, path):
+    """Write one city/year partition atomically (temp file + replace)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    part.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def write_parquet(frame, root):
+    """Write the wide table as Parquet partitioned by city/year. Returns the partitions written."""
+    written = []
+    years = frame["date"].dt.year
+    for (city, year), part in frame.groupby([frame["city"], years], sort=True):
+        path = partition_path(root, city, year)
+        write_partition(part.drop(columns=["city"]), path)
+        written.append(path)
+    return written
+
+
+def merge_partition(old, new, slices):
+    """
+    old with the (variable, month) slices replaced by new's values. Rows are (shapefile, date); a day
+    that ends up with no value for any variable is dropped.
+    """
+    key = ["shapefile", "date"]
+    old = old.set_index(key)
+    new = new.set_index(key)
+    index = old.index.union(new.index)
+    merged = old.reindex(index)
+    fresh = new.reindex(index)
+    months = index.get_level_values("date").to_period("M").astype(str)
+    for var, var_months in slices.items():
+        if var not in merged.columns:
+            merged[var] = np.nan
+        replace = months.isin(sorted(var_months))
+        values = fresh[var].to_numpy() if var in fresh.columns else np.full(len(index), np.nan)
+        merged.loc[replace, var] = values[replace]
+    variables = [c for c in merged.columns if c in VARIABLE_ORDER] or list(merged.columns)
+    merged = merged[merged[variables].notna().any(axis=1)]
+    return merged.reset_index().sort_values(key, kind="stable").reset_index(drop=True)
+
+
+def update_parquet(frame, root, shapefiles, slices):
+    """
+    Incremental write: for each city of shapefiles ({city: current shapefile names}) and each year of
+    the re-reduced months, replace the (variable, month) slices of its stored partition with frame's
+    values and keep everything else; rows of shapefiles the city no longer has are dropped. Each
+    partition is rewritten atomically. Returns the partitions written.
+    """
+    years = sorted({int(month[:4]) for months in slices.values() for month in months})
+    frame_years = frame["date"].dt.year
+    written = []
+    for city, city_shapefiles in sorted(shapefiles.items()):
+        for year in years:
+            path = partition_path(root, city, year)
+            part = frame[(frame["city"] == city) & (frame_years == year)].drop(columns=["city"])
+            if os.path.exists(path):
+                old = pd.read_parquet(path)
+                old["date"] = pd.to_datetime(old["date"])
+                part = merge_partition(old[old["shapefile"].isin(sorted(city_shapefiles))], part, slices)
+            if len(part):
+                write_partition(part, path)
+                written.append(path)
+            elif os.path.exists(path):
+                os.remove(path)
+    return written
+
+
+def read_city(root, city):
+    """Full stored series of one city (all years), as written by write_parquet."""
+    frame = pd.read_parquet(os.path.join(root, f"city={city}"))
+    frame = frame.drop(columns=[c for c in ("year",) if c in frame.columns])
+    frame.insert(0, "city", city)
+    return frame.sort_values(["shapefile", "date"], kind="stable").reset_index(drop=True)
+
+
+def write_csv(frame, folder, suffix="_daily_valuesx.csv"):
+    """Optional export: one wide CSV per city (city, shapefile, date, d2m, t2m)."""
+    os.makedirs(folder, exist_ok=True)
+    written = []
+    for city, part in frame.groupby("city", sort=True):
+        path = os.path.join(folder, f"{city}{suffix}")
+        part.to_csv(path, index=False)
+        written.append(path)
+    return written
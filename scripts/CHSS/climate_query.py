@@ -0,0 +1,205 @@
+'''
+Query layer over the per-city daily climate store written by extract_rm2_tm2.py / heat_stress.py
+(Parquet partitioned as root/city=<city>/year=<year>/data.parquet, see city_day_store.py).
+
+Every query goes through pyarrow.dataset with the filters pushed down: the city list and the years of
+the date range prune whole partitions before anything is opened, the date range is checked against
+the row-group statistics, and only the columns the query needs are read. Nothing reloads a full
+per-city CSV/Excel file.
+
+    store = ClimateStore(parquet_folder)
+    store.select(["Athens", "Cairo"], "2024-06", "2024-08", ["t2m"])
+    store.hot_days("t2m", 35, start="2024", end="2024")     # days above 35 °C per city
+    store.monthly_means(["t2m", "d2m"], cities=["Athens"])
+    store.percentiles("t2m", [50, 95, 99], start="2024-06", end="2024-08")
+
+CLI (same queries, printed or saved with --output .csv/.xlsx/.parquet):
+    python climate_query.py hot-days --var t2m --threshold 35 --cities Athens Cairo --start 2024-06 --end 2024-08
+    python climate_query.py monthly --var t2m d2m --start 2024
+    python climate_query.py percentiles --var t2m --q 50 95 99
+    python climate_query.py ingest city_daily_csv   # load old *_daily_valuesx.csv exports into the store
+'''
+
+import os
+import glob
+import argparse
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from city_day_store import write_parquet
+
+
+# Configuration (Update paths as needed)
+parquet_folder = r"D:\Downloads\Programming\Python\NASA Space Apps\heat_risk_dataextraction\city_daily_parquet"
+
+# ERA5 temperatures are stored in Kelvin; thresholds are given in °C and converted for these columns
+KELVIN_COLUMNS = {"t2m", "d2m"}
+KELVIN_OFFSET = 273.15
+
+GROUP_KEYS = ["city", "shapefile"]
+
+
+def parse_day(value, end=False):
+    """'2024', '2024-06' or '2024-06-15' -> Timestamp; with end=True, the last day of the year/month."""
+    if value is None:
+        return None
+    value = str(value)
+    day = pd.Timestamp(value)
+    if end and len(value) == 4:
+        return day + pd.offsets.YearEnd(0)
+    if end and len(value) == 7:
+        return day + pd.offsets.MonthEnd(0)
+    return day
+
+
+class ClimateStore:
+    def __init__(self, root=parquet_folder):
+        self.root = root
+        self.refresh()
+
+    def refresh(self):
+        """Re-discover the partitions (after new data was written)."""
+        self.dataset = ds.dataset(self.root, format="parquet", partitioning="hive")
+        self.schema = self.dataset.schema
+
+    def cities(self):
+        return sorted(os.path.basename(p).split("=", 1)[1] for p in glob.glob(os.path.join(self.root, "city=*")))
+
+    def columns(self):
+        return [name for name in self.schema.names if name not in ("city", "year", "date", "shapefile")]
+
+    def filter(self, cities=None, start=None, end=None):
+        """Partition filter (city, year) plus a row filter on date; None = no restriction."""
+        expr = None
+
+        def both(a, b):
+            return b if a is None else a & b
+
+        if cities:
+            expr = both(expr, ds.field("city").isin(list(cities)))
+        start, end = parse_day(start), parse_day(end, end=True)
+        date_type = self.schema.field("date").type
+        if start is not None:
+            expr = both(expr, ds.field("year") >= start.year)
+            expr = both(expr, ds.field("date") >= pa.scalar(start.to_datetime64(), type=date_type))
+        if end is not None:
+            expr = both(expr, ds.field("year") <= end.year)
+            expr = both(expr, ds.field("date") <= pa.scalar(end.to_datetime64(), type=date_type))
+        return expr
+
+    def scan(self, columns, cities=None, start=None, end=None, extra=None):
+        """Arrow table of GROUP_KEYS + date + columns for the selection; extra is an additional row filter."""
+        expr = self.filter(cities, start, end)
+        if extra is not None:
+            expr = extra if expr is None else expr & extra
+        wanted = list(dict.fromkeys(GROUP_KEYS + ["date"] + list(columns)))
+        return self.dataset.to_table(columns=wanted, filter=expr)
+
+    def select(self, cities=None, start=None, end=None, columns=None):
+        """City-day rows (city, shapefile, date, columns) for the cities and date range."""
+        table = self.scan(columns or self.columns(), cities, start, end)
+        return table.to_pandas().sort_values(GROUP_KEYS + ["date"], kind="stable").reset_index(drop=True)
+
+    def threshold_value(self, var, threshold_c):
+        return threshold_c + KELVIN_OFFSET if var in KELVIN_COLUMNS else threshold_c
+
+    def hot_days(self, var, threshold_c, cities=None, start=None, end=None):
+        """Days with var above threshold_c (°C) per city/shapefile; the comparison is pushed into the scan."""
+        hot = ds.field(var) > self.threshold_value(var, threshold_c)
+        counts = self.scan([], cities, start, end, extra=hot).group_by(GROUP_KEYS).aggregate([("date", "count")])
+        days = self.scan([var], cities, start, end, extra=ds.field(var).is_valid()) \
+            .group_by(GROUP_KEYS).aggregate([("date", "count")])
+        out = days.to_pandas().rename(columns={"date_count": "days"}).merge(
+            counts.to_pandas().rename(columns={"date_count": "hot_days"}), on=GROUP_KEYS, how="left")
+        out["hot_days"] = out["hot_days"].fillna(0).astype("int64")
+        out["hot_day_pct"] = (100 * out["hot_days"] / out["days"]).round(2)
+        out["threshold_c"] = threshold_c
+        return out.sort_values(GROUP_KEYS).reset_index(drop=True)[GROUP_KEYS + ["threshold_c", "hot_days", "days", "hot_day_pct"]]
+
+    def monthly_means(self, variables, cities=None, start=None, end=None, celsius=True):
+        """Mean of each variable per city/shapefile and calendar month (Kelvin columns in °C by default)."""
+        frame = self.scan(variables, cities, start, end).to_pandas()
+        frame["month"] = frame["date"].dt.to_period("M").astype(str)
+        out = frame.groupby(GROUP_KEYS + ["month"], sort=True)[list(variables)].mean().reset_index()
+        if celsius:
+            for var in set(variables) & KELVIN_COLUMNS:
+                out[var] = out[var] - KELVIN_OFFSET
+        return out
+
+    def percentiles(self, var, q=(50, 90, 95, 99), cities=None, start=None, end=None, celsius=True):
+        """Percentiles of var's daily values per city/shapefile over the date range."""
+        frame = self.scan([var], cities, start, end, extra=ds.field(var).is_valid()).to_pandas()
+        values = frame[var] - KELVIN_OFFSET if celsius and var in KELVIN_COLUMNS else frame[var]
+        out = values.groupby([frame[k] for k in GROUP_KEYS], sort=True) \
+            .quantile(np.asarray(q, dtype="float64") / 100).unstack()
+        out.columns = [f"{var}_p{p:g}" for p in q]
+        return out.reset_index()
+
+
+def ingest_csv(folder, root, pattern="*_daily_valuesx.csv"):
+    """Load wide per-city CSV exports (city, shapefile, date, d2m, t2m) into the Parquet store."""
+    written = []
+    for path in sorted(glob.glob(os.path.join(folder, pattern))):
+        frame = pd.read_csv(path, parse_dates=["date"])
+        written += write_parquet(frame, root)
+    return written
+
+
+def save(frame, output):
+    ext = os.path.splitext(output)[1].lower()
+    if ext == ".csv":
+        frame.to_csv(output, index=False)
+    elif ext == ".parquet":
+        frame.to_parquet(output, index=False)
+    else:
+        frame.to_excel(output, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the per-city daily climate Parquet store.")
+    parser.add_argument("command", choices=["select", "hot-days", "monthly", "percentiles", "cities", "ingest"])
+    parser.add_argument("path", nargs="?", help="ingest: folder with the per-city CSV exports")
+    parser.add_argument("--root", default=parquet_folder, help="Parquet store (default %(default)s)")
+    parser.add_argument("--cities", nargs="+")
+    parser.add_argument("--start", help="YYYY, YYYY-MM or YYYY-MM-DD")
+    parser.add_argument("--end", help="YYYY, YYYY-MM or YYYY-MM-DD (inclusive)")
+    parser.add_argument("--var", nargs="+", default=["t2m"])
+    parser.add_argument("--threshold", type=float, default=35.0, help="hot-days threshold in °C (default %(default)s)")
+    parser.add_argument("--q", nargs="+", type=float, default=[50, 90, 95, 99], help="Percentiles")
+    parser.add_argument("--kelvin", action="store_true", help="Report t2m/d2m in Kelvin, as stored")
+    parser.add_argument("--output", help="Save the result (.csv, .xlsx or .parquet)")
+    args = parser.parse_args()
+
+    if args.command == "ingest":
+        if not args.path:
+            parser.error("ingest needs the CSV folder")
+        written = ingest_csv(args.path, args.root)
+        print(f"Wrote {len(written)} partitions under {args.root}")
+        return
+
+    store = ClimateStore(args.root)
+    if args.command == "cities":
+        print("\n".join(store.cities()))
+        return
+    if args.command == "select":
+        result = store.select(args.cities, args.start, args.end, args.var)
+    elif args.command == "hot-days":
+        result = pd.concat([store.hot_days(var, args.threshold, args.cities, args.start, args.end).assign(variable=var)
+                            for var in args.var], ignore_index=True)
+    elif args.command == "monthly":
+        result = store.monthly_means(args.var, args.cities, args.start, args.end, celsius=not args.kelvin)
+    else:
+        result = pd.concat([store.percentiles(var, args.q, args.cities, args.start, args.end, celsius=not args.kelvin)
+                            .set_index(GROUP_KEYS) for var in args.var], axis=1).reset_index()
+
+    print(result.to_string(index=False) if len(result) <= 200 else result)
+    if args.output:
+        save(result, args.output)
+        print(f"\nSaved {len(result)} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
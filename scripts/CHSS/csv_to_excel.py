@@ -1,43 +1,199 @@
-import pandas as pd
+'''
+Excel deliverables for the per-city daily CHSS values.
+
+Rows are streamed into openpyxl write-only workbooks, so memory stays at about one parsed city no
+matter how many cities or days are exported, and dates/floats are written as real Excel dates and
+numbers. CSV parsing runs on a small thread pool a few files ahead of the writer.
+
+Modes:
+    per-city  one .xlsx next to each CSV (the original behaviour)
+    sheets    one workbook, one sheet per city
+    combined  one workbook, every city on one sheet (continued on "<sheet> 2" past Excel's row limit)
+
+Usage:
+    python csv_to_excel.py --mode sheets --output CHSS_daily.xlsx
+    python csv_to_excel.py --mode combined --parquet "<city_daily_parquet>" --output CHSS_daily.xlsx
+'''
+
 import os
+import re
+import math
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+
+
+# Configuration (Update paths as needed)
 # Folder with your CSV files (one per city)
 input_folder = r"D:\Downloads\Programming\Python\NASA Space Apps\heat_risk_dataextraction\city_daily_csv"
+output_path = os.path.join(input_folder, "CHSS_daily_values.xlsx")
+
+EXCEL_MAX_ROWS = 1048576
+DATE_FORMAT = "yyyy-mm-dd"
+FLOAT_FORMAT = "0.000"
+
+
+def read_city_csv(path):
+    frame = pd.read_csv(path)
+    if "date" in frame.columns:
+        frame["date"] = pd.to_datetime(frame["date"], errors="coerce")
+    return frame
+
+
+def parse_ahead(paths, workers):
+    """Yield (path, frame or exception) in order, parsing up to `workers` files ahead of the consumer."""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        paths = iter(paths)
+        for path in paths:
+            pending.append((path, pool.submit(read_city_csv, path)))
+            if len(pending) >= workers:
+                break
+        while pending:
+            path, future = pending.popleft()
+            next_path = next(paths, None)
+            if next_path is not None:
+                pending.append((next_path, pool.submit(read_city_csv, next_path)))
+            try:
+                yield path, future.result()
+            except Exception as e:
+                yield path, e
+
+
+def parquet_cities(root):
+    """(city, frame) per city of the Parquet store, one city read at a time."""
+    from climate_query import ClimateStore
+
+    store = ClimateStore(root)
+    for city in store.cities():
+        yield city, store.select([city])  # city, shapefile, date, ... (select() keeps the city column)
+
+
+def sheet_title(name, used):
+    """Valid, unique Excel sheet title (max 31 chars, no []:*?/\\)."""
+    base = re.sub(r"[\[\]:*?/\\]", "_", str(name))[:31] or "Sheet"
+    title, i = base, 2
+    while title.lower() in used:
+        suffix = f" {i}"
+        title, i = base[:31 - len(suffix)] + suffix, i + 1
+    used.add(title.lower())
+    return title
+
+
+class StreamingSheet:
+    """Append-only sheet of a write-only workbook with typed date/float cells."""
+
+    def __init__(self, workbook, title, columns, used_titles):
+        self.workbook = workbook
+        self.title = title
+        self.used_titles = used_titles
+        self.columns = list(columns)
+        self.part = 1
+        self.rows = 0
+        self._new_sheet(title)
+
+    def _new_sheet(self, title):
+        self.sheet = self.workbook.create_sheet(title)
+        self.sheet.append(self.columns)
+        self.rows = 1
+
+    def append_frame(self, frame):
+        frame = frame.reindex(columns=self.columns)
+        kinds = ["date" if pd.api.types.is_datetime64_any_dtype(frame[c]) else
+                 "float" if pd.api.types.is_float_dtype(frame[c]) else "other" for c in self.columns]
+        for values in frame.itertuples(index=False, name=None):
+            if self.rows >= EXCEL_MAX_ROWS:
+                self.part += 1
+                self._new_sheet(sheet_title(f"{self.title} {self.part}", self.used_titles))
+            self.sheet.append([self.cell(value, kind) for value, kind in zip(values, kinds)])
+            self.rows += 1
+
+    def cell(self, value, kind):
+        if value is None or (isinstance(value, float) and math.isnan(value)) or value is pd.NaT:
+            return None
+        if kind == "date":
+            cell = WriteOnlyCell(self.sheet, value=value.to_pydatetime())
+            cell.number_format = DATE_FORMAT
+            return cell
+        if kind == "float":
+            cell = WriteOnlyCell(self.sheet, value=float(value))
+            cell.number_format = FLOAT_FORMAT
+            return cell
+        return value.item() if hasattr(value, "item") else value
+
+
+def export(sources, mode, output=None):
+    """
+    Write the (name, frame or exception) sources. Returns the files written.
+    per-city writes <name>.xlsx next to each source; sheets/combined write one workbook to output.
+    """
+    written = []
+    workbook = Workbook(write_only=True) if mode != "per-city" else None
+    used = set()
+    combined = None
+    for source, frame in sources:
+        name = source.stem if isinstance(source, Path) else str(source)
+        if isinstance(frame, Exception):
+            print(f"  Error reading {name}: {frame}")
+            continue
+        if mode == "per-city":
+            city_book, city_used = Workbook(write_only=True), set()
+            StreamingSheet(city_book, sheet_title(name, city_used), frame.columns, city_used).append_frame(frame)
+            path = source.with_suffix(".xlsx")
+            city_book.save(path)
+            written.append(str(path))
+        elif mode == "sheets":
+            StreamingSheet(workbook, sheet_title(name, used), frame.columns, used).append_frame(frame)
+        else:
+            if combined is None:
+                combined = StreamingSheet(workbook, sheet_title("CHSS daily", used), frame.columns, used)
+            combined.append_frame(frame)
+        date_info = f", {frame['date'].min().date()} to {frame['date'].max().date()}" \
+            if "date" in frame.columns and frame["date"].notna().any() else ""
+        print(f"  {name}: {len(frame)} rows{date_info}")
+
+    if workbook is not None:
+        if not used:
+            print("Nothing to write.")
+            return written
+        workbook.save(output)
+        written.append(output)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the per-city daily CHSS values to Excel.")
+    parser.add_argument("--input", default=input_folder, help="Folder with the per-city CSV files")
+    parser.add_argument("--parquet", help="Read the cities from this Parquet store instead of the CSVs")
+    parser.add_argument("--mode", choices=["per-city", "sheets", "combined"], default="per-city")
+    parser.add_argument("--output", default=output_path, help="Workbook for --mode sheets/combined")
+    parser.add_argument("--workers", type=int, default=4, help="CSV files parsed ahead in parallel")
+    args = parser.parse_args()
+
+    if args.parquet:
+        if args.mode == "per-city":
+            parser.error("--parquet needs --mode sheets or combined")
+        sources = parquet_cities(args.parquet)
+        print(f"Reading cities from {args.parquet}")
+    else:
+        if not os.path.exists(args.input):
+            print(f"Error: Folder '{args.input}' does not exist. Check the path.")
+            exit(1)
+        csv_files = sorted(Path(args.input).glob("*.csv"))
+        print(f"Found {len(csv_files)} CSV files in {args.input}\n")
+        if len(csv_files) == 0:
+            print("No CSV files found. Exiting.")
+            exit(1)
+        sources = parse_ahead(csv_files, max(args.workers, 1))
+
+    written = export(sources, args.mode, args.output)
+    print(f"\nConversion complete! Wrote {len(written)} workbook(s)" + (f": {written[0]}" if len(written) == 1 else "."))
+
 
-# Ensure the folder exists
-if not os.path.exists(input_folder):
-    print(f"Error: Folder '{input_folder}' does not exist. Check the path.")
-    exit(1)
-
-print(f"Scanning for CSV files in: {input_folder}")
-csv_files = list(Path(input_folder).glob("*.csv"))
-print(f"Found {len(csv_files)} CSV files to convert.\n")
-
-if len(csv_files) == 0:
-    print("No CSV files found. Exiting.")
-    exit(1)
-
-# Loop through each CSV and convert to XLSX
-for csv_file in csv_files:
-
-    print(f"Processing {csv_file.name}...")
-    try:
-        # Read the CSV
-        df = pd.read_csv(csv_file)
-        
-        # Create output path: same name but .xlsx extension, in same folder
-        output_path = csv_file.with_suffix('.xlsx')  # e.g., Berlin_daily_values.csv -> Berlin_daily_values.xlsx
-        
-        # Save as Excel (overwrites if exists)
-        df.to_excel(output_path, index=False, engine='openpyxl')
-        
-        print(f"  Converted {len(df)} rows to {output_path.name}")
-        print(f"  Columns: {list(df.columns)}")
-        print(f"  Date range (if applicable): {df['date'].min() if 'date' in df.columns else 'N/A'} to {df['date'].max() if 'date' in df.columns else 'N/A'}\n")
-        
-    except Exception as e:
-        print(f"  Error converting {csv_file.name}: {e}")
-        print("  Skipping this file.\n")
-
-print("Conversion complete! Check the input folder for .xlsx files.")
+if __name__ == "__main__":
+    main()
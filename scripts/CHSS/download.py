@@ -1,19 +1,330 @@
-import cdsapi
+'''
+ERA5-Land daily statistics downloader (CDS).
+
+Plans one request per (year, month) and cluster of nearby cities, over the union of that cluster's
+padded city bboxes (snapped to the 0.1 degree ERA5-Land grid) instead of the full 55/-75/-25/125 box,
+submits them concurrently with bounded parallelism and retry/backoff, skips months already present
+and verified, and records every finished file in a manifest so interrupted runs resume.
+
+Run with --stub to exercise the scheduling against a local fake of the CDS client (no network).
+'''
+
+import os
+import json
+import math
+import time
+import random
+import hashlib
+import tempfile
+import zipfile
+import argparse
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 dataset = "derived-era5-land-daily-statistics"
-client = cdsapi.Client()
-
-months = [f"{m:02d}" for m in range(1, 13)]
-for month in months:
-    request = {
-        "variable": ["2m_dewpoint_temperature", "2m_temperature"],
-        "year": "2024",
-        "month": month,
-        "day": [f"{d:02d}" for d in range(1, 32)],
-        "daily_statistic": "daily_mean",
-        "time_zone": "utc+00:00",
-        "area": [55, -75, -25, 125]  
-    }
-    outfile = f"era5_land_2024_{month}.nc"
-    print(f"Downloading {month} -> {outfile}")
-    client.retrieve(dataset, request).download(outfile)
+
+# Configuration (Update paths as needed)
+cities_folder = r"D:\Downloads\Programming\Python\NASA Space Apps\city_shape_files\cities"
+download_folder = r"D:\Downloads\Programming\Python\NASA Space Apps\heat_risk_dataextraction\era5-land-nc"
+
+MANIFEST_NAME = "download_manifest.json"
+
+# --stub runs never write into download_folder: their fake zips go here unless --folder says otherwise
+STUB_FOLDER = os.path.join(tempfile.gettempdir(), "era5_land_stub")
+
+# Degrees added around every city bbox, and the grid the area is snapped to
+PAD_DEGREES = 0.5
+GRID_STEP = 0.1
+
+# Fallback area (N, W, S, E) when no city boundaries are available, or when the city clusters
+# together would cover as much as it
+DEFAULT_AREA = [55, -75, -25, 125]
+
+# City bboxes closer than this (degrees, after padding) share one request area; at most MAX_AREAS
+# areas are requested per month
+CLUSTER_GAP_DEGREES = 2.0
+MAX_AREAS = 8
+
+# Requests in flight at once (CDS queues per user, so keep this small) and retry policy
+MAX_PARALLEL = 4
+RETRIES = 5
+BACKOFF_SECONDS = 30
+
+
+def snap_area(bounds, step=GRID_STEP):
+    """(min_x, min_y, max_x, max_y) -> CDS area [N, W, S, E] snapped outward to the grid."""
+    def snap(value, up):
+        return round((math.ceil if up else math.floor)(round(value / step, 6)) * step, 4)
+
+    min_x, min_y, max_x, max_y = bounds
+    return [min(snap(max_y, True), 90), max(snap(min_x, False), -180),
+            max(snap(min_y, False), -90), min(snap(max_x, True), 180)]
+
+
+def area_size(area):
+    north, west, south, east = area
+    return max(north - south, 0) * max(east - west, 0)
+
+
+def cluster_bounds(bounds, gap=CLUSTER_GAP_DEGREES):
+    """Single-linkage clusters of (min_x, min_y, max_x, max_y) boxes less than `gap` degrees apart, as union boxes."""
+    clusters = [list(b) for b in bounds]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(clusters)):
+            for j in range(i + 1, len(clusters)):
+                a, b = clusters[i], clusters[j]
+                if a[0] - gap <= b[2] and b[0] - gap <= a[2] and a[1] - gap <= b[3] and b[1] - gap <= a[3]:
+                    clusters[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del clusters[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return sorted(clusters)
+
+
+def plan_areas(bounds, pad=PAD_DEGREES, step=GRID_STEP, gap=CLUSTER_GAP_DEGREES, max_areas=MAX_AREAS):
+    """
+    CDS areas [N, W, S, E], one per cluster of nearby city bboxes (each padded by `pad` degrees and
+    snapped outward to the grid). Past max_areas clusters the gap is doubled until they fit; if the
+    clusters together cover as much as DEFAULT_AREA, that one area is requested instead.
+    """
+    padded = [(b[0] - pad, b[1] - pad, b[2] + pad, b[3] + pad) for b in bounds]
+    if not padded:
+        return [DEFAULT_AREA]
+    clusters = cluster_bounds(padded, gap)
+    while len(clusters) > max_areas:
+        gap = gap * 2 if gap > 0 else step
+        clusters = cluster_bounds(clusters, gap)
+    areas = [snap_area(c, step) for c in clusters]
+    if sum(area_size(a) for a in areas) >= area_size(DEFAULT_AREA):
+        return [DEFAULT_AREA]
+    return areas
+
+
+def city_bounds(cities_folder):
+    """(min_x, min_y, max_x, max_y) of every city boundary in cities_folder."""
+    from zonal_engine import load_city_zones  # geopandas is only needed when planning from boundaries
+
+    return [z["bounds"] for z in load_city_zones(cities_folder, verbose=False)]
+
+
+def plan_requests(years, months, areas):
+    """One job per (year, month, area); with several areas the files are named era5_land_YYYY_MM_a<k>.nc."""
+    jobs = []
+    for year in years:
+        for month in months:
+            for k, area in enumerate(areas, 1):
+                request = {
+                    "variable": ["2m_dewpoint_temperature", "2m_temperature"],
+                    "year": str(year),
+                    "month": f"{month:02d}",
+                    "day": [f"{d:02d}" for d in range(1, 32)],
+                    "daily_statistic": "daily_mean",
+                    "time_zone": "utc+00:00",
+                    "area": area,
+                }
+                suffix = f"_a{k}" if len(areas) > 1 else ""
+                jobs.append({"outfile": f"era5_land_{year}_{month:02d}{suffix}.nc", "request": request})
+    return jobs
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(16 * 1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_valid_download(path):
+    """The CDS returns a zip (saved as .nc) holding one .nc per variable."""
+    try:
+        with zipfile.ZipFile(path) as z:
+            return any(name.endswith(".nc") for name in z.namelist())
+    except (zipfile.BadZipFile, OSError):
+        return False
+
+
+def is_verified(path, entry, request, check_hash=False, stub=False):
+    """True if path exists and matches its manifest entry for the same request (and the same kind of client)."""
+    if entry is None or not os.path.exists(path):
+        return False
+    if bool(entry.get("stub")) != stub:
+        return False  # a stub file never counts as a real download, and vice versa
+    if entry.get("request") != request or os.path.getsize(path) != entry.get("size"):
+        return False
+    return file_sha256(path) == entry.get("sha256") if check_hash else True
+
+
+class Manifest:
+    """JSON manifest of finished downloads, saved after every file so a crash loses nothing."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.files = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.files = json.load(f).get("files", {})
+
+    def get(self, name):
+        return self.files.get(name)
+
+    def record(self, name, entry):
+        with self.lock:
+            self.files[name] = entry
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"files": dict(sorted(self.files.items()))}, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+def download_one(client, job, folder, retries=RETRIES, backoff=BACKOFF_SECONDS, sleep=time.sleep):
+    """Retrieve one job into folder (via a .part file), retrying with exponential backoff + jitter."""
+    outfile = os.path.join(folder, job["outfile"])
+    part_path = outfile + ".part"
+    for attempt in range(1, retries + 1):
+        try:
+            client.retrieve(dataset, job["request"]).download(part_path)
+            if not is_valid_download(part_path):
+                raise ValueError("downloaded file is not a valid zip of .nc files")
+            os.replace(part_path, outfile)
+            return outfile, attempt
+        except Exception as e:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            if attempt == retries:
+                raise
+            delay = backoff * 2 ** (attempt - 1) * (1 + random.random() * 0.25)
+            print(f"  {job['outfile']}: attempt {attempt} failed ({e}); retrying in {delay:.0f}s")
+            sleep(delay)
+
+
+def run_downloads(client, jobs, folder, max_parallel=MAX_PARALLEL, retries=RETRIES, backoff=BACKOFF_SECONDS,
+                  check_hash=False, sleep=time.sleep):
+    """Download every job not already present and verified. Returns (downloaded, skipped, failed) names."""
+    os.makedirs(folder, exist_ok=True)
+    manifest = Manifest(os.path.join(folder, MANIFEST_NAME))
+    stub = isinstance(client, StubClient)
+
+    pending, skipped = [], []
+    for job in jobs:
+        path = os.path.join(folder, job["outfile"])
+        if is_verified(path, manifest.get(job["outfile"]), job["request"], check_hash, stub):
+            skipped.append(job["outfile"])
+        else:
+            pending.append(job)
+    print(f"{len(jobs)} files planned: {len(skipped)} already verified, {len(pending)} to download")
+
+    downloaded, failed = [], []
+    with ThreadPoolExecutor(max_workers=max_parallel) as pool:
+        futures = {pool.submit(download_one, client, job, folder, retries, backoff, sleep): job for job in pending}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                path, attempts = future.result()
+            except Exception as e:
+                print(f"  FAILED {job['outfile']}: {e}")
+                failed.append(job["outfile"])
+                continue
+            entry = {
+                "request": job["request"],
+                "size": os.path.getsize(path),
+                "sha256": file_sha256(path),
+                "attempts": attempts,
+                "downloaded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            }
+            if stub:
+                entry["stub"] = True
+            manifest.record(job["outfile"], entry)
+            downloaded.append(job["outfile"])
+            print(f"  Downloaded {job['outfile']} ({attempts} attempt(s))")
+    return downloaded, skipped, failed
+
+
+class StubClient:
+    """
+    Local stand-in for cdsapi.Client: writes a small zip with the two .nc members the CDS returns.
+    fail_rate makes a share of calls raise so retry/backoff can be checked; every call is logged.
+    """
+
+    def __init__(self, fail_rate=0.0, delay=0.0, seed=0):
+        self.fail_rate = fail_rate
+        self.delay = delay
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = []
+
+    def retrieve(self, name, request):
+        with self.lock:
+            self.calls.append((time.monotonic(), threading.current_thread().name, name, request["year"], request["month"]))
+            fail = self.random.random() < self.fail_rate
+        time.sleep(self.delay)
+        if fail:
+            raise RuntimeError("stub: simulated CDS failure")
+        return _StubResult(request)
+
+
+class _StubResult:
+    def __init__(self, request):
+        self.request = request
+
+    def download(self, target):
+        with zipfile.ZipFile(target, "w") as z:
+            for variable in self.request["variable"]:
+                z.writestr(f"{variable}_0_daily-mean.nc", json.dumps(self.request).encode())
+
+
+def parse_years(value):
+    """'2024' or '1995-2024'."""
+    first, _, last = value.partition("-")
+    return list(range(int(first), int(last or first) + 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download ERA5-Land daily means for the city area.")
+    parser.add_argument("--years", default="2024", help="Year or range, e.g. 1995-2024 (default %(default)s)")
+    parser.add_argument("--months", default="1-12", help="Month range, e.g. 6-8 (default %(default)s)")
+    parser.add_argument("--parallel", type=int, default=MAX_PARALLEL, help="Requests in flight at once")
+    parser.add_argument("--retries", type=int, default=RETRIES)
+    parser.add_argument("--pad", type=float, default=PAD_DEGREES, help="Degrees of padding around each city bbox")
+    parser.add_argument("--gap", type=float, default=CLUSTER_GAP_DEGREES,
+                        help="Cities closer than this many degrees share one request area")
+    parser.add_argument("--full-area", action="store_true", help=f"Use the fixed area {DEFAULT_AREA}")
+    parser.add_argument("--verify-hash", action="store_true", help="Re-hash existing files before skipping them")
+    parser.add_argument("--stub", action="store_true", help="Use the local stub client (no network)")
+    parser.add_argument("--folder", help=f"Download folder (default: download_folder, or {STUB_FOLDER} with --stub)")
+    args = parser.parse_args()
+    folder = args.folder or (STUB_FOLDER if args.stub else download_folder)
+    if args.stub and os.path.abspath(folder) == os.path.abspath(download_folder):
+        parser.error("--stub writes fake files; give it a --folder other than the real download folder")
+
+    areas = [DEFAULT_AREA] if args.full_area else plan_areas(city_bounds(cities_folder), pad=args.pad, gap=args.gap)
+    for area in areas:
+        print(f"Area (N, W, S, E): {area}")
+
+    jobs = plan_requests(parse_years(args.years), parse_years(args.months), areas)
+    if args.stub:
+        client = StubClient(fail_rate=0.2)
+        backoff, sleep = 0, lambda s: None
+    else:
+        import cdsapi
+        client = cdsapi.Client()
+        backoff, sleep = BACKOFF_SECONDS, time.sleep
+
+    print(f"Downloading into {folder}")
+    downloaded, skipped, failed = run_downloads(client, jobs, folder, max_parallel=args.parallel,
+                                                retries=args.retries, backoff=backoff,
+                                                check_hash=args.verify_hash, sleep=sleep)
+    print(f"\nDone: {len(downloaded)} downloaded, {len(skipped)} skipped, {len(failed)} failed")
+    if failed:
+        print(f"Failed files (rerun to resume): {failed}")
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
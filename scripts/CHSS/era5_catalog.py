@@ -0,0 +1,196 @@
+'''
+Persistent metadata catalog of the unzipped ERA5-Land NetCDF files.
+
+The unzipped folder is scanned once and every file's variables, time range, grid bounds, resolution
+and SHA-256 are kept in a JSON catalog next to the files. Re-scans only re-open files whose size or
+mtime changed (or that are new), so a catalog lookup costs one os.stat per file instead of one
+xr.open_dataset per file. select() answers "which files hold this variable for these dates over this
+bbox" without opening any NetCDF:
+    catalog = Era5Catalog.scan(nc_folder)
+    files = catalog.select("t2m", start=(2024, 1), end=(2024, 12), bounds=(-75, -25, 125, 55))
+
+Usage (print the catalog of a folder):
+    python era5_catalog.py "D:\\...\\era5-land-unzipped"
+'''
+
+import os
+import json
+import hashlib
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from era5_io import FILE_PATTERN, detect_time_dim
+
+
+CATALOG_NAME = ".era5_catalog.json"
+CATALOG_VERSION = 1
+
+
+def file_checksum(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def grid_extent(values):
+    """(min, max, resolution) of a regular coordinate axis, extended half a cell past the outer centres."""
+    values = np.asarray(values, dtype="float64")
+    res = float(np.abs(np.diff(values)).mean()) if len(values) > 1 else 0.0
+    return float(values.min()) - res / 2, float(values.max()) + res / 2, res
+
+
+def file_record(path, checksum=True):
+    """Metadata of one NetCDF file; unreadable files get an "error" entry so they are not re-opened each scan."""
+    stat = os.stat(path)
+    record = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    try:
+        with xr.open_dataset(path, engine="h5netcdf") as ds:
+            time_dim = detect_time_dim(ds)
+            times = pd.to_datetime(ds[time_dim].values)
+            min_lon, max_lon, res_lon = grid_extent(ds["longitude"].values)
+            min_lat, max_lat, res_lat = grid_extent(ds["latitude"].values)
+            record.update({
+                "variables": sorted(str(v) for v in ds.data_vars if time_dim in ds[v].dims),
+                "time_dim": time_dim,
+                "time_start": str(times.min().date()),
+                "time_end": str(times.max().date()),
+                "n_times": len(times),
+                "bounds": [min_lon, min_lat, max_lon, max_lat],
+                "resolution": [res_lon, res_lat],
+                "shape": [int(ds.sizes["latitude"]), int(ds.sizes["longitude"])],
+            })
+    except Exception as e:
+        record["error"] = str(e)
+    if checksum:
+        record["sha256"] = file_checksum(path)
+    return record
+
+
+def month_bounds(start, end):
+    """(year, month) range -> ("YYYY-MM-DD" first day, "YYYY-MM-DD" last day)."""
+    first = pd.Timestamp(year=start[0], month=start[1], day=1)
+    last = pd.Timestamp(year=end[0], month=end[1], day=1) + pd.offsets.MonthEnd(0)
+    return str(first.date()), str(last.date())
+
+
+def bounds_intersect(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+class Era5Catalog:
+    def __init__(self, folder, path=None, files=None):
+        self.folder = Path(folder)
+        self.path = Path(path) if path else self.folder / CATALOG_NAME
+        self.files = files or {}
+
+    @classmethod
+    def load(cls, folder, path=None):
+        catalog = cls(folder, path)
+        try:
+            with open(catalog.path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == CATALOG_VERSION:
+                catalog.files = data["files"]
+        except (OSError, ValueError, KeyError):
+            pass
+        return catalog
+
+    @classmethod
+    def scan(cls, folder, path=None, checksum=True, pattern="*.nc", verbose=False):
+        """Load the catalog of folder, re-read new/changed files, drop deleted ones and save it if anything changed."""
+        catalog = cls.load(folder, path)
+        changed = catalog.refresh(checksum, pattern, verbose)
+        if changed:
+            catalog.save()
+        return catalog
+
+    def refresh(self, checksum=True, pattern="*.nc", verbose=False):
+        """Bring the entries up to date with the folder; returns the number of added, changed or removed files."""
+        present = {p.name: p for p in self.folder.glob(pattern) if p.is_file()}
+        changed = 0
+        for name in set(self.files) - set(present):
+            del self.files[name]
+            changed += 1
+        for name, path in sorted(present.items()):
+            stat = path.stat()
+            old = self.files.get(name)
+            if old and old["size"] == stat.st_size and old["mtime_ns"] == stat.st_mtime_ns \
+                    and (not checksum or "sha256" in old):
+                continue
+            if verbose:
+                print(f"  Cataloguing {name}")
+            self.files[name] = file_record(path, checksum)
+            changed += 1
+        return changed
+
+    def save(self):
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": CATALOG_VERSION, "files": self.files}, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def select(self, var=None, start=None, end=None, bounds=None):
+        """
+        Paths of the readable files holding var whose time range overlaps the (year, month) range
+        [start, end] and whose grid overlaps bounds (min_lon, min_lat, max_lon, max_lat), oldest first.
+        """
+        first = month_bounds(start, start)[0] if start else "0000-01-01"
+        last = month_bounds(end, end)[1] if end else "9999-12-31"
+        selected = []
+        for name, record in self.files.items():
+            if "error" in record:
+                continue
+            if var is not None and var not in record["variables"]:
+                continue
+            if record["time_end"] < first or record["time_start"] > last:
+                continue
+            if bounds is not None and not bounds_intersect(record["bounds"], bounds):
+                continue
+            selected.append((record["time_start"], name))
+        return [self.folder / name for _, name in sorted(selected)]
+
+    def month_files(self, var, start=None, end=None, bounds=None):
+        """
+        {"YYYY-MM": path} of select(), keyed by each file's first month (the monthly CDS files); a
+        month downloaded as several request areas gets one key per area ("YYYY-MM a2").
+        """
+        files = {}
+        for path in self.select(var, start, end, bounds):
+            match = FILE_PATTERN.match(path.name)
+            area = match.group("area") if match else None
+            files[self.files[path.name]["time_start"][:7] + (f" {area}" if area else "")] = path
+        return files
+
+    def errors(self):
+        return {name: record["error"] for name, record in self.files.items() if "error" in record}
+
+    def to_frame(self):
+        rows = [{"file": name, **{k: v for k, v in record.items() if k not in ("bounds", "resolution", "shape")},
+                 "bounds": record.get("bounds"), "resolution": record.get("resolution")}
+                for name, record in sorted(self.files.items())]
+        return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build/refresh the metadata catalog of an ERA5-Land NetCDF folder.")
+    parser.add_argument("folder")
+    parser.add_argument("--catalog", help=f"Catalog file (default: <folder>/{CATALOG_NAME})")
+    parser.add_argument("--no-checksum", action="store_true", help="Skip the SHA-256 of each file")
+    args = parser.parse_args()
+
+    catalog = Era5Catalog.scan(args.folder, args.catalog, checksum=not args.no_checksum, verbose=True)
+    frame = catalog.to_frame()
+    if len(frame):
+        columns = [c for c in ["file", "variables", "time_start", "time_end", "n_times", "bounds", "error"] if c in frame.columns]
+        print(frame[columns].to_string(index=False))
+    print(f"\n{len(catalog.files)} files catalogued in {catalog.path} ({len(catalog.errors())} unreadable)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+'''
+ERA5-Land file discovery and out-of-core reading for the CHSS extraction.
+
+Monthly files are picked by a year/month range instead of a fixed glob, and the whole set can be
+opened as ONE lazily-chunked dataset along time so decades of daily data are reduced chunk by
+chunk with bounded peak memory (only one time chunk of the city window is ever in RAM).
+'''
+
+import re
+from pathlib import Path
+
+import xarray as xr
+
+
+# Unzipped file names, e.g. "2m_temperature_2024_01_daily-mean.nc" (see unzip_nc.py)
+# <prefix>_YYYY_MM[_a<k>]_daily-mean.nc; _a<k> marks the k-th request area of a month (download.py)
+FILE_PATTERN = re.compile(r"^(?P<prefix>.+?)_(?P<year>\d{4})_(?P<month>\d{2})(?:_(?P<area>a\d+))?_daily-mean\.nc$")
+
+# ERA5 short name -> file prefix written by the CDS download
+VAR_PREFIXES = {"t2m": "2m_temperature", "d2m": "2m_dewpoint_temperature"}
+
+
+def parse_month(value):
+    """'2024-01' or '2024' -> (2024, 1)."""
+    parts = str(value).split("-")
+    return int(parts[0]), int(parts[1]) if len(parts) > 1 else 1
+
+
+def month_range(start, end):
+    """All (year, month) pairs from start to end inclusive."""
+    (y, m), (end_y, end_m) = start, end
+    months = []
+    while (y, m) <= (end_y, end_m):
+        months.append((y, m))
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return months
+
+
+def find_monthly_files(nc_folder, var, start, end):
+    """Sorted monthly files of one variable whose (year, month) falls in [start, end]."""
+    prefix = VAR_PREFIXES[var]
+    files = []
+    for path in Path(nc_folder).glob(f"{prefix}_*_daily-mean.nc"):
+        match = FILE_PATTERN.match(path.name)
+        if not match or match.group("prefix") != prefix:
+            continue  # e.g. keeps 2m_temperature from matching 2m_dewpoint_temperature
+        year_month = (int(match.group("year")), int(match.group("month")))
+        if start <= year_month <= end:
+            files.append((year_month, path.name, path))
+    return [path for _, _, path in sorted(files)]
+
+
+def detect_time_dim(ds):
+    """Auto-detect time dim (valid_time or time)."""
+    time_dim = next((dim for dim in ds.dims if dim in ['valid_time', 'time']), None)
+    if time_dim is None:
+        raise ValueError(f"No time dim found. Dims: {list(ds.dims)}")
+    return time_dim
+
+
+def grid_key(lon, lat):
+    """Hashable identity of a regular lon/lat grid (size and outer coordinates)."""
+    return (len(lon), float(lon[0]), float(lon[-1]), len(lat), float(lat[0]), float(lat[-1]))
+
+
+def group_by_grid(files):
+    """
+    {grid key: files} in first-seen order. A month downloaded as several request areas (download.py)
+    gives one group per area, each of which open_lazy() can combine along time alone.
+    """
+    groups = {}
+    for path in files:
+        with xr.open_dataset(path, engine="h5netcdf") as ds:
+            key = grid_key(ds["longitude"].values, ds["latitude"].values)
+        groups.setdefault(key, []).append(path)
+    return groups
+
+
+def open_lazy(files, var, chunk_days=31):
+    """
+    Open a whole monthly file set as one dataset, chunked along time (dask-backed, nothing read yet).
+    The files must share one grid (see group_by_grid()).
+    Returns the (time, latitude, longitude) DataArray and the name of its time dimension.
+    """
+    with xr.open_dataset(files[0], engine="h5netcdf") as first:
+        time_dim = detect_time_dim(first)
+
+    ds = xr.open_mfdataset(
+        [str(f) for f in files], engine="h5netcdf",
+        combine="by_coords", chunks={time_dim: chunk_days},
+        data_vars="minimal", coords="minimal", compat="override", parallel=False,
+    )
+    da = ds[var].transpose(time_dim, "latitude", "longitude")
+    return da, time_dim
+
+
+def iter_time_chunks(da, time_dim, window, chunk_days=31):
+    """
+    Yield (times, block) for consecutive time chunks of da cut to window (row0, row1, col0, col1).
+    Each block is materialized on its own, so peak memory is one chunk of the window.
+    """
+    row0, row1, col0, col1 = window
+    da = da.isel(latitude=slice(row0, row1), longitude=slice(col0, col1))
+    n_times = da.sizes[time_dim]
+    for start in range(0, n_times, chunk_days):
+        chunk = da.isel({time_dim: slice(start, start + chunk_days)})
+        yield chunk[time_dim].values, chunk.values
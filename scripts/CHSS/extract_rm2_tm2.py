@@ -1,206 +1,320 @@
 import xarray as xr
-import rioxarray
-import geopandas as gpd
 import pandas as pd
 import os
-import numpy as np
-from pathlib import Path
+import sys
+import argparse
+
+from checkpoint import Checkpoint
+from city_day_store import CityDayTable, read_city, update_parquet, write_csv, write_parquet
+from era5_catalog import Era5Catalog
+from era5_io import (detect_time_dim, find_monthly_files, grid_key, group_by_grid, iter_time_chunks, month_range,
+                     open_lazy, parse_month)
+from zonal_engine import ALL_TOUCHED, ERA5_CRS, WEIGHTING, ZonalWeights, load_city_zones, load_store_zones
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from instrumentation import add_arguments, get_logger, setup_from_args, span, write_summary
+
+log = get_logger("chss.extract")
 
 
 # Configuration (Update paths as needed)
 
 nc_folder = r"D:\Downloads\Programming\Python\NASA Space Apps\heat_risk_dataextraction\era5-land-unzipped"
 cities_folder = r"D:\Downloads\Programming\Python\NASA Space Apps\city_shape_files\cities"
+boundary_store = None  # shared boundary store (scripts/boundary_store.py); None = read cities_folder
 output_folder = r"D:\Downloads\Programming\Python\NASA Space Apps\heat_risk_dataextraction\city_daily_csv"
-
-os.makedirs(output_folder, exist_ok=True)
+parquet_folder = r"D:\Downloads\Programming\Python\NASA Space Apps\heat_risk_dataextraction\city_daily_parquet"
 
 # ERA5-Land bounds from your CDS download script
 ERA5_BOUNDS = (-75, -25, 125, 55)  # (min_lon, min_lat, max_lon, max_lat)
-ERA5_CRS = "EPSG:4326"
 
 # Expected variables (adjust if print(ds.data_vars) shows different names)
 VARIABLES = {"t2m": "temperature files", "d2m": "dewpoint files"}
 
-# Discover Files (Precise Globs to Avoid Overlap)
-
-temp_files = sorted(Path(nc_folder).glob("2m_temperature_2024*_daily-mean.nc"))  # Only t2m (12 files)
-dewpoint_files = sorted(Path(nc_folder).glob("2m_dewpoint_temperature_2024*_daily-mean.nc"))  # Only d2m (12 files)
-
-print(f"Found {len(temp_files)} {VARIABLES['t2m']}: {[f.name for f in temp_files[:3]]}..." if temp_files else "No t2m files")
-print(f"Found {len(dewpoint_files)} {VARIABLES['d2m']}: {[f.name for f in dewpoint_files[:3]]}..." if dewpoint_files else "No d2m files")
-
-if len(temp_files) == 0 or len(dewpoint_files) == 0:
-    print("Error: No files for one or both variables. Run fixed unzipper and check paths.")
-    exit(1)
-
-if len(temp_files) != 12 or len(dewpoint_files) != 12:
-    print(f"Warning: Expected 12 files per variable (full 2024), found {len(temp_files)} t2m and {len(dewpoint_files)} d2m. Proceeding...")
-
-# Map variable to its files
-nc_files = {
-    "t2m": temp_files,
-    "d2m": dewpoint_files
-}
-
-# -----------------------------
-# Step 2: Process Cities and Shapefiles
-# -----------------------------
-for city_name in os.listdir(cities_folder):
-    city_path = os.path.join(cities_folder, city_name)
-    if not os.path.isdir(city_path):
-        continue
-
-    print(f"\n=== Processing city: {city_name} ===")
-    city_records = []
-
-    # Loop over shapefiles in city folder
-    for shp_file in os.listdir(city_path):
-        if not shp_file.endswith(".shp"):
-            continue
-
-        # Prefer fixed/reprojected version if exists (from manual verification)
-        fixed_shp = shp_file.replace(".shp", "_fixed.shp")
-        shp_path = os.path.join(city_path, fixed_shp if os.path.exists(os.path.join(city_path, fixed_shp)) else shp_file)
-        print(f"  Processing shapefile: {os.path.basename(shp_path)}")
-
-        # Load and prepare shapefile
-        gdf = gpd.read_file(shp_path)
-
-        # Paris-specific debug
-        is_paris = "paris" in city_name.lower() or "paris" in shp_file.lower()
-        if is_paris:
-            print(f"    Paris DEBUG: Original CRS: {gdf.crs}")
-            print(f"    Paris DEBUG: Num geometries: {len(gdf)}")
-            print(f"    Paris DEBUG: Original bounds: {gdf.total_bounds}")
-
-        # Validate and repair geometries
-        gdf['geometry'] = gdf['geometry'].buffer(0)  # Fixes invalid polygons
-        gdf = gdf[gdf.geometry.is_valid].reset_index(drop=True)
-        if gdf.empty:
-            print(f"    Error: No valid geometries after repair. Skipping {shp_file}.")
-            continue
-        if is_paris:
-            print(f"    Paris DEBUG: After validation: {len(gdf)} geometries")
-
-        # Reproject to ERA5 CRS (fixes out-of-bounds)
-        original_crs = gdf.crs
-        if gdf.crs is None:
-            print(f"    Warning: No CRS—setting to {ERA5_CRS} (assuming lat/lon).")
-            gdf = gdf.set_crs(ERA5_CRS)
-        elif gdf.crs != ERA5_CRS:
-            print(f"    Reprojecting from {original_crs} to {ERA5_CRS}.")
-            gdf = gdf.to_crs(ERA5_CRS)
-
-        # Get bounds in lon/lat
-        bounds = gdf.total_bounds  # [min_lon, min_lat, max_lon, max_lat]
-        if is_paris:
-            print(f"    Paris DEBUG: After reprojection bounds (lon/lat): {bounds}")
-            sample_centroid = gdf.geometry.iloc[0].centroid
-            print(f"    Paris DEBUG: Sample centroid (lon/lat): {sample_centroid.x:.4f}, {sample_centroid.y:.4f}")
-
-        # Quick global overlap check with ERA5 download bounds
-        global_overlap = (bounds[0] < ERA5_BOUNDS[2] and bounds[2] > ERA5_BOUNDS[0] and
-                          bounds[1] < ERA5_BOUNDS[3] and bounds[3] > ERA5_BOUNDS[1])
-        if not global_overlap:
-            print(f"    Error: No overlap with ERA5 bounds {ERA5_BOUNDS}. Shapefile: {bounds}. Skipping {shp_file}.")
-            continue
-        if is_paris:
-            print(f"    Paris DEBUG: Global overlap with ERA5? {global_overlap}")
-
-        # Process variables and monthly files
-        total_records = 0
-        for var, monthly_files in nc_files.items():
-            print(f"    Processing {var} ({len(monthly_files)} monthly files)")
-            var_records = 0
-            skipped_files = 0
-
-            for nc_path in monthly_files:
+# Default year/month range (override with --start/--end)
+START_MONTH = "2024-01"
+END_MONTH = "2024-12"
+
+# Pick files through the metadata catalog (era5_catalog.py) instead of by file name; the catalog is
+# refreshed incrementally on every run. CATALOG_CHECKSUM also stores a SHA-256 of each new/changed file.
+USE_CATALOG = True
+CATALOG_CHECKSUM = True
+
+# Days per chunk in --lazy mode; peak memory is about CHUNK_DAYS x (city window cells) x 8 bytes
+CHUNK_DAYS = 31
+
+# Worker processes for --workers (1 = serial). Decoded grids are shared through memory-mapped
+# files in SCRATCH_FOLDER (None = system temp folder).
+WORKERS = 1
+SCRATCH_FOLDER = None
+
+
+def discover_files(start, end, bounds=None, use_catalog=USE_CATALOG):
+    """
+    Find the monthly t2m/d2m files for the [start, end] (year, month) range. With the catalog, files
+    are picked by their recorded variables, dates and grid bounds (only files overlapping bounds),
+    without opening any of them; otherwise by file name.
+    """
+    if use_catalog:
+        catalog = Era5Catalog.scan(nc_folder, checksum=CATALOG_CHECKSUM)
+        for name, error in catalog.errors().items():
+            log.warning(f"  Skip {name}: {error}")
+        temp_files = catalog.select("t2m", start, end, bounds)
+        dewpoint_files = catalog.select("d2m", start, end, bounds)
+    else:
+        temp_files = find_monthly_files(nc_folder, "t2m", start, end)
+        dewpoint_files = find_monthly_files(nc_folder, "d2m", start, end)
+
+    log.info(f"Found {len(temp_files)} {VARIABLES['t2m']}: {[f.name for f in temp_files[:3]]}..." if temp_files else "No t2m files")
+    log.info(f"Found {len(dewpoint_files)} {VARIABLES['d2m']}: {[f.name for f in dewpoint_files[:3]]}..." if dewpoint_files else "No d2m files")
+
+    if len(temp_files) == 0 or len(dewpoint_files) == 0:
+        log.error("Error: No files for one or both variables. Run fixed unzipper and check paths.")
+        exit(1)
+
+    expected = len(month_range(start, end))
+    if len(temp_files) < expected or len(dewpoint_files) < expected:  # more when a month has several request areas
+        log.warning(f"Warning: Expected {expected} files per variable, found {len(temp_files)} t2m and {len(dewpoint_files)} d2m. Proceeding...")
+
+    # Map variable to its files
+    return {
+        "t2m": temp_files,
+        "d2m": dewpoint_files
+    }
+
+
+def get_weights(da, zones, cache):
+    """Zonal weights for the grid of this file (built once per distinct grid)."""
+    lon, lat = da.longitude.values, da.latitude.values
+    key = grid_key(lon, lat)
+    if key not in cache:
+        log.info(f"      Rasterizing {len(zones)} city shapefiles onto {len(lat)}x{len(lon)} grid")
+        with span("rasterize", cells=len(lon) * len(lat), zones=len(zones)):
+            cache[key] = ZonalWeights(zones, lon, lat, all_touched=ALL_TOUCHED, weighting=WEIGHTING)
+    return cache[key]
+
+
+def reduce_eager(nc_files, zones, table):
+    """Open each monthly file on its own and reduce it for all cities at once. Returns the failures."""
+    weights_cache = {}
+    failures = []
+    for var, monthly_files in nc_files.items():
+        log.info(f"\nProcessing {var} ({len(monthly_files)} monthly files)")
+        skipped_files = 0
+
+        for nc_path in monthly_files:
+            with span("file", var=var, file=nc_path.name):
                 try:
                     ds = xr.open_dataset(nc_path, engine='h5netcdf')
                 except Exception as e:
-                    print(f"      Skip {nc_path.name}: {e}")
+                    log.warning(f"  Skip {nc_path.name}: {e}")
+                    failures.append(("*", nc_path.name, str(e)))
                     skipped_files += 1
                     continue
 
                 # Check variable exists
                 if var not in ds.data_vars:
-                    print(f"      Skip {nc_path.name}: {var} not found. Available: {list(ds.data_vars.keys())}")
-                    ds.close()
-                    skipped_files += 1
-                    continue
-
-                da = ds[var]
-                da = da.rio.write_crs(ERA5_CRS, inplace=False)
-
-                # Dataset bounds for this file
-                ds_bounds = (float(da.longitude.min()), float(da.latitude.min()),
-                             float(da.longitude.max()), float(da.latitude.max()))
-                file_overlap = (bounds[0] < ds_bounds[2] and bounds[2] > ds_bounds[0] and
-                                bounds[1] < ds_bounds[3] and bounds[3] > ds_bounds[1])
-                if is_paris:
-                    print(f"      Paris DEBUG: {nc_path.name} bounds: {ds_bounds}")
-                    print(f"      Paris DEBUG: File overlap? {file_overlap}")
-
-                if not file_overlap:
-                    print(f"      Skip {nc_path.name}: No spatial overlap. Shapefile: {bounds}, Data: {ds_bounds}")
+                    log.warning(f"  Skip {nc_path.name}: {var} not found. Available: {list(ds.data_vars.keys())}")
                     ds.close()
+                    failures.append(("*", nc_path.name, f"{var} not found"))
                     skipped_files += 1
                     continue
 
-                # Clip to shapefile
                 try:
-                    clipped = da.rio.clip(gdf.geometry, gdf.crs, drop=True, all_touched=True)
-                    if clipped.notnull().sum().item() == 0 or clipped.size == 0:
-                        raise ValueError("Clipped data empty (no overlap or all NaN)")
-
-                    # Auto-detect time dim (valid_time or time)
-                    time_dim = next((dim for dim in clipped.dims if dim in ['valid_time', 'time']), None)
-                    if time_dim is None:
-                        raise ValueError(f"No time dim found. Dims: {list(clipped.dims)}")
-
-                    # Process daily time steps
-                    num_times = len(clipped[time_dim])
-                    print(f"      Success for {nc_path.name}: {num_times} time steps")
-                    for t in clipped[time_dim].values:
-                        daily_slice = clipped.sel({time_dim: t})
-                        daily_value = float(daily_slice.mean(dim=['latitude', 'longitude'], skipna=True).values)
-                        if np.isnan(daily_value):
-                            continue  # Skip days with no valid data (e.g., all NaN over geometry)
-
-                        # Create record
-                        record = pd.DataFrame({
-                            "city": [city_name],
-                            "shapefile": [os.path.basename(shp_path).replace(".shp", "")],
-                            "variable": [var],
-                            "date": [pd.to_datetime(t)],
-                            "value": [daily_value]
-                        })
-                        city_records.append(record)
-                        var_records += 1
-
+                    da = ds[var]
+                    time_dim = detect_time_dim(da)
+                    da = da.transpose(time_dim, "latitude", "longitude")
+                    weights = get_weights(da, zones, weights_cache)
+
+                    # Read just the block of the grid the cities touch
+                    row0, row1, col0, col1 = weights.window
+                    with span("read", var=var, file=nc_path.name):
+                        block = da.isel(latitude=slice(row0, row1), longitude=slice(col0, col1)).values
+                    with span("reduce", var=var, file=nc_path.name):
+                        means = weights.reduce(block, windowed=True)
+
+                    table.put(weights, var, da[time_dim].values, means)
+                    log.debug(f"  Success for {nc_path.name}: {len(da[time_dim])} time steps")
                 except Exception as e:
-                    print(f"      Clip failed for {var} in {nc_path.name}: {e}")
-                    print(f"      Details: Shapefile {bounds}, Data {ds_bounds}, Overlap {file_overlap}")
+                    log.warning(f"  Failed for {var} in {nc_path.name}: {e}")
+                    failures.append(("*", nc_path.name, str(e)))
                     skipped_files += 1
 
                 ds.close()
 
-            print(f"    {var}: {var_records} records ({skipped_files} files skipped)")
-            total_records += var_records
-
-        print(f"  Total for {shp_file}: {total_records} records")
-
-    # Save combined CSV for city (full year)
-    if city_records:
-        city_df = pd.concat(city_records, ignore_index=True)
-        city_df = city_df.sort_values("date").reset_index(drop=True)
-        output_path = os.path.join(output_folder, f"{city_name}_daily_valuesx.csv")
-        city_df.to_csv(output_path, index=False)
-        print(f"  Saved {len(city_df)} records to {output_path}")
-        print(f"  Date range: {city_df['date'].min().date()} to {city_df['date'].max().date()}")
-        print(f"  Variables: {city_df['variable'].unique()}")
+        log.info(f"  {var}: {skipped_files} files skipped")
+    return failures
+
+
+def reduce_lazy(nc_files, zones, table, chunk_days):
+    """
+    Out-of-core mode: per variable and grid (one per request area), one lazily-chunked dataset
+    streamed chunk by chunk with that grid's zonal weights.
+    """
+    weights_cache = {}
+    for var, files in nc_files.items():
+        groups = group_by_grid(files)
+        log.info(f"\nProcessing {var} lazily ({len(files)} monthly files on {len(groups)} grid(s), {chunk_days}-day chunks)")
+        for group in groups.values():
+            da, time_dim = open_lazy(group, var, chunk_days=chunk_days)
+            try:
+                weights = get_weights(da, zones, weights_cache)
+                chunks = iter_time_chunks(da, time_dim, weights.window, chunk_days=chunk_days)
+                while True:
+                    with span("read", var=var) as tags:
+                        chunk = next(chunks, None)
+                        if chunk is not None:
+                            tags["first_day"] = str(pd.Timestamp(chunk[0][0]).date())
+                    if chunk is None:
+                        break
+                    times, block = chunk
+                    with span("reduce", var=var, first_day=str(pd.Timestamp(times[0]).date())):
+                        table.put(weights, var, times, weights.reduce(block, windowed=True))
+                    log.debug(f"  {pd.Timestamp(times[0]).date()} to {pd.Timestamp(times[-1]).date()}")
+            finally:
+                da.close()
+
+
+def run(args):
+    start, end = parse_month(args.start), parse_month(args.end)
+
+    # -----------------------------
+    # Step 1: Load every city shapefile once
+    # -----------------------------
+    with span("load_zones"):
+        if args.boundary_store:
+            zones = load_store_zones(args.boundary_store, crs=ERA5_CRS, bounds=ERA5_BOUNDS)
+        else:
+            zones = load_city_zones(cities_folder, crs=ERA5_CRS, bounds=ERA5_BOUNDS)
+    if not zones:
+        log.error("Error: No usable city shapefiles. Check cities_folder.")
+        exit(1)
+    log.info(f"\nLoaded {len(zones)} shapefiles for {len({z['city'] for z in zones})} cities")
+
+    # -----------------------------
+    # Step 2: Find the monthly files that cover the dates and the cities
+    # -----------------------------
+    zone_bounds = (min(z["bounds"][0] for z in zones), min(z["bounds"][1] for z in zones),
+                   max(z["bounds"][2] for z in zones), max(z["bounds"][3] for z in zones))
+    with span("discover"):
+        nc_files = discover_files(start, end, zone_bounds, use_catalog=not args.no_catalog)
+
+    plan = None
+    if args.incremental:
+        checkpoint = Checkpoint(parquet_folder)
+        records = None if args.no_catalog else Era5Catalog.load(nc_folder).files
+        plan = checkpoint.plan(nc_files, zones, {"all_touched": ALL_TOUCHED, "weighting": WEIGHTING}, records)
+        if not plan["files"]:
+            log.info("\nEvery city is up to date for this range; nothing to extract.")
+            return
+        zones = [z for z in zones if z["city"] in plan["cities"]]
+        nc_files = plan["files"]
+        log.info(f"\nIncremental update: {sum(len(f) for f in nc_files.values())} new or changed files "
+                 f"for {len(plan['cities'])} cities ({len(plan['rebuild'])} with new boundaries)")
+
+    # -----------------------------
+    # Step 3: Reduce every monthly file for all cities at once
+    # -----------------------------
+    last_day = pd.Timestamp(year=end[0], month=end[1], day=1) + pd.offsets.MonthEnd(0)
+    table = CityDayTable(zones, pd.Timestamp(year=start[0], month=start[1], day=1), last_day)
+    failures = []
+    if args.lazy:
+        with span("reduce_all", mode="lazy"):
+            reduce_lazy(nc_files, zones, table, args.chunk_days)
+    elif args.workers > 1:
+        from parallel_extract import extract_parallel
+        weights_cache = {}
+        with span("reduce_all", mode="parallel", workers=args.workers):
+            failures = extract_parallel(
+                nc_files, zones, lambda da: get_weights(da, zones, weights_cache), table.put,
+                workers=args.workers, scratch_dir=args.scratch)
     else:
-        print(f"  No records for {city_name} (all clips failed—check debug above)")
-
-print("\n=== Processing Complete! Check output CSVs in", output_folder, "===")
\ No newline at end of file
+        with span("reduce_all", mode="eager"):
+            failures = reduce_eager(nc_files, zones, table)
+
+    # -----------------------------
+    # Step 4: Write the wide table once (Parquet by city/year, CSV optional)
+    # -----------------------------
+    city_df = table.to_frame()
+    for city_name in sorted({z["city"] for z in zones} - set(city_df["city"])):
+        log.warning(f"  No records for {city_name} (no valid cells—check its shapefile)")
+    if plan is not None:
+        write_incremental(city_df, zones, plan, checkpoint, failures, args.csv)
+    else:
+        write_full(city_df, args.csv)
+
+    if failures:
+        log.warning(f"\n{len(failures)} failures:")
+        for city, file_name, error in failures:
+            log.warning(f"  {city} / {file_name}: {error}")
+
+    log.info(f"\n=== Processing Complete! Check output in {parquet_folder} ===")
+
+
+def write_full(city_df, csv):
+    with span("write_parquet", rows=len(city_df)):
+        written = write_parquet(city_df, parquet_folder)
+    log.info(f"\nSaved {len(city_df)} city-days in {len(written)} partitions under {parquet_folder}")
+    if len(city_df):
+        log.info(f"  Date range: {city_df['date'].min().date()} to {city_df['date'].max().date()}")
+    if csv:
+        with span("write_csv", rows=len(city_df)):
+            csv_paths = write_csv(city_df, output_folder)
+        log.info(f"  Exported {len(csv_paths)} city CSVs to {output_folder}")
+
+
+def write_incremental(city_df, zones, plan, checkpoint, failures, csv):
+    """
+    Merge the re-reduced slices into the stored partitions, then record them in the checkpoint.
+    Months of files that failed are left as they were (and stay stale for the next run).
+    """
+    failed = {file_name for _, file_name, _ in failures}
+    slices = {var: {month for path in paths if path.name not in failed for month in plan["months"][path.name]}
+              for var, paths in plan["files"].items()}
+    plan["slices"] = slices
+
+    shapefiles = {}
+    for zone in zones:
+        shapefiles.setdefault(zone["city"], set()).add(zone["shapefile"])
+    with span("write_parquet", rows=len(city_df), incremental=True):
+        written = update_parquet(city_df, parquet_folder, shapefiles, slices)
+    checkpoint.commit(plan)
+    checkpoint.save()
+    log.info(f"\nUpdated {len(written)} partitions for {len(shapefiles)} cities under {parquet_folder}")
+
+    if csv:
+        with span("write_csv", cities=len(shapefiles)):
+            csv_paths = write_csv(pd.concat([read_city(parquet_folder, city) for city in sorted(shapefiles)],
+                                            ignore_index=True), output_folder)
+        log.info(f"  Exported {len(csv_paths)} city CSVs to {output_folder}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract daily t2m/d2m city means from ERA5-Land files.")
+    parser.add_argument("--start", default=START_MONTH, help="First month, YYYY-MM (default %(default)s)")
+    parser.add_argument("--end", default=END_MONTH, help="Last month, YYYY-MM (default %(default)s)")
+    parser.add_argument("--lazy", action="store_true",
+                        help="Out-of-core mode: open all files as one chunked dataset (for multi-year runs)")
+    parser.add_argument("--chunk-days", type=int, default=CHUNK_DAYS, help="Days per chunk in --lazy mode")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="Process pool size for parallel per-city extraction (default %(default)s = serial)")
+    parser.add_argument("--scratch", default=SCRATCH_FOLDER, help="Folder for the shared memory-mapped grids")
+    parser.add_argument("--csv", action="store_true", help="Also export one wide CSV per city to output_folder")
+    parser.add_argument("--boundary-store", default=boundary_store,
+                        help="Load the pre-repaired boundaries from this GeoParquet (see scripts/boundary_store.py)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only reduce new/changed monthly files (and cities with new boundaries) and merge "
+                             "them into the stored series; the first incremental run reduces everything (checkpoint.py)")
+    parser.add_argument("--no-catalog", action="store_true", default=not USE_CATALOG,
+                        help="Pick files by name instead of through the metadata catalog (era5_catalog.py)")
+    add_arguments(parser)
+    args = parser.parse_args()
+    setup_from_args(args)
+
+    with span("extract", start=args.start, end=args.end):
+        run(args)
+    write_summary(args.summary, log)
+
+
+if __name__ == "__main__":
+    main()
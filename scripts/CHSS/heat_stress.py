@@ -0,0 +1,207 @@
+'''
+Gridded heat-stress indices for CHSS.
+
+Relative humidity, heat index, humidex and wet-bulb temperature are computed per grid cell per day
+from the t2m/d2m cubes (fully vectorized, no per-day loop) and reduced to per-city mean / max / p95
+in the same pass, so within-city hot spots are kept instead of being averaged away before scoring.
+
+Formulas:
+- Relative humidity: Magnus formula (Bolton 1980 constants)
+- Heat index: NWS Rothfusz regression with the Steadman simple form below 80 F and the NWS adjustments
+- Humidex: Environment Canada (Masterton & Richardson 1979)
+- Wet-bulb: Stull (2011) empirical fit, valid for RH 5-99% and -20 to 50 C
+'''
+
+import argparse
+import warnings
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from city_day_store import write_parquet
+from era5_catalog import Era5Catalog
+from era5_io import detect_time_dim, find_monthly_files, grid_key, parse_month
+from zonal_engine import ALL_TOUCHED, ERA5_CRS, WEIGHTING, ZonalWeights, load_city_zones, load_store_zones
+
+
+# Configuration (Update paths as needed)
+
+nc_folder = r"D:\Downloads\Programming\Python\NASA Space Apps\heat_risk_dataextraction\era5-land-unzipped"
+cities_folder = r"D:\Downloads\Programming\Python\NASA Space Apps\city_shape_files\cities"
+boundary_store = None  # shared boundary store (scripts/boundary_store.py); None = read cities_folder
+output_folder = r"D:\Downloads\Programming\Python\NASA Space Apps\heat_risk_dataextraction\city_heat_stress_parquet"
+
+INDICES = ["rh", "heat_index", "humidex", "wet_bulb"]
+STATS = ["mean", "max", "p95"]
+
+
+def saturation_vapour_pressure(t_c):
+    """Magnus formula, hPa."""
+    return 6.112 * np.exp(17.67 * t_c / (t_c + 243.5))
+
+
+def relative_humidity(t2m_k, d2m_k):
+    """Relative humidity (%) from 2 m temperature and dewpoint (K)."""
+    rh = 100.0 * saturation_vapour_pressure(d2m_k - 273.15) / saturation_vapour_pressure(t2m_k - 273.15)
+    return np.clip(rh, 0.0, 100.0)
+
+
+def heat_index(t_c, rh):
+    """NWS heat index (C) from air temperature (C) and relative humidity (%)."""
+    t = t_c * 9.0 / 5.0 + 32.0
+    simple = 0.5 * (t + 61.0 + (t - 68.0) * 1.2 + rh * 0.094)
+
+    full = (-42.379 + 2.04901523 * t + 10.14333127 * rh - 0.22475541 * t * rh
+            - 0.00683783 * t * t - 0.05481717 * rh * rh + 0.00122874 * t * t * rh
+            + 0.00085282 * t * rh * rh - 0.00000199 * t * t * rh * rh)
+    dry = (rh < 13) & (t >= 80) & (t <= 112)
+    full = np.where(dry, full - ((13 - rh) / 4) * np.sqrt(np.clip((17 - np.abs(t - 95)) / 17, 0, None)), full)
+    humid = (rh > 85) & (t >= 80) & (t <= 87)
+    full = np.where(humid, full + ((rh - 85) / 10) * ((87 - t) / 5), full)
+
+    hi_f = np.where((simple + t) / 2 >= 80, full, simple)
+    return (hi_f - 32.0) * 5.0 / 9.0
+
+
+def humidex(t_c, d2m_k):
+    """Humidex from air temperature (C) and dewpoint (K)."""
+    e = 6.11 * np.exp(5417.7530 * (1 / 273.16 - 1 / d2m_k))
+    return t_c + 0.5555 * (e - 10.0)
+
+
+def wet_bulb(t_c, rh):
+    """Approximate wet-bulb temperature (C), Stull 2011."""
+    return (t_c * np.arctan(0.151977 * np.sqrt(rh + 8.313659))
+            + np.arctan(t_c + rh) - np.arctan(rh - 1.676331)
+            + 0.00391838 * rh ** 1.5 * np.arctan(0.023101 * rh) - 4.686035)
+
+
+def compute_indices(t2m_k, d2m_k):
+    """All indices for matching arrays of t2m and d2m (K), any shape."""
+    t_c = t2m_k - 273.15
+    rh = relative_humidity(t2m_k, d2m_k)
+    return {
+        "rh": rh,
+        "heat_index": heat_index(t_c, rh),
+        "humidex": humidex(t_c, d2m_k),
+        "wet_bulb": wet_bulb(t_c, rh),
+    }
+
+
+def zone_max_p95(weights, values, q=95):
+    """
+    Per-zone max and q-th percentile of a (time, used cells) array over each zone's cells
+    (NaN skipped) -> two (zones, time) arrays.
+    """
+    matrix = weights.matrix
+    gathered = values[:, matrix.indices]  # columns grouped by zone, in CSR order
+    n_zones, n_times = matrix.shape[0], values.shape[0]
+    starts, counts = matrix.indptr[:-1], np.diff(matrix.indptr)
+    nonempty = counts > 0
+
+    maxima = np.full((n_zones, n_times), np.nan)
+    percentiles = np.full((n_zones, n_times), np.nan)
+    if gathered.shape[1]:
+        maxima[nonempty] = np.fmax.reduceat(gathered, starts[nonempty], axis=1).T
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN zone/day -> NaN
+        for i in np.nonzero(nonempty)[0]:
+            percentiles[i] = np.nanpercentile(gathered[:, starts[i]:starts[i] + counts[i]], q, axis=1)
+    return maxima, percentiles
+
+
+def reduce_month(weights, t_block, d_block):
+    """Indices for one month's windowed t2m/d2m blocks -> {f"{index}_{stat}": (zones, time) array}."""
+    t_values = weights.gather(t_block, windowed=True).astype("float64")
+    d_values = weights.gather(d_block, windowed=True).astype("float64")
+    result = {}
+    with np.errstate(invalid="ignore"):
+        indices = compute_indices(t_values, d_values)
+    for name, values in indices.items():
+        result[f"{name}_mean"] = weights.reduce_values(values)
+        result[f"{name}_max"], result[f"{name}_p95"] = zone_max_p95(weights, values)
+    return result
+
+
+def read_window(nc_path, var, weights_cache, zones):
+    """
+    Open one monthly file and read the city window -> (weights, times, block). The weights use the same
+    ALL_TOUCHED/WEIGHTING settings (zonal_engine.py) as extract_rm2_tm2.py, so the index means line up with tm2.
+    """
+    with xr.open_dataset(nc_path, engine='h5netcdf') as ds:
+        da = ds[var]
+        time_dim = detect_time_dim(da)
+        da = da.transpose(time_dim, "latitude", "longitude")
+        lon, lat = da.longitude.values, da.latitude.values
+        key = grid_key(lon, lat)
+        if key not in weights_cache:
+            weights_cache[key] = ZonalWeights(zones, lon, lat, all_touched=ALL_TOUCHED, weighting=WEIGHTING)
+        weights = weights_cache[key]
+        row0, row1, col0, col1 = weights.window
+        block = da.isel(latitude=slice(row0, row1), longitude=slice(col0, col1)).values
+        return weights, da[time_dim].values, block
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-city heat-stress indices (mean/max/p95) from ERA5-Land t2m/d2m.")
+    parser.add_argument("--start", default="2024-01", help="First month, YYYY-MM (default %(default)s)")
+    parser.add_argument("--end", default="2024-12", help="Last month, YYYY-MM (default %(default)s)")
+    parser.add_argument("--boundary-store", default=boundary_store, help="GeoParquet from boundary_store.py")
+    parser.add_argument("--no-catalog", action="store_true",
+                        help="Pick files by name instead of through the metadata catalog (era5_catalog.py)")
+    args = parser.parse_args()
+
+    start, end = parse_month(args.start), parse_month(args.end)
+    if args.no_catalog:
+        t_files = {f.name.replace("2m_temperature_", ""): f for f in find_monthly_files(nc_folder, "t2m", start, end)}
+        d_files = {f.name.replace("2m_dewpoint_temperature_", ""): f for f in find_monthly_files(nc_folder, "d2m", start, end)}
+    else:
+        catalog = Era5Catalog.scan(nc_folder)
+        t_files = catalog.month_files("t2m", start, end)
+        d_files = catalog.month_files("d2m", start, end)
+    months = sorted(set(t_files) & set(d_files))
+    print(f"Found {len(months)} months with both t2m and d2m")
+    if not months:
+        exit(1)
+
+    if args.boundary_store:
+        zones = load_store_zones(args.boundary_store, crs=ERA5_CRS)
+    else:
+        zones = load_city_zones(cities_folder, crs=ERA5_CRS)
+    print(f"Loaded {len(zones)} shapefiles for {len({z['city'] for z in zones})} cities")
+
+    weights_cache = {}
+    frames = []
+    for month in months:
+        try:
+            weights, times, t_block = read_window(t_files[month], "t2m", weights_cache, zones)
+            _, d_times, d_block = read_window(d_files[month], "d2m", weights_cache, zones)
+            if t_block.shape != d_block.shape or not np.array_equal(times, d_times):
+                raise ValueError("t2m and d2m files do not share the same grid/time axis")
+        except Exception as e:
+            print(f"  Skip {month}: {e}")
+            continue
+
+        stats = reduce_month(weights, t_block, d_block)
+        n_zones, n_times = len(weights.zones), len(times)
+        frame = pd.DataFrame({
+            "city": np.repeat(np.array([z[0] for z in weights.zones], dtype=object), n_times),
+            "shapefile": np.repeat(np.array([z[1] for z in weights.zones], dtype=object), n_times),
+            "date": np.tile(pd.to_datetime(times), n_zones),
+        })
+        for column, values in stats.items():
+            frame[column] = values.ravel()
+        frames.append(frame[frame["heat_index_mean"].notna()])
+        print(f"  {month}: {n_times} days for {n_zones} shapefiles")
+
+    if not frames:
+        print("No heat-stress values computed.")
+        exit(1)
+    result = pd.concat(frames, ignore_index=True).sort_values(["city", "shapefile", "date"], kind="stable")
+    written = write_parquet(result, output_folder)
+    print(f"\nSaved {len(result)} city-days of {INDICES} x {STATS} in {len(written)} partitions under {output_folder}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+'''
+Parallel per-city CHSS extraction.
+
+Each monthly NetCDF file is decoded ONCE in the main process and its city window is written to a
+memory-mapped .npy file in a scratch folder. City jobs are then fanned out over a process pool;
+workers only map those arrays read-only (the OS shares the pages), so no worker re-decodes HDF5.
+
+Every worker reduces its city with the rows of the same sparse weight matrix the serial run uses,
+so the output is identical to the serial run. A failing file or city is recorded and reported at
+the end instead of aborting the pool.
+'''
+
+import os
+import sys
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import xarray as xr
+
+from era5_io import detect_time_dim
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from instrumentation import add_records, get_logger, span, take_records, worker_init
+
+log = get_logger("chss.parallel")
+
+
+def decode_to_memmap(nc_files, weights_for, scratch_dir):
+    """
+    Decode every (variable, monthly file) once into scratch_dir as a (time, window) .npy file.
+    weights_for(da) returns the ZonalWeights of that file's grid.
+    Returns the file specs the workers need and the list of files that failed to decode.
+    """
+    specs, failures = [], []
+    for var, monthly_files in nc_files.items():
+        for nc_path in monthly_files:
+            try:
+                with span("decode", var=var, file=nc_path.name), xr.open_dataset(nc_path, engine='h5netcdf') as ds:
+                    if var not in ds.data_vars:
+                        raise ValueError(f"{var} not found. Available: {list(ds.data_vars.keys())}")
+                    da = ds[var]
+                    time_dim = detect_time_dim(da)
+                    da = da.transpose(time_dim, "latitude", "longitude")
+                    weights = weights_for(da)
+
+                    row0, row1, col0, col1 = weights.window
+                    block = da.isel(latitude=slice(row0, row1), longitude=slice(col0, col1))
+                    npy_path = os.path.join(scratch_dir, f"{var}_{nc_path.stem}.npy")
+                    mm = np.lib.format.open_memmap(npy_path, mode="w+", dtype=block.dtype, shape=block.shape)
+                    mm[:] = block.values
+                    mm.flush()
+                    del mm
+
+                    specs.append({"var": var, "file": nc_path.name, "npy": npy_path,
+                                  "times": da[time_dim].values, "grid": id(weights)})
+                    log.debug(f"  Decoded {nc_path.name} ({block.shape[0]} time steps)")
+            except Exception as e:
+                log.warning(f"  Skip {nc_path.name}: {e}")
+                failures.append(("*", nc_path.name, str(e)))
+    return specs, failures
+
+
+def reduce_city(city, city_weights, specs):
+    """
+    Worker: reduce one city over every decoded file.
+    Returns (city, [(var, times, means, grid)], failures, spans recorded in this worker).
+    """
+    results, failures = [], []
+    with span("city", city=city):
+        for spec in specs:
+            weights = city_weights[spec["grid"]]
+            try:
+                with span("reduce", city=city, var=spec["var"], file=spec["file"]):
+                    block = np.load(spec["npy"], mmap_mode="r")
+                    means = weights.reduce(block, windowed=True)
+                results.append((spec["var"], spec["times"], means, spec["grid"]))
+            except Exception as e:
+                failures.append((city, spec["file"], str(e)))
+    return city, results, failures, take_records()
+
+
+def extract_parallel(nc_files, zones, weights_for, put, workers, scratch_dir=None):
+    """
+    Run the extraction with a pool of `workers` processes, one job per city.
+    Every result is handed to put(weights, var, times, means) as it arrives.
+    Returns the failures as (city, file, error) tuples.
+    """
+    scratch = tempfile.mkdtemp(prefix="chss_", dir=scratch_dir)
+    try:
+        log.info(f"\nDecoding {sum(len(f) for f in nc_files.values())} files into {scratch}")
+        grids = {}
+
+        def weights_for_tracked(da):
+            weights = weights_for(da)
+            grids[id(weights)] = weights
+            return weights
+
+        specs, failures = decode_to_memmap(nc_files, weights_for_tracked, scratch)
+
+        city_rows = {}
+        for i, (city, _) in enumerate(zones_key(zones)):
+            city_rows.setdefault(city, []).append(i)
+
+        city_grids = {}
+        log.info(f"\nReducing {len(city_rows)} cities with {workers} workers")
+        with ProcessPoolExecutor(max_workers=workers, initializer=worker_init) as pool:
+            futures = {}
+            for city, rows in city_rows.items():
+                city_weights = {key: weights.subset(rows) for key, weights in grids.items()}
+                city_grids[city] = city_weights
+                futures[pool.submit(reduce_city, city, city_weights, specs)] = city
+
+            for future in as_completed(futures):
+                city = futures[future]
+                try:
+                    _, results, city_failures, spans = future.result()
+                except Exception as e:
+                    failures.append((city, "*", str(e)))
+                    log.warning(f"  Failed for {city}: {e}")
+                    continue
+                add_records(spans)
+                failures.extend(city_failures)
+                for var, times, means, grid in results:
+                    put(city_grids[city][grid], var, times, means)
+                log.debug(f"  Done {city} ({len(results)} files, {len(city_failures)} failed)", extra={"city": city})
+
+        return failures
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def zones_key(zones):
+    """(city, shapefile) pairs in zone order."""
+    return [(z["city"], z["shapefile"]) for z in zones]
+
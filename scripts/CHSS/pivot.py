@@ -1,18 +1,29 @@
 import pandas as pd
 import os
+import argparse
 from pathlib import Path
 
+# NOTE: extract_rm2_tm2.py now writes the wide (city, shapefile, date, d2m, t2m) table directly
+# (Parquet, plus wide CSVs with --csv), so this pass is only needed for long-format CSVs
+# produced by older runs of the extractor.
+
 # Folder with your CSV files (one per city) - will overwrite originals here
 input_folder = r"D:\Downloads\Programming\Python\NASA Space Apps\heat_risk_dataextraction\city_daily_csv"
 
+parser = argparse.ArgumentParser(description="Fix headers / pivot long-format city CSVs in place.")
+parser.add_argument("--folder", default=input_folder, help="Folder with the city CSVs (default: input_folder)")
+parser.add_argument("--yes", action="store_true", help="Skip the confirmation pause (batch/benchmark runs)")
+args = parser.parse_args()
+
 # WARNING: This script will OVERWRITE the original CSVs in the input folder!
 # It fixes headers or pivots as needed. Back up your files first!
 print("WARNING: Original CSVs will be overwritten (headers fixed or pivoted).")
-print("Proceed? (Ctrl+C to cancel)\n")
-input("Press Enter to continue...")  # Optional pause for confirmation
+if not args.yes:
+    print("Proceed? (Ctrl+C to cancel)\n")
+    input("Press Enter to continue...")  # Optional pause for confirmation
 
 # Process each city CSV (overwriting in place)
-for csv_file in Path(input_folder).glob("*.csv"):
+for csv_file in Path(args.folder).glob("*.csv"):
     print(f"Processing {csv_file.name}...")
     try:
         df = pd.read_csv(csv_file)
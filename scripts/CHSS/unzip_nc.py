@@ -1,83 +1,223 @@
 import zipfile
 import os
 import glob
+import json
 import shutil
+import zlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import re  # For parsing zip names
 
 input_folder = r"D:\Downloads\Programming\Python\NASA Space Apps\heat_risk_dataextraction\era5-land-nc"
 output_folder = r"D:\Downloads\Programming\Python\NASA Space Apps\heat_risk_dataextraction\era5-land-unzipped"
 
-# Optional: Clear output folder to start fresh (uncomment if needed)
-# shutil.rmtree(output_folder, ignore_errors=True)
-os.makedirs(output_folder, exist_ok=True)
+# Manifest of what the incremental mode produced (kept in the output folder)
+MANIFEST_NAME = "unzip_manifest.json"
 
-# Find all "fake" .nc zips
-zip_paths = sorted(glob.glob(os.path.join(input_folder, "era5_land_2024_*.nc")))  # Sort for consistent order
-print(f"Found {len(zip_paths)} zip files in {input_folder}")
+# Zips processed at once in --incremental mode (zlib releases the GIL, so threads are enough)
+WORKERS = 4
 
-extracted_count = 0
-total_extracted_files = 0
+# Copy buffer for streaming members to disk
+COPY_BUFFER = 16 * 1024 * 1024
 
-for zip_path in zip_paths:
+
+def parse_zip_name(zip_name):
+    """
+    "era5_land_2024_01.nc" -> ("2024", "01", ""), "era5_land_2024_01_a2.nc" (second request area of
+    the month, see download.py) -> ("2024", "01", "a2"), or None if the name does not match.
+    """
+    match = re.search(r'era5_land_(\d{4})_(\d{2})(?:_(a\d+))?\.nc', zip_name)
+    return (match.group(1), match.group(2), match.group(3) or "") if match else None
+
+
+def output_name(member_name, year, month, area=""):
+    """New unique name, e.g. "2m_temperature_0_daily-mean.nc" -> "2m_temperature_2024_01[_a2]_daily-mean.nc"."""
+    original_name = os.path.basename(member_name)
+    suffix = f"_{area}" if area else ""
+    return original_name.replace("_0_daily-mean.nc", f"_{year}_{month}{suffix}_daily-mean.nc")
+
+
+def file_crc32(path):
+    """CRC-32 of a file on disk (same checksum zip stores for each member)."""
+    crc = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(COPY_BUFFER), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def is_up_to_date(info, new_path, previous):
+    """True if new_path already holds this zip member (size + CRC match)."""
+    if not os.path.exists(new_path):
+        return False
+    stat = os.stat(new_path)
+    if stat.st_size != info.file_size:
+        return False
+    # Trust the manifest if the file was not touched since we wrote it; otherwise re-check the CRC
+    if previous and previous.get("crc") == info.CRC and previous.get("mtime") == stat.st_mtime and previous.get("size") == stat.st_size:
+        return True
+    return file_crc32(new_path) == info.CRC
+
+
+def unpack_zip_incremental(zip_path, previous_manifest):
+    """Stream each .nc member to <name>.part and rename it into place, skipping members already on disk."""
     zip_name = os.path.basename(zip_path)
-    print(f"\nProcessing {zip_name}...")
-    
-    # Parse year and month from zip name (e.g., "era5_land_2024_01.nc" -> year=2024, month=01)
-    match = re.search(r'era5_land_(\d{4})_(\d{2})\.nc', zip_name)
-    if not match:
-        print(f"  Warning: Could not parse year/month from {zip_name}. Skipping.")
-        continue
-    year, month = match.groups()
-    print(f"  Parsed: year={year}, month={month}")
-    
+    parsed = parse_zip_name(zip_name)
+    if not parsed:
+        return zip_name, [], [f"Could not parse year/month from {zip_name}"]
+    year, month, area = parsed
+
+    entries, errors = [], []
     try:
         with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            contents = zip_ref.namelist()
-            print(f"  Contents: {contents}")
-            
-            # Extract and rename each .nc file
-            for file_in_zip in contents:
-                if not file_in_zip.endswith('.nc'):
+            for info in zip_ref.infolist():
+                if not info.filename.endswith('.nc'):
                     continue  # Skip non-.nc files
-                
-                # Original name inside zip (e.g., "2m_temperature_0_daily-mean.nc")
-                original_name = os.path.basename(file_in_zip)
-                
-                # New unique name (e.g., "2m_temperature_2024_01_daily-mean.nc")
-                # Replace "_0_" with "_{year}_{month}_"
-                new_name = original_name.replace("_0_daily-mean.nc", f"_{year}_{month}_daily-mean.nc")
+
+                new_name = output_name(info.filename, year, month, area)
                 new_path = os.path.join(output_folder, new_name)
-                
-                # Extract to a temp location, then rename and move
-                temp_path = zip_ref.extract(file_in_zip, output_folder)
-                if os.path.exists(temp_path):
-                    shutil.move(temp_path, new_path)
-                    print(f"  Extracted and renamed: {original_name} -> {new_name}")
-                    total_extracted_files += 1
-            
-            extracted_count += 1
-            print(f"  Successfully processed {zip_name} (extracted/renamed {len([c for c in contents if c.endswith('.nc')])} files)")
-            
+                status = "skipped"
+                if not is_up_to_date(info, new_path, previous_manifest.get(new_name)):
+                    # Readers never see a half-written member; an interrupted run only leaves a stale .part
+                    part_path = new_path + ".part"
+                    try:
+                        with zip_ref.open(info) as member, open(part_path, "wb") as out:
+                            shutil.copyfileobj(member, out, COPY_BUFFER)
+                        os.replace(part_path, new_path)
+                    finally:
+                        if os.path.exists(part_path):
+                            os.remove(part_path)
+                    status = "extracted"
+
+                stat = os.stat(new_path)
+                entries.append({
+                    "name": new_name, "zip": zip_name, "member": info.filename, "status": status,
+                    "size": stat.st_size, "crc": info.CRC, "mtime": stat.st_mtime,
+                })
     except zipfile.BadZipFile:
-        print(f"  Error: {zip_name} is not a valid zip. Skipping.")
+        errors.append(f"{zip_name} is not a valid zip")
     except Exception as e:
-        print(f"  Error processing {zip_name}: {e}. Skipping.")
-
-# Summary and verification
-print(f"\nUnzipping complete!")
-print(f"Processed {extracted_count} zips, extracted/renamed {total_extracted_files} files.")
-print(f"\nExtracted .nc files in {output_folder} (should be 24 total):")
-extracted_ncs = sorted(Path(output_folder).glob("*_daily-mean.nc"))
-if extracted_ncs:
-    for nc_file in extracted_ncs:
-        print(f"  - {nc_file.name}")
-    print(f"Total: {len(extracted_ncs)} .nc files")
-    
-    # Group by variable for quick check
-    temp_files = [f for f in extracted_ncs if "temperature" in f.name]
-    dewpoint_files = [f for f in extracted_ncs if "dewpoint" in f.name]
-    print(f"  - Temperature files (t2m): {len(temp_files)}")
-    print(f"  - Dewpoint files (d2m): {len(dewpoint_files)}")
-else:
-    print("  No .nc files found! Check errors above.")
\ No newline at end of file
+        errors.append(f"{zip_name}: {e}")
+    return zip_name, entries, errors
+
+
+def run_incremental(zip_paths, workers):
+    manifest_path = os.path.join(output_folder, MANIFEST_NAME)
+    previous = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            previous = json.load(f).get("files", {})
+
+    produced = dict(previous)
+    extracted = skipped = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for zip_name, entries, errors in pool.map(lambda p: unpack_zip_incremental(p, previous), zip_paths):
+            for error in errors:
+                print(f"  Error: {error}. Skipping.")
+            for entry in entries:
+                status = entry.pop("status")
+                produced[entry["name"]] = entry
+                extracted += status == "extracted"
+                skipped += status == "skipped"
+                print(f"  {zip_name}: {entry['name']} ({status})")
+
+    # Write the manifest atomically so a crash never leaves it half-written
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"files": dict(sorted(produced.items()))}, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+    print(f"\nIncremental unzip complete: {extracted} extracted, {skipped} already up to date.")
+    print(f"Manifest: {manifest_path}")
+
+
+def run_legacy(zip_paths):
+    extracted_count = 0
+    total_extracted_files = 0
+
+    for zip_path in zip_paths:
+        zip_name = os.path.basename(zip_path)
+        print(f"\nProcessing {zip_name}...")
+
+        # Parse year and month from zip name (e.g., "era5_land_2024_01.nc" -> year=2024, month=01)
+        parsed = parse_zip_name(zip_name)
+        if not parsed:
+            print(f"  Warning: Could not parse year/month from {zip_name}. Skipping.")
+            continue
+        year, month, area = parsed
+        print(f"  Parsed: year={year}, month={month}" + (f", area={area}" if area else ""))
+
+        try:
+            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+                contents = zip_ref.namelist()
+                print(f"  Contents: {contents}")
+
+                # Extract and rename each .nc file
+                for file_in_zip in contents:
+                    if not file_in_zip.endswith('.nc'):
+                        continue  # Skip non-.nc files
+
+                    original_name = os.path.basename(file_in_zip)
+                    new_name = output_name(file_in_zip, year, month, area)
+                    new_path = os.path.join(output_folder, new_name)
+
+                    # Extract to a temp location, then rename and move
+                    temp_path = zip_ref.extract(file_in_zip, output_folder)
+                    if os.path.exists(temp_path):
+                        shutil.move(temp_path, new_path)
+                        print(f"  Extracted and renamed: {original_name} -> {new_name}")
+                        total_extracted_files += 1
+
+                extracted_count += 1
+                print(f"  Successfully processed {zip_name} (extracted/renamed {len([c for c in contents if c.endswith('.nc')])} files)")
+
+        except zipfile.BadZipFile:
+            print(f"  Error: {zip_name} is not a valid zip. Skipping.")
+        except Exception as e:
+            print(f"  Error processing {zip_name}: {e}. Skipping.")
+
+    print(f"\nUnzipping complete!")
+    print(f"Processed {extracted_count} zips, extracted/renamed {total_extracted_files} files.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Unpack the ERA5-Land monthly zips (saved as .nc) into renamed .nc files.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Stream members to their final names (via .part files), skip unchanged ones and write a manifest")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Zips processed concurrently in --incremental mode")
+    parser.add_argument("--year", default="*", help="Only unpack this year's zips (default: all years)")
+    args = parser.parse_args()
+
+    # Optional: Clear output folder to start fresh (uncomment if needed)
+    # shutil.rmtree(output_folder, ignore_errors=True)
+    os.makedirs(output_folder, exist_ok=True)
+
+    # Find all "fake" .nc zips
+    zip_paths = sorted(glob.glob(os.path.join(input_folder, f"era5_land_{args.year}_*.nc")))  # Sort for consistent order
+    print(f"Found {len(zip_paths)} zip files in {input_folder}")
+
+    if args.incremental:
+        run_incremental(zip_paths, args.workers)
+    else:
+        run_legacy(zip_paths)
+
+    # Summary and verification
+    print(f"\nExtracted .nc files in {output_folder} (should be 2 per month):")
+    extracted_ncs = sorted(Path(output_folder).glob("*_daily-mean.nc"))
+    if extracted_ncs:
+        for nc_file in extracted_ncs:
+            print(f"  - {nc_file.name}")
+        print(f"Total: {len(extracted_ncs)} .nc files")
+
+        # Group by variable for quick check
+        temp_files = [f for f in extracted_ncs if "temperature" in f.name and "dewpoint" not in f.name]
+        dewpoint_files = [f for f in extracted_ncs if "dewpoint" in f.name]
+        print(f"  - Temperature files (t2m): {len(temp_files)}")
+        print(f"  - Dewpoint files (d2m): {len(dewpoint_files)}")
+    else:
+        print("  No .nc files found! Check errors above.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+'''
+Sparse zonal-mean engine for the CHSS extraction.
+
+Every city polygon is rasterized ONCE against the ERA5-Land grid into a row of a sparse
+(zones x grid cells) weight matrix. A whole month of daily values for every city is then
+reduced with a single sparse mat-mul over the flattened (time x cells) array, instead of
+one rio.clip + one mean per city, per file and per day.
+
+A "zone" is one (city, shapefile) pair, the same unit the per-city CSVs are keyed on.
+'''
+
+import os
+import sys
+
+import numpy as np
+import geopandas as gpd
+import rasterio.features
+from affine import Affine
+from scipy import sparse
+
+
+ERA5_CRS = "EPSG:4326"
+
+# Zonal weights shared by every CHSS reduction (extract_rm2_tm2.py, heat_stress.py).
+# ALL_TOUCHED matches the old rio.clip(all_touched=True). WEIGHTING = None gives the plain mean over
+# touched cells; "coslat", "coverage" or "coverage+coslat" weight cells by area and/or by the fraction
+# inside the city polygon.
+ALL_TOUCHED = True
+WEIGHTING = None
+
+
+def load_city_zones(cities_folder, crs=ERA5_CRS, bounds=None, verbose=True):
+    """Load every city shapefile as a zone (repaired, reprojected, overlap-checked)."""
+    zones = []
+    for city_name in sorted(os.listdir(cities_folder)):
+        city_path = os.path.join(cities_folder, city_name)
+        if not os.path.isdir(city_path):
+            continue
+
+        for shp_file in sorted(os.listdir(city_path)):
+            if not shp_file.endswith(".shp"):
+                continue
+            # A "_fixed" shapefile is picked up through its original below
+            if shp_file.endswith("_fixed.shp") and os.path.exists(os.path.join(city_path, shp_file.replace("_fixed.shp", ".shp"))):
+                continue
+
+            # Prefer fixed/reprojected version if exists (from manual verification)
+            fixed_shp = shp_file.replace(".shp", "_fixed.shp")
+            shp_path = os.path.join(city_path, fixed_shp if os.path.exists(os.path.join(city_path, fixed_shp)) else shp_file)
+
+            gdf = gpd.read_file(shp_path)
+
+            # Validate and repair geometries
+            gdf['geometry'] = gdf['geometry'].buffer(0)
+            gdf = gdf[gdf.geometry.is_valid].reset_index(drop=True)
+            if gdf.empty:
+                if verbose:
+                    print(f"  Error: No valid geometries after repair. Skipping {city_name}/{shp_file}.")
+                continue
+
+            if gdf.crs is None:
+                if verbose:
+                    print(f"  Warning: {city_name}/{shp_file} has no CRS—setting to {crs} (assuming lat/lon).")
+                gdf = gdf.set_crs(crs)
+            elif gdf.crs != crs:
+                gdf = gdf.to_crs(crs)
+
+            zone_bounds = gdf.total_bounds  # [min_lon, min_lat, max_lon, max_lat]
+            if bounds is not None and not bboxes_overlap(zone_bounds, bounds):
+                if verbose:
+                    print(f"  Error: {city_name}/{shp_file} {zone_bounds} does not overlap {bounds}. Skipping.")
+                continue
+
+            zones.append({
+                "city": city_name,
+                "shapefile": os.path.basename(shp_path).replace(".shp", ""),
+                "geometry": gdf.geometry.union_all() if hasattr(gdf.geometry, "union_all") else gdf.geometry.unary_union,
+                "bounds": tuple(float(b) for b in zone_bounds),
+            })
+    return zones
+
+
+def load_store_zones(store_path, crs=ERA5_CRS, bounds=None, verbose=True):
+    """Same zones as load_city_zones, read from the shared boundary store (scripts/boundary_store.py)."""
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from boundary_store import load_boundaries
+
+    boundaries = load_boundaries(store_path, crs=crs, bbox=bounds)
+    if verbose and bounds is not None:
+        print(f"  {len(boundaries)} shapefiles in the boundary store overlap {bounds}")
+    return [{"city": row.city, "shapefile": row.shapefile, "geometry": row.geometry,
+             "bounds": tuple(float(b) for b in row.geometry.bounds)}
+            for row in boundaries.itertuples(index=False)]
+
+
+def bboxes_overlap(a, b):
+    """True if two (min_x, min_y, max_x, max_y) boxes overlap."""
+    return a[0] < b[2] and a[2] > b[0] and a[1] < b[3] and a[3] > b[1]
+
+
+def grid_transform(lon, lat):
+    """Affine transform (north-up) of a regular lon/lat grid given its cell-centre coordinates."""
+    lon = np.asarray(lon, dtype="float64")
+    lat = np.asarray(lat, dtype="float64")
+    dx = (lon[-1] - lon[0]) / (len(lon) - 1)
+    dy = abs(lat[-1] - lat[0]) / (len(lat) - 1)
+    top = max(lat[0], lat[-1])
+    return Affine(dx, 0.0, lon[0] - dx / 2, 0.0, -dy, top + dy / 2)
+
+
+class ZonalWeights:
+    """Sparse (zones x grid cells) weight matrix for one ERA5 grid."""
+
+    def __init__(self, zones, lon, lat, all_touched=True, weighting=None, oversample=10):
+        """
+        weighting: None (plain mean over touched cells, same as rio.clip + mean),
+                   "coslat" (cell-area weighted), "coverage" (fraction of each cell inside
+                   the polygon) or "coverage+coslat".
+        """
+        self.zones = [(z["city"], z["shapefile"]) for z in zones]
+        self.lon = np.asarray(lon)
+        self.lat = np.asarray(lat)
+        self.shape = (len(self.lat), len(self.lon))
+        self.lat_descending = self.lat[0] > self.lat[-1]
+
+        transform = grid_transform(self.lon, self.lat)
+        rows, cols, vals = [], [], []
+        for i, zone in enumerate(zones):
+            cells, weights = self._zone_cells(zone["geometry"], transform, all_touched, weighting, oversample)
+            rows.append(np.full(len(cells), i, dtype="int64"))
+            cols.append(cells)
+            vals.append(weights)
+
+        n_cells = self.shape[0] * self.shape[1]
+        matrix = sparse.csr_matrix(
+            (np.concatenate(vals) if vals else np.empty(0),
+             (np.concatenate(rows) if rows else np.empty(0, "int64"),
+              np.concatenate(cols) if cols else np.empty(0, "int64"))),
+            shape=(len(zones), n_cells),
+        )
+        matrix.sum_duplicates()
+        matrix.eliminate_zeros()
+
+        # Only keep the columns (grid cells) that at least one zone touches
+        self.cells = np.unique(matrix.indices)
+        self.matrix = matrix[:, self.cells].tocsr()
+
+        # Bounding window of used cells, so callers can read just that block of the grid
+        if len(self.cells):
+            cell_rows, cell_cols = np.divmod(self.cells, self.shape[1])
+            self.window = (int(cell_rows.min()), int(cell_rows.max()) + 1,
+                           int(cell_cols.min()), int(cell_cols.max()) + 1)
+        else:
+            self.window = (0, 0, 0, 0)
+
+    def _zone_cells(self, geometry, transform, all_touched, weighting, oversample):
+        """Rasterize one geometry in its own bbox window; return flat cell indices and weights."""
+        n_rows, n_cols = self.shape
+        inv = ~transform
+        min_x, min_y, max_x, max_y = geometry.bounds
+        c0, r0 = inv * (min_x, max_y)
+        c1, r1 = inv * (max_x, min_y)
+        r0, c0 = max(int(np.floor(r0)) - 1, 0), max(int(np.floor(c0)) - 1, 0)
+        r1, c1 = min(int(np.ceil(r1)) + 1, n_rows), min(int(np.ceil(c1)) + 1, n_cols)
+        if r1 <= r0 or c1 <= c0:
+            return np.empty(0, "int64"), np.empty(0)
+
+        win_shape = (r1 - r0, c1 - c0)
+        win_transform = transform * Affine.translation(c0, r0)
+        touched = rasterio.features.rasterize(
+            [(geometry, 1)], out_shape=win_shape, transform=win_transform,
+            fill=0, all_touched=all_touched, dtype="uint8",
+        ).astype(bool)
+
+        weights = touched.astype("float64")
+        if weighting and "coverage" in weighting:
+            # Fraction of each cell covered, from an oversampled rasterization
+            fine = rasterio.features.rasterize(
+                [(geometry, 1)], out_shape=(win_shape[0] * oversample, win_shape[1] * oversample),
+                transform=win_transform * Affine.scale(1 / oversample), fill=0, dtype="uint8",
+            )
+            coverage = fine.reshape(win_shape[0], oversample, win_shape[1], oversample).mean(axis=(1, 3))
+            weights = np.where(touched, coverage, 0.0)
+        if weighting and "coslat" in weighting:
+            row_lat = transform.f + transform.e * (np.arange(r0, r1) + 0.5)
+            weights = weights * np.cos(np.deg2rad(row_lat))[:, None]
+
+        win_rows, win_cols = np.nonzero(weights)
+        if not self.lat_descending:
+            # Grid is stored south-up; rasterization above was done north-up
+            grid_rows = n_rows - 1 - (win_rows + r0)
+        else:
+            grid_rows = win_rows + r0
+        cells = grid_rows.astype("int64") * n_cols + (win_cols + c0)
+        return cells, weights[win_rows, win_cols]
+
+    def subset(self, rows):
+        """Weights for a subset of zones (same grid and window, only the cells those zones use)."""
+        rows = np.asarray(rows)
+        matrix = self.matrix[rows].tocsr()
+        used = np.unique(matrix.indices)
+        sub = object.__new__(ZonalWeights)
+        sub.__dict__.update(self.__dict__)
+        sub.zones = [self.zones[i] for i in rows]
+        sub.cells = self.cells[used]
+        sub.matrix = matrix[:, used].tocsr()  # column order is preserved, so row sums are bit-identical
+        return sub
+
+    def window_cells(self):
+        """Flat indices of the used cells relative to self.window (for windowed reads)."""
+        row0, row1, col0, col1 = self.window
+        rows, cols = np.divmod(self.cells, self.shape[1])
+        return (rows - row0) * (col1 - col0) + (cols - col0)
+
+    def gather(self, cube, windowed=False):
+        """(time, lat, lon) cube -> (time, used cells) array. With windowed=True the cube is already cut to self.window."""
+        cube = np.asarray(cube)
+        flat = cube.reshape(cube.shape[0], -1)
+        return flat[:, self.window_cells() if windowed else self.cells]
+
+    def reduce_values(self, values):
+        """
+        Zonal means of a (time, used cells) array -> (zones, time) array.
+        NaN cells are skipped (like mean(skipna=True)); a zone/day with no valid cells is NaN.
+        """
+        valid = np.isfinite(values)
+        numerator = self.matrix @ np.where(valid, values, 0.0).T
+        denominator = self.matrix @ valid.T.astype("float64")
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = numerator / denominator
+        means[denominator == 0] = np.nan
+        return means
+
+    def reduce(self, cube, windowed=False):
+        """Zonal means of a (time, lat, lon) cube -> (zones, time) array."""
+        return self.reduce_values(self.gather(cube, windowed))
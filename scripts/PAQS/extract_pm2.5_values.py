@@ -5,66 +5,80 @@ import numpy as np
 import pandas as pd
 import json
 import os
+import argparse
+import sys
 
-# Function to convert PM2.5 to WHO category only
-def pm25_to_who_category(pm25):
-    breakpoints = [
-        (0.0, 5.0, "Good"),
-        (5.1, 10.0, "Moderate"),
-        (10.1, 15.0, "Unhealthy for Sensitive Groups"),
-        (15.1, 25.0, "Unhealthy"),
-        (25.1, 35.0, "Very Unhealthy"),
-        (35.1, 999.9, "Hazardous")
-    ]
-    
-    for C_low, C_high, category in breakpoints:
-        if C_low <= pm25 <= C_high:
-            return category
-    return "Out of Range"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pm25_extraction import exposure_summarizer, extract_concurrent, pm25_to_who_category
+from instrumentation import add_arguments, setup_from_args, span, write_summary
 
 # Paths
 raster_path = r"pm2.5_dataextraction/tif/sdei-global-annual-gwr-pm2-5-modis-misr-seawifs-viirs-aod-v5-gl-04-2022-geotiff.tif"
 cities_folder = "city_shape_files/cities"
 
-results = []
-
-with rasterio.open(raster_path) as src:
-    for city_name in os.listdir(cities_folder):
-        city_dir = os.path.join(cities_folder, city_name)
-        shp_files = [f for f in os.listdir(city_dir) if f.endswith(".shp")]
-        if not shp_files:
-            print(f"No shapefile found for {city_name}")
-            continue
-        shp_path = os.path.join(city_dir, shp_files[0])
-
-        # Load city polygon
-        city_gdf = gpd.read_file(shp_path)
-        city_geom = [json.loads(city_gdf.to_json())['features'][0]['geometry']]
-
-        # Mask raster with city polygon
-        out_image, out_transform = rasterio.mask.mask(src, city_geom, crop=True)
-        out_image = out_image[0]
-
-        # Compute mean and max PM2.5 ignoring nodata
-        pm25_values = out_image[out_image != src.nodata]
-        if len(pm25_values) == 0:
-            mean_pm25 = max_pm25 = None
-            mean_cat = max_cat = None
-        else:
-            mean_pm25 = float(np.nanmean(pm25_values))
-            max_pm25 = float(np.nanmax(pm25_values))
 
-            # Mean & Max Category
-            mean_cat = pm25_to_who_category(mean_pm25)
-            max_cat = pm25_to_who_category(max_pm25)
+def extract_serial(raster_path, cities_folder):
+    """Original one-city-at-a-time extraction (first feature of each shapefile, full mask per city)."""
+    results = []
+    with rasterio.open(raster_path) as src:
+        for city_name in os.listdir(cities_folder):
+            city_dir = os.path.join(cities_folder, city_name)
+            shp_files = [f for f in os.listdir(city_dir) if f.endswith(".shp")]
+            if not shp_files:
+                print(f"No shapefile found for {city_name}")
+                continue
+            shp_path = os.path.join(city_dir, shp_files[0])
+
+            # Load city polygon
+            city_gdf = gpd.read_file(shp_path)
+            city_geom = [json.loads(city_gdf.to_json())['features'][0]['geometry']]
+
+            # Mask raster with city polygon
+            out_image, out_transform = rasterio.mask.mask(src, city_geom, crop=True)
+            out_image = out_image[0]
+
+            # Compute mean and max PM2.5 ignoring nodata
+            pm25_values = out_image[out_image != src.nodata]
+            if len(pm25_values) == 0:
+                mean_pm25 = max_pm25 = None
+                mean_cat = max_cat = None
+            else:
+                mean_pm25 = float(np.nanmean(pm25_values))
+                max_pm25 = float(np.nanmax(pm25_values))
+
+                # Mean & Max Category
+                mean_cat = pm25_to_who_category(mean_pm25)
+                max_cat = pm25_to_who_category(max_pm25)
+
+            results.append({
+                "city": city_name,
+                "mean_pm25": mean_pm25,
+                "mean_AQI_Category": mean_cat,
+                "max_pm25": max_pm25,
+                "max_AQI_Category": max_cat,
+            })
+    return results
+
+
+parser = argparse.ArgumentParser(description="City mean/max PM2.5 and WHO categories from the SEDAC GeoTIFF.")
+parser.add_argument("--workers", type=int, default=1,
+                    help="Thread pool size; >1 reads each city's bbox window concurrently and unions multi-feature boundaries")
+parser.add_argument("--exposure", action="store_true",
+                    help="Also report the share of each city's area in every WHO band and the area-weighted mean")
+parser.add_argument("--population", help="Population raster (e.g. WorldPop) for population shares with --exposure")
+parser.add_argument("--boundary-store", help="GeoParquet from scripts/boundary_store.py (instead of the shapefiles)")
+add_arguments(parser)
+args = parser.parse_args()
+setup_from_args(args)
 
-        results.append({
-            "city": city_name,
-            "mean_pm25": mean_pm25,
-            "mean_AQI_Category": mean_cat,
-            "max_pm25": max_pm25,
-            "max_AQI_Category": max_cat,
-        })
+with span("extract", workers=args.workers):
+    if args.exposure:
+        results = extract_concurrent(raster_path, cities_folder, workers=max(args.workers, 1),
+                                     summarize=exposure_summarizer(args.population), store_path=args.boundary_store)
+    elif args.workers > 1 or args.boundary_store:
+        results = extract_concurrent(raster_path, cities_folder, workers=max(args.workers, 1), store_path=args.boundary_store)
+    else:
+        results = extract_serial(raster_path, cities_folder)
 
 # Convert to DataFrame
 df = pd.DataFrame(results)
@@ -73,6 +87,8 @@ df = pd.DataFrame(results)
 df_rounded = df.copy()
 for col in ["mean_pm25", "max_pm25"]:
     df_rounded[col] = df_rounded[col].round(2)
+for col in [c for c in df_rounded.columns if c.startswith(("pct_", "area_weighted", "pop_weighted"))]:
+    df_rounded[col] = df_rounded[col].astype(float).round(2)
 
 # Print results for display
 for _, row in df.iterrows():
@@ -88,3 +104,4 @@ for _, row in df.iterrows():
 # Optional: Save results
 # df_rounded.to_csv("pm2.5_dataextraction/city_pm25_aqi_categories_mean_max.csv", index=False)
 df_rounded.to_excel("pm2.5_dataextraction/city_pm25_aqi_categories_mean_maxaaaa.xlsx", index=False)
+write_summary(args.summary)
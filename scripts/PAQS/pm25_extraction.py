@@ -0,0 +1,243 @@
+'''
+City PM2.5 extraction helpers for PAQS.
+
+Each city reads only the bbox window of its (unioned, reprojected) boundary from the global SEDAC
+GeoTIFF, masks it with the polygon, and summarizes the valid pixels. Cities run on a thread pool:
+GDAL releases the GIL while reading, and every thread keeps its own open dataset handle because
+rasterio datasets must not be shared between threads.
+'''
+
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import geopandas as gpd
+import rasterio
+from rasterio.features import geometry_mask, geometry_window
+from rasterio.windows import WindowError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from instrumentation import get_logger, span
+
+log = get_logger("paqs.extract")
+
+
+# WHO bands: upper edge (inclusive) of each category
+WHO_CATEGORIES = ["Good", "Moderate", "Unhealthy for Sensitive Groups", "Unhealthy", "Very Unhealthy", "Hazardous"]
+WHO_UPPER_EDGES = np.array([5.0, 10.0, 15.0, 25.0, 35.0, 999.9])
+OUT_OF_RANGE = "Out of Range"
+
+
+def classify_who(pm25):
+    """
+    Vectorized WHO band index of every value (searchsorted over the band edges): 0 = Good ... 5 = Hazardous,
+    -1 = out of range (negative, above 999.9 or NaN). Values between two listed ranges (e.g. 5.05) go to
+    the upper band instead of "Out of Range".
+    """
+    pm25 = np.asarray(pm25, dtype="float64")
+    codes = np.searchsorted(WHO_UPPER_EDGES, pm25, side="left")
+    codes[(pm25 < 0) | (pm25 > WHO_UPPER_EDGES[-1]) | ~np.isfinite(pm25)] = -1
+    return codes
+
+
+# Function to convert PM2.5 to WHO category only
+def pm25_to_who_category(pm25):
+    code = int(classify_who([pm25])[0])
+    return WHO_CATEGORIES[code] if code >= 0 else OUT_OF_RANGE
+
+
+def band_fractions(codes, weights=None):
+    """Share (%) of the total weight (pixel count, area or population) in each WHO band."""
+    totals = np.bincount(codes[codes >= 0], weights=None if weights is None else weights[codes >= 0],
+                         minlength=len(WHO_CATEGORIES))
+    grand_total = totals.sum()
+    return totals / grand_total * 100 if grand_total > 0 else np.full(len(WHO_CATEGORIES), np.nan)
+
+
+def pixel_area_weights(src, window, shape):
+    """Relative pixel areas of a window: cos(latitude) of each row for geographic rasters, 1 otherwise."""
+    if src.crs is None or not src.crs.is_geographic:
+        return np.ones(shape)
+    transform = src.window_transform(window)
+    row_lat = transform.f + transform.e * (np.arange(shape[0]) + 0.5)
+    return np.broadcast_to(np.cos(np.deg2rad(row_lat))[:, None], shape)
+
+
+def population_on_window(population_path, src, window, shape):
+    """Population raster summed onto the PM2.5 window grid (GDAL 'sum' resampling)."""
+    from rasterio.warp import reproject
+    from rasterio.enums import Resampling
+
+    population = np.zeros(shape, dtype="float64")
+    with rasterio.open(population_path) as pop_src:
+        reproject(source=rasterio.band(pop_src, 1), destination=population,
+                  dst_transform=src.window_transform(window), dst_crs=src.crs,
+                  dst_nodata=0, resampling=Resampling.sum)
+    population[~np.isfinite(population) | (population < 0)] = 0
+    return population
+
+
+def list_city_shapefiles(cities_folder):
+    """
+    (city, [shapefile paths] or None) for every city folder: all of the city's shapefiles, _fixed versions
+    preferred, exactly the rows the boundary store holds for it (boundary_store.city_shapefiles).
+    """
+    from boundary_store import city_shapefiles
+    groups = city_shapefiles(cities_folder)
+    return [(city_name, groups.get(city_name)) for city_name in sorted(os.listdir(cities_folder))
+            if os.path.isdir(os.path.join(cities_folder, city_name))]
+
+
+def load_city_geometry(shp_paths, crs):
+    """Union of the city's shapefiles, repaired and reprojected to crs (the same geometry the store path gives)."""
+    from boundary_store import shapefiles_geometry
+    return shapefiles_geometry(shp_paths, crs)
+
+
+def city_sources(cities_folder, crs, store_path=None):
+    """
+    (city, source) per city, where source is a list of shapefile paths (read in the worker), a ready geometry
+    in crs taken from the shared boundary store (scripts/boundary_store.py), or None if the city has no shapefile.
+    """
+    if not store_path:
+        return list_city_shapefiles(cities_folder)
+    from boundary_store import city_geometries, load_boundaries
+    return list(city_geometries(load_boundaries(store_path, crs=crs)).items())
+
+
+def source_geometry(source, crs):
+    return load_city_geometry(source, crs) if isinstance(source, list) else source
+
+
+def read_city_window(src, geometry):
+    """
+    Read only the window covering geometry. Returns (data, inside, window) where inside marks
+    pixels whose centre is in the polygon, or None if the city is outside the raster.
+    """
+    try:
+        window = geometry_window(src, [geometry])
+    except WindowError:
+        return None
+    data = src.read(1, window=window)
+    transform = src.window_transform(window)
+    inside = geometry_mask([geometry], out_shape=data.shape, transform=transform, invert=True)
+    return data, inside, window
+
+
+def valid_pixels(src, data, inside):
+    """Boolean mask of pixels inside the city with a valid (non-nodata, finite) value."""
+    valid = inside & np.isfinite(data)
+    if src.nodata is not None:
+        valid &= data != src.nodata
+    return valid
+
+
+def city_stats(city_name, values):
+    """Mean and max PM2.5 and their WHO categories (the PAQS result row)."""
+    if len(values) == 0:
+        mean_pm25 = max_pm25 = None
+        mean_cat = max_cat = None
+    else:
+        mean_pm25 = float(np.nanmean(values))
+        max_pm25 = float(np.nanmax(values))
+
+        # Mean & Max Category
+        mean_cat = pm25_to_who_category(mean_pm25)
+        max_cat = pm25_to_who_category(max_pm25)
+
+    return {
+        "city": city_name,
+        "mean_pm25": mean_pm25,
+        "mean_AQI_Category": mean_cat,
+        "max_pm25": max_pm25,
+        "max_AQI_Category": max_cat,
+    }
+
+
+class ThreadLocalRaster:
+    """One open rasterio dataset per worker thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.opened = []
+        self.lock = threading.Lock()
+
+    def get(self):
+        src = getattr(self.local, "src", None)
+        if src is None:
+            src = self.local.src = rasterio.open(self.path)
+            with self.lock:
+                self.opened.append(src)
+        return src
+
+    def close(self):
+        for src in self.opened:
+            src.close()
+
+
+def summarize_mean_max(city_name, src, data, valid, window):
+    """Default summary: the mean/max PAQS row of the valid pixels."""
+    return city_stats(city_name, data[valid])
+
+
+def exposure_summarizer(population_path=None):
+    """
+    Summary with the pixel-level exposure distribution: share of the city's area (and population, if a
+    population raster is given) in each WHO band, plus the latitude-aware area-weighted mean.
+    """
+    def summarize(city_name, src, data, valid, window):
+        row = city_stats(city_name, data[valid])
+        if window is None or not valid.any():
+            return row
+        values = data[valid].astype("float64")
+        codes = classify_who(values)
+        area = pixel_area_weights(src, window, data.shape)[valid]
+
+        row["area_weighted_mean_pm25"] = float(np.sum(values * area) / np.sum(area))
+        for category, pct in zip(WHO_CATEGORIES, band_fractions(codes, area)):
+            row[f"pct_area_{category}"] = pct
+        if population_path:
+            population = population_on_window(population_path, src, window, data.shape)[valid]
+            row["population"] = float(population.sum())
+            row["pop_weighted_mean_pm25"] = float(np.sum(values * population) / population.sum()) if population.sum() > 0 else None
+            for category, pct in zip(WHO_CATEGORIES, band_fractions(codes, population)):
+                row[f"pct_pop_{category}"] = pct
+        return row
+
+    return summarize
+
+
+def extract_concurrent(raster_path, cities_folder, workers=8, summarize=summarize_mean_max, store_path=None):
+    """
+    Extract every city on a thread pool.
+    summarize(city, src, data, valid, window) builds each result row from the city's window.
+    With store_path, boundaries come from the shared boundary store instead of the shapefiles.
+    """
+    rasters = ThreadLocalRaster(raster_path)
+    with rasterio.open(raster_path) as src:
+        crs = src.crs
+
+    def process(city):
+        city_name, source = city
+        if source is None:
+            log.warning(f"No shapefile found for {city_name}")
+            return None
+        with span("city", city=city_name):
+            src = rasters.get()
+            window = read_city_window(src, source_geometry(source, crs))
+            if window is None:
+                log.debug(f"  {city_name}: boundary outside the raster", extra={"city": city_name})
+                return summarize(city_name, src, np.empty((0, 0)), np.empty((0, 0), dtype=bool), None)
+            data, inside, win = window
+            log.debug(f"  {city_name}: {data.shape[1]}x{data.shape[0]} window", extra={"city": city_name})
+            return summarize(city_name, src, data, valid_pixels(src, data, inside), win)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(process, city_sources(cities_folder, crs, store_path)))
+    finally:
+        rasters.close()
+    return [r for r in results if r is not None]
@@ -0,0 +1,170 @@
+'''
+Multi-year PM2.5 stacks for PAQS.
+
+Takes a folder of annual SEDAC PM2.5 GeoTIFFs on the same grid, treats them as a (year x rows x cols)
+stack and reads each city's bbox window ONCE for all years. From that window it emits a per-city,
+per-year table (mean / max / percentiles) and per-city trends: the least-squares slope of the city
+mean series and the per-pixel slopes, all computed vectorized across the year axis.
+'''
+
+import os
+import re
+import argparse
+import sys
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import rasterio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pm25_extraction import ThreadLocalRaster, city_sources, read_city_window, source_geometry, valid_pixels
+from instrumentation import add_arguments, get_logger, setup_from_args, span, write_summary
+
+log = get_logger("paqs.trends")
+
+
+# Configuration (Update paths as needed)
+raster_folder = r"pm2.5_dataextraction/tif"
+cities_folder = "city_shape_files/cities"
+output_path = r"pm2.5_dataextraction/city_pm25_yearly_trends.xlsx"
+
+# e.g. "sdei-global-annual-gwr-pm2-5-modis-misr-seawifs-viirs-aod-v5-gl-04-2022-geotiff.tif"
+YEAR_PATTERN = re.compile(r"-((?:19|20)\d{2})-geotiff\.tif$")
+
+PERCENTILES = [50, 90, 95]
+
+
+def find_annual_rasters(folder):
+    """Sorted [(year, path)] of the annual rasters in folder."""
+    rasters = []
+    for name in os.listdir(folder):
+        match = YEAR_PATTERN.search(name)
+        if match:
+            rasters.append((int(match.group(1)), os.path.join(folder, name)))
+    return sorted(rasters)
+
+
+def check_same_grid(paths):
+    """All rasters must share CRS, transform and size to be stacked window by window."""
+    with rasterio.open(paths[0]) as ref:
+        grid = (ref.crs, ref.transform, ref.width, ref.height)
+    for path in paths[1:]:
+        with rasterio.open(path) as src:
+            if (src.crs, src.transform, src.width, src.height) != grid:
+                raise ValueError(f"{os.path.basename(path)} is not on the same grid as {os.path.basename(paths[0])}")
+    return grid
+
+
+def read_city_stack(rasters, geometry):
+    """(years, n_pixels) array of one city's in-polygon pixels, NaN where a year has no valid value."""
+    ref = rasters[0].get()
+    window = read_city_window(ref, geometry)
+    if window is None:
+        return np.empty((len(rasters), 0))
+    data, inside, win = window
+
+    stack = np.full((len(rasters), int(inside.sum())), np.nan)
+    for y, raster in enumerate(rasters):
+        src = raster.get()
+        year_data = data if y == 0 else src.read(1, window=win)
+        values = year_data.astype("float64")
+        values[~valid_pixels(src, year_data, inside)] = np.nan
+        stack[y] = values[inside]
+    return stack
+
+
+def least_squares_slope(years, values):
+    """Slope of values (years, n) against years for every column, ignoring NaN entries."""
+    x = np.asarray(years, dtype="float64")[:, None]
+    valid = np.isfinite(values)
+    n = valid.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x_mean = (x * valid).sum(axis=0) / n
+        y_mean = np.where(valid, values, 0.0).sum(axis=0) / n
+        dx = np.where(valid, x - x_mean, 0.0)
+        dy = np.where(valid, values - y_mean, 0.0)
+        slope = (dx * dy).sum(axis=0) / (dx * dx).sum(axis=0)
+    slope[n < 2] = np.nan
+    return slope
+
+
+def city_year_stats(city_name, years, stack):
+    """Per-year rows and the trend row for one city."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN years/pixels stay NaN on purpose
+        counts = np.isfinite(stack).sum(axis=1)
+        means = np.nanmean(stack, axis=1) if stack.shape[1] else np.full(len(years), np.nan)
+        maxima = np.nanmax(stack, axis=1) if stack.shape[1] else np.full(len(years), np.nan)
+        pcts = np.nanpercentile(stack, PERCENTILES, axis=1) if stack.shape[1] else np.full((len(PERCENTILES), len(years)), np.nan)
+
+    yearly = pd.DataFrame({"city": city_name, "year": years, "mean_pm25": means, "max_pm25": maxima,
+                           **{f"p{p}_pm25": pcts[i] for i, p in enumerate(PERCENTILES)}, "valid_pixels": counts})
+
+    pixel_slopes = least_squares_slope(years, stack) if stack.shape[1] else np.empty(0)
+    series_slope = least_squares_slope(years, means[:, None])[0]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        trend = {
+            "city": city_name,
+            "first_year": years[0],
+            "last_year": years[-1],
+            "mean_pm25_slope_per_year": series_slope,
+            "mean_pixel_slope_per_year": float(np.nanmean(pixel_slopes)) if pixel_slopes.size else np.nan,
+            "pct_pixels_increasing": float(np.mean(pixel_slopes[np.isfinite(pixel_slopes)] > 0) * 100)
+            if np.isfinite(pixel_slopes).any() else np.nan,
+        }
+    return yearly, trend
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-city, per-year PM2.5 stats and trends from annual rasters.")
+    parser.add_argument("--rasters", default=raster_folder, help="Folder with the annual PM2.5 GeoTIFFs")
+    parser.add_argument("--cities", default=cities_folder)
+    parser.add_argument("--output", default=output_path)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--boundary-store", help="GeoParquet from scripts/boundary_store.py (instead of the shapefiles)")
+    add_arguments(parser)
+    args = parser.parse_args()
+    setup_from_args(args)
+
+    annual = find_annual_rasters(args.rasters)
+    if not annual:
+        log.error(f"No annual PM2.5 rasters found in {args.rasters}")
+        exit(1)
+    years = [year for year, _ in annual]
+    crs = check_same_grid([path for _, path in annual])[0]
+    log.info(f"Found {len(annual)} annual rasters: {years[0]}-{years[-1]}")
+
+    rasters = [ThreadLocalRaster(path) for _, path in annual]
+
+    def process(city):
+        city_name, source = city
+        if source is None:
+            log.warning(f"No shapefile found for {city_name}")
+            return None
+        with span("city", city=city_name, years=len(years)):
+            stack = read_city_stack(rasters, source_geometry(source, crs))
+            return city_year_stats(city_name, years, stack)
+
+    try:
+        with span("extract", workers=args.workers), ThreadPoolExecutor(max_workers=args.workers) as pool:
+            results = [r for r in pool.map(process, city_sources(args.cities, crs, args.boundary_store)) if r is not None]
+    finally:
+        for raster in rasters:
+            raster.close()
+
+    yearly = pd.concat([r[0] for r in results], ignore_index=True)
+    trends = pd.DataFrame([r[1] for r in results])
+    print(trends.round(3).to_string(index=False))
+
+    with pd.ExcelWriter(args.output) as writer:
+        yearly.round(2).to_excel(writer, sheet_name="yearly", index=False)
+        trends.round(4).to_excel(writer, sheet_name="trends", index=False)
+    log.info(f"\nSaved {len(yearly)} city-years and {len(trends)} trends to {args.output}")
+    write_summary(args.summary, log)
+
+
+if __name__ == "__main__":
+    main()
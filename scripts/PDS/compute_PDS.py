@@ -14,13 +14,29 @@
 #   https://www.oecd-ilibrary.org/urban-rural-and-regional-development/cities-in-the-world_d0efcbda-en
 #
 # CATEGORY DEFINITION:
-# - Perfect: 100 → Optimal livability and compactness.
+# - Very Healthy: 100 → Optimal livability and compactness.
 # - Healthy: 76–99 → Balanced density, supports accessibility and efficiency.
 # - Moderate: 51–75 → Mixed conditions, manageable with some strain.
 # - Poor: 26–50 → Problematic density, overcrowding or sprawl.
 # - Unhealthy: 1–25 → Critical density extremes, low livability.
+# (Cap and thresholds: "pds" in scripts/vital_scoring.json)
 
-import math
+import os
+import sys
+import csv
+import argparse
+
+import numpy as np
+
+# Density cap and category thresholds come from scripts/vital_scoring.json
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from vital_scoring import categorize, load_config, pds_bin_scores, pds_raw_scores, round_half_up, urban_density
+
+config = load_config()["pds"]
+
+parser = argparse.ArgumentParser(description="Population Density Score (PDS) of the VITAL cities.")
+parser.add_argument("--output", help="Also save the table as CSV (headers as data/all_data.xlsx's PDS table)")
+args = parser.parse_args()
 
 cities = [
     {"city": "Manila", "population": 1902590, "urban_area_km2": 43.7},
@@ -35,43 +51,28 @@ cities = [
     {"city": "Istanbul", "population": 15701602, "urban_area_km2": 5343}
 ]
 
-def compute_density(population, area_km2):
-    """Compute urban population density (people per km²)."""
-    return population / area_km2
-
-def log_density_score(density, min_d, cap_d=100000):
-    """Compute log-scaled Population Density Score (PDS)."""
-    density = min(density, cap_d)
-    return 100 * (math.log(cap_d + 1) - math.log(density + 1)) / (math.log(cap_d + 1) - math.log(min_d + 1))
-
-def categorize(score):
-    """Classify city based on PDS score."""
-    if score == 100:
-        return "Perfect", "Optimal livability and compactness"
-    elif score >= 76:
-        return "Healthy", "Balanced density; supports livability and efficiency"
-    elif score >= 51:
-        return "Moderate", "Mixed conditions; manageable but with some strain"
-    elif score >= 26:
-        return "Poor", "Problematic density; overcrowding or sprawl risks"
-    else:
-        return "Unhealthy", "Critical density extremes; low livability"
-
-# Compute densities
-densities = [compute_density(c["population"], c["urban_area_km2"]) for c in cities]
-min_density = min(densities)
+# Compute densities and scores for every city at once
+population = np.array([c["population"] for c in cities])
+area = np.array([c["urban_area_km2"] for c in cities])
+densities = urban_density(population, area)
+raw_scores = pds_raw_scores(densities, config)
+scores = round_half_up(raw_scores, config["decimals"])  # displayed; categories bin the raw score rounded once
+binned = pds_bin_scores(raw_scores, config)
+categories = categorize(binned, config["bins"])
+descriptions = categorize(binned, config["bins"], "description")
 
 # Print header
 print(f"{'City':<15} {'Pop (2023)':<12} {'Area km²':<10} {'Density':<15} {'PDS Score':<12} {'Category':<12} {'Description'}")
 print("-" * 120)
 
-# Calculate and print results
-for c in cities:
-    city = c["city"]
-    pop = c["population"]
-    area = c["urban_area_km2"]
-    dens = compute_density(pop, area)
-    pds = log_density_score(dens, min_density)
-    category, description = categorize(round(pds))
+# Print results
+for c, dens, pds, category, description in zip(cities, densities, scores, categories, descriptions):
+    print(f"{c['city']:<15} {c['population']:<12,} {c['urban_area_km2']:<10.1f} {dens:<15.1f} {pds:<12.1f} {category:<12} {description}")
 
-    print(f"{city:<15} {pop:<12,} {area:<10.1f} {dens:<15.1f} {pds:<12.1f} {category:<12} {description}")
+if args.output:
+    with open(args.output, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["City", "Population (2023)", "Area km²", "Urban Density", "ULS", "ULS_Category"])
+        for c, dens, pds, category in zip(cities, densities, scores, categories):
+            writer.writerow([c["city"], c["population"], c["urban_area_km2"], round(float(dens), 1), float(pds), category])
+    print(f"\nSaved {len(cities)} cities to {args.output}")
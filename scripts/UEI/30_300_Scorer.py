@@ -5,80 +5,84 @@ which were convenient to analyze for proximity. The LCZ classes used under this
 publishing. The team member came up with the idea of using LCZs as assessment for urban green health with the help of 3-30-300 rule, AI only assisted with execution of the said idea.
 '''
 
+import os
+import sys
+import argparse
+
 import numpy as np
 import pandas as pds
 import rasterio
-from scipy.ndimage import distance_transform_edt
 
-with rasterio.open(r"Path\city_clipped.tif") as src:
-    pixel_data = src.read(1)
+from rasterio.windows import Window
+
+from uei_scoring import (ACCESS_RADII_M, ACCESS_RADIUS_M, TILE_SIZE, access_curve, access_curve_fields, class_histogram,
+                         distance_counts, uei_scores, window_pixel_size_m, windowed_distance_counts)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from results_store import DEFAULT_VINTAGE, ResultsStore, results_db
+
+parser = argparse.ArgumentParser(description="UEI 30% Cover and 300m Access scores of a clipped city LCZ raster.")
+parser.add_argument("raster", nargs="?", default=r"Path\city_clipped.tif")
+parser.add_argument("--windowed", action="store_true",
+                    help="Read the raster tile by tile (bounded memory for large metro rasters)")
+parser.add_argument("--tile-size", type=int, default=TILE_SIZE, help="Tile edge in pixels for --windowed")
+parser.add_argument("--country", default="", help="Country stored with the scores (only needed for cities missing from city_countries.json)")
+parser.add_argument("--city", help="City name (default: raster file name without _clipped.tif)")
+parser.add_argument("--vintage", default=DEFAULT_VINTAGE, help="Data vintage, e.g. the LCZ map version")
+parser.add_argument("--store", default=results_db, help="Results store (re-runs overwrite, no duplicates)")
+parser.add_argument("--radii", type=int, nargs="+", default=ACCESS_RADII_M,
+                    help="Access radii in metres for the accessibility curve (300 is always included)")
+args = parser.parse_args()
+city_name = args.city or os.path.basename(args.raster).replace("_clipped", "").rsplit(".", 1)[0]
+radii = sorted(set(args.radii) | {ACCESS_RADIUS_M})
+
+with rasterio.open(args.raster) as src:
+    if args.windowed:
+        # Histograms per tile (halo = largest radius), merged exactly
+        histogram, distances = windowed_distance_counts(src, max(radii), args.tile_size)
+    else:
+        pixel_data = src.read(1)
+        histogram = class_histogram(pixel_data) #Count the number of pixels under each LCZ class
+
+        # Distance of every compact pixel to natural cover, in metres from the raster's own pixel size
+        pixel_m = window_pixel_size_m(src, Window(0, 0, src.width, src.height))
+        print(f"Pixel size: {pixel_m[0]:.1f} x {pixel_m[1]:.1f} m")
+        distances = distance_counts(pixel_data, pixel_m, max(radii))
+
+# Compact pixels within every radius of natural cover, from the one distance pass
+curve = access_curve(distances, radii)
+areas_nearby_300m = curve[ACCESS_RADIUS_M]
 
 '''
-                                30% Cover Score
+                                30% Cover Score and Natural Cover within 300m Score
 '''
-unique, counts = np.unique(pixel_data, return_counts=True) #Count the number of pixels under each unique LCZ class
-
 # Create a table
-table = pds.DataFrame({"Class": unique, "Pixel Count": counts})
+present = np.nonzero(histogram)[0]
+table = pds.DataFrame({"Class": present, "Pixel Count": histogram[present]})
 print(table["Class"]) #Display Available LCZ Classes in the country
 print(table["Pixel Count"]) #Display number of pixel counts for each class
 
-Total_Area_Range = [num for num in range(1, 16) if num in table['Class']] #Check and include LCZs relevant to the city data
-Total_Areas = int(table.loc[Total_Area_Range, 'Pixel Count'].sum()) #Sum the number of pixels with LCZ data in the city to get total area of available data
-
-low_envInteg = [num for num in [1, 2, 3, 7, 8, 10, 14, 15, 16] if num in table['Class']] #Check and include low pervious green cover LCZs that are relevant to the city
-low_envInteg_total = int(table.loc[low_envInteg, 'Pixel Count'].sum()) #Sum the number of LCZs in the city that has low pervious green cover
-high_envInteg = [num for num in [4, 5, 6, 9, 11, 12, 13] if num in table['Class']] #Check and include high pervious green cover LCZs that are relevant to the city
-high_envInteg_total = int(table.loc[high_envInteg, 'Pixel Count'].sum()) #Sum the number of LCZs in the city that has high pervious green cover
-high_envInteg_relFreq = round(((high_envInteg_total / Total_Areas)*100), 2) #Get relative freq of high environment integration LCZs to total number of pixel data
-cover30_score = round(((high_envInteg_relFreq / 30) * 100), 2) #Translate to a 100 scoring system
-
-if cover30_score > 100: cover30_score = 100
-
-'''
-                                Natural Cover within 300m Score
-'''
-
-compact_minNatCov = [num for num in [1, 2, 3, 7, 8] if num in table['Class']]
-compact_minNatCov_total = int(table.loc[compact_minNatCov, 'Pixel Count'].sum())
+scores = uei_scores(histogram, areas_nearby_300m)
+curve_fields = access_curve_fields(curve, scores['Total Compact Areas'])
+print(pds.DataFrame({"Radius (m)": list(curve),
+                     "Compact Areas Within": list(curve.values()),
+                     "Relative Frequency": [curve_fields[f'Areas within {r}m NatCov Relative Frequency'] for r in curve]})
+      .to_string(index=False)) #Accessibility curve
 
-mask_compact = np.isin(pixel_data, compact_minNatCov)   # all compact/dense LCZs
-mask_natural = np.isin(pixel_data, high_envInteg)       # all LCZs with natural covers
-
-# Distance to nearest natural cover (in pixels)
-dist_to_natural = distance_transform_edt(~mask_natural) #mask all natural covers as false to calculate distance of true values (compact LCZs) to them.
-
-# Pick compact pixels within 3 pixels (~300 m as res = 100 m)
-nearby_compact = mask_compact & (dist_to_natural <= 3)
-
-areas_nearby_300m = np.sum(nearby_compact) #Get the sum of all compact LCZs that evaluated true for 300m accessibility
-
-areas_nearby_300m_relFreq = round((areas_nearby_300m / compact_minNatCov_total) * 100, 2)
-
-uei_score = round(((cover30_score + areas_nearby_300m_relFreq) / 2), 2)
-
-#Prepare UEI data for display in the 
+#Prepare UEI data for display
 city_uei_data = {
-    'Country': input('Enter Country Name: '),
-    'City': input('Enter City Name: '),
-    'Areas With 30% Cover' : high_envInteg_total,
-    'Areas With 30% Cover Relative Frequency': high_envInteg_relFreq,
-    '30% Ideal Cover Score': cover30_score,
-    'Areas within 300m NatCov': areas_nearby_300m,
-    'Areas within 300m NatCov Relative Frequency': areas_nearby_300m_relFreq,
-    'Total Compact Areas': compact_minNatCov_total,
-    'Total Areas': Total_Areas,
-    'UEI Score': uei_score
+    'Country': args.country,
+    'City': city_name,
+    **scores
 }
 
 print(city_uei_data) #Preview Scores and Data
 
 '''
-                                                                Save to CSV
+                                                                Save to the results store
 '''
 
-# Convert the row to a DataFrame
-uei_df = pds.DataFrame([city_uei_data])
-
-# Append to CSV without overwriting
-uei_df.to_csv("cities_uei_data3.csv", mode='a', header=False, index=False) #Set header to false if csv file to write to already exists
+# Upsert keyed by (country, city, metric, vintage); export UEI_Scores.csv with results_store.py
+with ResultsStore(args.store) as store:
+    store.upsert(args.country, city_name, {**curve_fields, **scores}, args.vintage, source=os.path.basename(args.raster))
+print(f"Saved {city_name} to {args.store}")
@@ -2,30 +2,179 @@
 AI USE ACKNOWLEDGEMENT: ChatGPT assisted with copying the pixel data and transferring it into the clipped raster map of the city, turning it into usable tif for analyses.
 '''
 
+import os
+import sys
+import json
+import hashlib
+import argparse
+
 import geopandas as gpd
 import rasterio
-from rasterio.mask import mask
-
-# Load the shapefile
-shapefile = gpd.read_file(r"Path\city.shp")
-
-# Open raster
-with rasterio.open(r"Path\lcz_filter_v3.tif") as src:
-    # Convert the shapefile to the coordinate system used by rasterio for safety
-    shapefile = shapefile.to_crs(src.crs)
-
-    # Clip raster to city boundary
-    out_image, out_transform = mask(src, shapefile.geometry, crop=True)
-    out_meta = src.meta.copy()
-
-# Update pixel data using the transformed image and numpy arr
-out_meta.update({
-    "driver": "GTiff",
-    "height": out_image.shape[1],
-    "width": out_image.shape[2],
-    "transform": out_transform
-})
-
-# Write the city bounded data and image to a new file
-with rasterio.open(r"Path\city_clipped.tif", "w", **out_meta) as dest:
-    dest.write(out_image)
+import rasterio.shutil
+from rasterio.enums import Resampling
+from rasterio.env import GDALVersion
+from rasterio.features import geometry_mask, geometry_window
+
+# Configuration (Update paths as needed)
+lcz_raster = r"Path\lcz_filter_v3.tif"
+city_shapefile = r"Path\city.shp"
+clipped_output = r"Path\city_clipped.tif"
+
+# Output layout: tiled + compressed Cloud-Optimized GeoTIFF with internal overviews
+BLOCK_SIZE = 512
+COMPRESS = "DEFLATE"
+OVERVIEW_RESAMPLING = Resampling.nearest  # LCZ classes are categorical
+
+CACHE_SUFFIX = ".cache.json"
+
+
+def raster_fingerprint(path):
+    """Cheap fingerprint of the source raster: size, mtime and a hash of its header (first 1 MB)."""
+    stat = os.stat(path)
+    with open(path, "rb") as f:
+        head = hashlib.sha256(f.read(1024 * 1024)).hexdigest()
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "head_sha256": head}
+
+
+def geometry_hash(shapes):
+    """Hash of the (reprojected) clip geometries."""
+    digest = hashlib.sha256()
+    for wkb in shapes.to_wkb():
+        digest.update(wkb)
+    return digest.hexdigest()
+
+
+def is_cached(output_path, key):
+    cache_path = output_path + CACHE_SUFFIX
+    if not (os.path.exists(output_path) and os.path.exists(cache_path)):
+        return False
+    with open(cache_path, encoding="utf-8") as f:
+        return json.load(f) == key
+
+
+def overview_factors(width, height, block_size=BLOCK_SIZE):
+    factors = []
+    factor = 2
+    while max(width, height) / factor >= block_size / 2:
+        factors.append(factor)
+        factor *= 2
+    return factors
+
+
+def write_cog(data, profile, output_path):
+    """Write a tiled, compressed GTiff with internal overviews, then copy it into COG layout."""
+    tmp_path = output_path + ".tmp.tif"
+    profile = dict(profile)
+    profile.update({
+        "driver": "GTiff",
+        "tiled": True,
+        "blockxsize": BLOCK_SIZE,
+        "blockysize": BLOCK_SIZE,
+        "compress": COMPRESS,
+        "predictor": 2 if data.dtype.kind in "iu" else 3,
+    })
+    with rasterio.open(tmp_path, "w", **profile) as dest:
+        dest.write(data)
+        factors = overview_factors(dest.width, dest.height)
+        if factors:
+            dest.build_overviews(factors, OVERVIEW_RESAMPLING)
+
+    final_tmp = output_path + ".part.tif"
+    if GDALVersion.runtime().at_least("3.1"):
+        rasterio.shutil.copy(tmp_path, final_tmp, driver="COG", compress=COMPRESS,
+                             blocksize=BLOCK_SIZE, overview_resampling=OVERVIEW_RESAMPLING.name.upper())
+    else:
+        # GDAL < 3.1: tiled GTiff with the overviews copied in front of the data
+        rasterio.shutil.copy(tmp_path, final_tmp, driver="GTiff", tiled=True, blockxsize=BLOCK_SIZE,
+                             blockysize=BLOCK_SIZE, compress=COMPRESS, copy_src_overviews=True)
+    os.replace(final_tmp, output_path)
+    os.remove(tmp_path)
+
+
+def clip_raster(raster_path, shapefile_path, output_path, use_cache=True):
+    """Clip raster_path to the shapefile, reading only the polygon's window. Returns False if the cache was hit."""
+    # Load the shapefile
+    shapefile = gpd.read_file(shapefile_path)
+    return clip_to_shapes(raster_path, shapefile, output_path, os.path.basename(shapefile_path), use_cache)
+
+
+def clip_to_shapes(raster_path, boundaries, output_path, label, use_cache=True):
+    """clip_raster for a GeoDataFrame/GeoSeries of boundaries (e.g. rows of the shared boundary store)."""
+    with rasterio.open(raster_path) as src:
+        # Convert the shapefile to the coordinate system used by rasterio for safety
+        shapes = boundaries.to_crs(src.crs).geometry
+
+        key = {"source": raster_fingerprint(raster_path), "geometry": geometry_hash(shapes),
+               "block_size": BLOCK_SIZE, "compress": COMPRESS}
+        if use_cache and is_cached(output_path, key):
+            print(f"  Cached: {output_path} (source raster and boundary unchanged)")
+            return False
+
+        # Read only the window covering the polygon bbox (same window as mask(crop=True))
+        window = geometry_window(src, shapes)
+        out_image = src.read(window=window)
+        out_transform = src.window_transform(window)
+
+        # Pixels outside the city boundary become nodata
+        nodata = src.nodata if src.nodata is not None else 0
+        outside = geometry_mask(shapes, out_shape=out_image.shape[1:], transform=out_transform)
+        out_image[:, outside] = nodata
+        out_meta = src.profile.copy()
+
+    # Update pixel data using the transformed image and numpy arr
+    out_meta.update({
+        "height": out_image.shape[1],
+        "width": out_image.shape[2],
+        "transform": out_transform,
+        "nodata": nodata,
+    })
+
+    # Write the city bounded data and image to a new file
+    write_cog(out_image, out_meta, output_path)
+    with open(output_path + CACHE_SUFFIX, "w", encoding="utf-8") as f:
+        json.dump(key, f, indent=2)
+    print(f"  Clipped {label} -> {output_path} ({out_image.shape[2]}x{out_image.shape[1]})")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clip the LCZ raster to city boundaries (tiled COG output, cached).")
+    parser.add_argument("--raster", default=lcz_raster)
+    parser.add_argument("--shapefile", default=city_shapefile)
+    parser.add_argument("--output", default=clipped_output)
+    parser.add_argument("--cities-folder", help="Clip every city folder (all of its shapefiles, as in the boundary store) into --output-folder")
+    parser.add_argument("--boundary-store", help="Clip every city of this GeoParquet (scripts/boundary_store.py) into --output-folder")
+    parser.add_argument("--output-folder", help="Where <city>_clipped.tif files go in --cities-folder/--boundary-store mode")
+    parser.add_argument("--no-cache", action="store_true", help="Always re-clip")
+    args = parser.parse_args()
+
+    if args.boundary_store or args.cities_folder:
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        from boundary_store import BASE_CRS, city_shapefiles, load_boundaries, shapefiles_geometry
+
+    if args.boundary_store:
+        os.makedirs(args.output_folder, exist_ok=True)
+        with rasterio.open(args.raster) as src:
+            boundaries = load_boundaries(args.boundary_store, crs=src.crs)
+        for city_name, city_rows in boundaries.groupby("city", sort=True):
+            output_path = os.path.join(args.output_folder, f"{city_name}_clipped.tif")
+            clip_to_shapes(args.raster, city_rows, output_path, city_name, use_cache=not args.no_cache)
+    elif args.cities_folder:
+        os.makedirs(args.output_folder, exist_ok=True)
+        groups = city_shapefiles(args.cities_folder)
+        for city_name in sorted(os.listdir(args.cities_folder)):
+            if not os.path.isdir(os.path.join(args.cities_folder, city_name)):
+                continue
+            geometry = shapefiles_geometry(groups.get(city_name, []))
+            if geometry is None:
+                print(f"No shapefile found for {city_name}")
+                continue
+            output_path = os.path.join(args.output_folder, f"{city_name}_clipped.tif")
+            boundaries = gpd.GeoDataFrame(geometry=[geometry], crs=BASE_CRS)
+            clip_to_shapes(args.raster, boundaries, output_path, city_name, use_cache=not args.no_cache)
+    else:
+        clip_raster(args.raster, args.shapefile, args.output, use_cache=not args.no_cache)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,8 @@ of target cities against the extracted shape by the code.
 
 '''
 City Shapefile extractor sample, in the context of Greece
+NOTE: for onboarding several cities, gadm_batch_extract.py does this (and the Cairo district merge)
+from a JSON config in one run, reading only the matching GADM rows.
 '''
 
 # Load the shapefile
@@ -0,0 +1,247 @@
+'''
+One-pass UEI batch scorer over the global LCZ raster (lcz_filter_v3.tif).
+
+Replaces the per-city Raster_Map_Clipper.py -> 30_300_Scorer.py round trip. All city boundaries are
+rasterized into city-label tiles on the LCZ grid, and the global raster is streamed ONCE, tile by tile
+(only tiles that touch a city are read). Per tile, every city's LCZ class histogram comes from one
+combined (city x class) bincount, and the access counts from a distance transform of each city's
+pixels in the tile plus a halo of the largest access radius. Radii are in metres (pixel size and halo
+from the raster's transform/CRS at each tile's latitude) and every radius of the accessibility curve
+comes from the same distance pass. The result is a full UEI_Scores table (plus the curves with --curves).
+
+City pixels are selected like rasterio.mask.mask (pixel centres inside the polygon), and only natural
+cover inside the city counts, so the scores match the clip-then-score flow. Cities whose bboxes overlap
+are rasterized in separate label layers so shared pixels count for both.
+'''
+
+import os
+import sys
+import argparse
+
+import numpy as np
+import pandas as pds
+import geopandas as gpd
+import rasterio
+import rasterio.features
+from rasterio.windows import Window
+
+from uei_scoring import (ACCESS_RADII_M, ACCESS_RADIUS_M, COMPACT_CLASSES, HIGH_ENV_INTEG_CLASSES, TILE_SIZE,
+                         access_curve, access_curve_fields, distance_histogram, tile_halo_px, uei_scores,
+                         window_pixel_size_m)
+
+
+# Configuration (Update paths as needed)
+lcz_raster = r"Path\lcz_filter_v3.tif"
+cities_folder = r"Path\city_shape_files\cities"
+output_csv = r"Path\UEI_Scores.csv"
+
+# Column names of data/UEI DATA/UEI_Scores.csv
+UEI_SCORES_COLUMNS = {
+    'Areas With 30% Cover': 'Areas With 30% Cover',
+    'Areas With 30% Cover Relative Frequency': 'Areas With 30% Cover RF',
+    '30% Ideal Cover Score': '30% Ideal Cover Score',
+    'Areas within 300m NatCov': 'Access within 300m NatCov',
+    'Areas within 300m NatCov Relative Frequency': 'Access within 300m NatCov RF',
+    'Total Compact Areas': 'Total Compact Areas',
+    'Total Areas': 'Total Areas',
+    'UEI Score': 'UEI Score',
+}
+
+
+def load_cities(cities_folder=None, cities_table=None):
+    """
+    City boundaries as a GeoDataFrame (Country, City, geometry), one dissolved row per city.
+    Either a folder of city subfolders with shapefiles (every shapefile of a city, unioned by the boundary
+    store's rule), or a CSV table with Country, City, Shapefile columns.
+    """
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from boundary_store import city_shapefiles, shapefiles_geometry
+
+    rows = []
+    if cities_table:
+        for rec in pds.read_csv(cities_table).to_dict("records"):
+            rows.append((rec.get("Country", ""), rec["City"], [rec["Shapefile"]]))
+    else:
+        groups = city_shapefiles(cities_folder)
+        for city_name in sorted(os.listdir(cities_folder)):
+            if not os.path.isdir(os.path.join(cities_folder, city_name)):
+                continue
+            if city_name not in groups:
+                print(f"No shapefile found for {city_name}")
+                continue
+            rows.append(("", city_name, groups[city_name]))
+
+    frames = []
+    for country, city, shp_paths in rows:
+        geometry = shapefiles_geometry(shp_paths, "EPSG:4326")
+        if geometry is None:
+            print(f"No valid geometry for {city}")
+            continue
+        frames.append({"Country": country, "City": city, "geometry": geometry})
+    return gpd.GeoDataFrame(frames, geometry="geometry", crs="EPSG:4326")
+
+
+def load_store_cities(store_path):
+    """load_cities from the shared boundary store (scripts/boundary_store.py): no shapefile parsing or repair."""
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from boundary_store import city_geometries, load_boundaries
+
+    geometries = city_geometries(load_boundaries(store_path, crs="EPSG:4326"))
+    frames = [{"Country": "", "City": city, "geometry": geometry} for city, geometry in geometries.items()]
+    return gpd.GeoDataFrame(frames, geometry="geometry", crs="EPSG:4326")
+
+
+def city_windows(cities, src):
+    """Pixel window (row0, row1, col0, col1) of every city bbox on the raster grid, clipped to the raster."""
+    windows = []
+    for geom in cities.geometry:
+        min_x, min_y, max_x, max_y = geom.bounds
+        row_a, col_a = src.index(min_x, max_y)
+        row_b, col_b = src.index(max_x, min_y)
+        row0, row1 = max(min(row_a, row_b), 0), min(max(row_a, row_b) + 1, src.height)
+        col0, col1 = max(min(col_a, col_b), 0), min(max(col_a, col_b) + 1, src.width)
+        windows.append((row0, row1, col0, col1))
+    return windows
+
+
+def windows_overlap(a, b):
+    return a[0] < b[1] and b[0] < a[1] and a[2] < b[3] and b[2] < a[3]
+
+
+def assign_layers(windows):
+    """Greedy layering so no two cities in the same label layer have overlapping windows."""
+    layers = []
+    for i, window in enumerate(windows):
+        for members in layers:
+            if not any(windows_overlap(window, windows[j]) for j in members):
+                members.append(i)
+                break
+        else:
+            layers.append([i])
+    return layers
+
+
+def score_cities(src, cities, max_radius_m=max(ACCESS_RADII_M), tile_size=TILE_SIZE):
+    """
+    Stream the raster once and return per-city class histograms and compact-pixel distance histograms
+    (whole metres up to max_radius_m, see uei_scoring.distance_histogram).
+    """
+    n = len(cities)
+    windows = city_windows(cities, src)
+    layers = assign_layers(windows)
+    geometries = list(cities.geometry)
+
+    histograms = np.zeros((n + 1, 256), dtype="int64")  # row 0 = outside every city
+    distances = np.zeros((n, int(max_radius_m) + 2), dtype="int64")
+
+    # Only the tiles touched by at least one city window are read
+    tiles = set()
+    for row0, row1, col0, col1 in windows:
+        if row1 <= row0 or col1 <= col0:
+            continue
+        for ti in range(row0 // tile_size, (row1 - 1) // tile_size + 1):
+            for tj in range(col0 // tile_size, (col1 - 1) // tile_size + 1):
+                tiles.add((ti, tj))
+    print(f"Reading {len(tiles)} tiles of {tile_size}px for {n} cities ({len(layers)} label layers)")
+
+    for ti, tj in sorted(tiles):
+        row, col = ti * tile_size, tj * tile_size
+        core_h, core_w = min(tile_size, src.height - row), min(tile_size, src.width - col)
+        halo_rows, halo_cols = tile_halo_px(src, row, row + core_h, max_radius_m)
+        row0, col0 = max(row - halo_rows, 0), max(col - halo_cols, 0)
+        row1, col1 = min(row + core_h + halo_rows, src.height), min(col + core_w + halo_cols, src.width)
+        padded = (row0, row1, col0, col1)
+        core = (row - row0, row - row0 + core_h, col - col0, col - col0 + core_w)
+
+        pixels = src.read(1, window=Window(col0, row0, col1 - col0, row1 - row0))
+        classes = pixels.astype("int64")
+        natural = np.isin(pixels, HIGH_ENV_INTEG_CLASSES)
+        compact = np.isin(pixels, COMPACT_CLASSES)
+        transform = src.window_transform(Window(col0, row0, col1 - col0, row1 - row0))
+        pixel_m = window_pixel_size_m(src, Window(col0, row0, col1 - col0, row1 - row0))
+        core_slice = (slice(core[0], core[1]), slice(core[2], core[3]))
+
+        for members in layers:
+            present = [i for i in members if windows_overlap(windows[i], padded)]
+            if not present:
+                continue
+            labels = rasterio.features.rasterize(
+                [(geometries[i], i + 1) for i in present], out_shape=pixels.shape,
+                transform=transform, fill=0, dtype="int32",
+            )
+
+            # Combined (city x class) key -> one bincount for every city in the tile core
+            keys = labels[core_slice].astype("int64") * 256 + classes[core_slice]
+            histograms += np.bincount(keys.ravel(), minlength=(n + 1) * 256).reshape(n + 1, 256)
+
+            for i in present:
+                inside = labels == i + 1
+                if not inside.any():
+                    continue
+                rows, cols = np.nonzero(inside)
+                r0, r1, c0, c1 = rows.min(), rows.max() + 1, cols.min(), cols.max() + 1
+                sub = (slice(r0, r1), slice(c0, c1))
+                # Core bounds relative to this city's sub-array
+                sub_core = (core[0] - r0, core[1] - r0, core[2] - c0, core[3] - c0)
+                distances[i] += distance_histogram(natural[sub] & inside[sub], compact[sub] & inside[sub], pixel_m,
+                                                   max_radius_m, core=tuple(max(v, 0) for v in sub_core))
+    return histograms[1:], distances
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score UEI for every city in one pass over the global LCZ raster.")
+    parser.add_argument("--raster", default=lcz_raster)
+    parser.add_argument("--cities-folder", default=cities_folder)
+    parser.add_argument("--cities-table", help="CSV with Country, City, Shapefile columns (instead of the folder)")
+    parser.add_argument("--boundary-store", help="GeoParquet from scripts/boundary_store.py (instead of the folder)")
+    parser.add_argument("--output", default=output_csv)
+    parser.add_argument("--tile-size", type=int, default=TILE_SIZE)
+    parser.add_argument("--store", help="Also upsert every city's scores into this results store (scripts/results_store.py)")
+    parser.add_argument("--vintage", default="default", help="Vintage stored with --store")
+    parser.add_argument("--radii", type=int, nargs="+", default=ACCESS_RADII_M,
+                        help="Access radii in metres for the accessibility curves (300 is always included)")
+    parser.add_argument("--curves", help="Also write the per-city accessibility curves (relative frequency per radius) to this CSV")
+    args = parser.parse_args()
+    radii = sorted(set(args.radii) | {ACCESS_RADIUS_M})
+
+    if args.boundary_store:
+        cities = load_store_cities(args.boundary_store)
+    else:
+        cities = load_cities(args.cities_folder, args.cities_table)
+    print(f"Loaded {len(cities)} cities")
+
+    with rasterio.open(args.raster) as src:
+        cities = cities.to_crs(src.crs)
+        histograms, distances = score_cities(src, cities, max(radii), args.tile_size)
+
+    rows, curve_rows, store_rows = [], [], []
+    for (country, city), histogram, city_distances in zip(zip(cities["Country"], cities["City"]), histograms, distances):
+        curve = access_curve(city_distances, radii)
+        scores = uei_scores(histogram, curve[ACCESS_RADIUS_M])
+        curve_fields = access_curve_fields(curve, scores['Total Compact Areas'])
+        rows.append({"Country": country, "City": city, **{UEI_SCORES_COLUMNS[k]: v for k, v in scores.items()}})
+        curve_rows.append({"Country": country, "City": city,
+                           **{f"{r}m": curve_fields[f'Areas within {r}m NatCov Relative Frequency'] for r in curve}})
+        store_rows += [(country, city, metric, args.vintage, value) for metric, value in {**curve_fields, **scores}.items()]
+
+    table = pds.DataFrame(rows)
+    table.to_csv(args.output, index=False)
+    print(table.to_string(index=False))
+    print(f"\nSaved {len(table)} cities to {args.output}")
+    if args.curves:
+        pds.DataFrame(curve_rows).to_csv(args.curves, index=False)
+        print(f"Saved accessibility curves ({', '.join(f'{r}m' for r in radii)}) to {args.curves}")
+
+    # Countries come from the store's city lookup (results_store.countries_file); written after the
+    # CSVs so an unknown city does not lose the scores
+    if args.store:
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        from results_store import ResultsStore
+
+        with ResultsStore(args.store) as store:
+            n = store.upsert_many(store_rows, source=os.path.basename(args.raster))
+        print(f"Upserted {n} values into {args.store}")
+
+
+if __name__ == "__main__":
+    main()
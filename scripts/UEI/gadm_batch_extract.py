@@ -0,0 +1,129 @@
+'''
+Config-driven batch version of Shaper.py: extracts every city boundary from the GADM country layers in one run.
+
+Each config entry names a city, its GADM country (ISO3) and level, and either the unit names to keep
+("names", matched on NAME_<level>) or a district list to fuse ("districts", optionally narrowed by "parent",
+e.g. {"NAME_1": "Al Qahirah"}). Entries sharing a GADM file are read together, with the attribute filter
+(SQL WHERE), an optional bbox and only the NAME_/TYPE_ columns pushed into the pyogrio reader, so only
+the matching rows are decoded instead of the whole national layer. Multi-row cities are dissolved into
+one polygon and written to <output_folder>/<City>/<city>.shp.
+
+Usage:
+    python gadm_batch_extract.py gadm_cities.json
+'''
+
+import os
+import json
+import argparse
+from collections import defaultdict
+
+import geopandas as gpd
+
+
+# Configuration (Update paths as needed; the config file can override both)
+gadm_folder = r"Path\gadm"
+output_folder = r"Path\city_shape_files\cities"
+
+GADM_FILE = "gadm41_{country}_{level}.shp"
+
+
+def sql_quote(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def city_filter(entry):
+    """SQL WHERE clause selecting one city's rows from its GADM layer."""
+    level = entry["level"]
+    if "districts" in entry:
+        clauses = [f"NAME_{level} IN ({', '.join(sql_quote(d) for d in entry['districts'])})"]
+    else:
+        names = entry.get("names", [entry["city"]])
+        clauses = [f"NAME_{level} IN ({', '.join(sql_quote(n) for n in names)})"]
+    for field, value in entry.get("parent", {}).items():
+        clauses.append(f"{field} = {sql_quote(value)}")
+    return "(" + " AND ".join(clauses) + ")"
+
+
+def matches(frame, entry):
+    """Same selection as city_filter, applied to the rows already read for a whole file group."""
+    level = entry["level"]
+    wanted = entry["districts"] if "districts" in entry else entry.get("names", [entry["city"]])
+    keep = frame[f"NAME_{level}"].isin(wanted)
+    for field, value in entry.get("parent", {}).items():
+        keep &= frame[field] == value
+    return frame[keep]
+
+
+def read_group(path, entries):
+    """Read only the rows (and columns) needed by every entry that uses the GADM file at path."""
+    level = entries[0]["level"]
+    columns = [f"NAME_{i}" for i in range(1, level + 1)] + [f"TYPE_{level}"]
+    where = " OR ".join(city_filter(entry) for entry in entries)
+    bboxes = [entry.get("bbox") for entry in entries]
+    bbox = None
+    if all(bboxes):  # one bbox covering every entry, only if each entry gives one
+        bbox = (min(b[0] for b in bboxes), min(b[1] for b in bboxes), max(b[2] for b in bboxes), max(b[3] for b in bboxes))
+    return gpd.read_file(path, engine="pyogrio", where=where, bbox=bbox, columns=columns)
+
+
+def dissolve_city(rows, city):
+    """One repaired polygon for the city (districts fused)."""
+    geoms = rows.geometry.buffer(0)
+    geometry = geoms.union_all() if hasattr(geoms, "union_all") else geoms.unary_union
+    return gpd.GeoDataFrame({"city": [city], "units": [len(rows)]}, geometry=[geometry], crs=rows.crs)
+
+
+def extract_all(config):
+    gadm_dir = config.get("gadm_folder", gadm_folder)
+    out_dir = config.get("output_folder", output_folder)
+
+    groups = defaultdict(list)
+    for entry in config["cities"]:
+        groups[(entry["country"], entry["level"])].append(entry)
+
+    written, missing = [], []
+    for (country, level), entries in sorted(groups.items()):
+        path = os.path.join(gadm_dir, GADM_FILE.format(country=country, level=level))
+        print(f"{os.path.basename(path)}: {len(entries)} cities")
+        frame = read_group(path, entries)
+
+        for entry in entries:
+            rows = matches(frame, entry)
+            if rows.empty:
+                print(f"  No GADM rows matched {entry['city']}")
+                missing.append(entry["city"])
+                continue
+            # Show the matched units and their type (municipality, state, province, etc.) for manual checking
+            print(f"  {entry['city']}: " + ", ".join(f"{n} ({t})" for n, t in zip(rows[f"NAME_{level}"], rows[f"TYPE_{level}"])))
+
+            wanted = entry["districts"] if "districts" in entry else entry.get("names", [entry["city"]])
+            unmatched = sorted(set(wanted) - set(rows[f"NAME_{level}"]))
+            if unmatched:
+                print(f"  Warning: {entry['city']} names not found in GADM: {unmatched}")
+
+            city_dir = os.path.join(out_dir, entry["city"])
+            os.makedirs(city_dir, exist_ok=True)
+            out_path = os.path.join(city_dir, f"{entry['city'].lower().replace(' ', '_')}.shp")
+            dissolve_city(rows, entry["city"]).to_file(out_path)
+            written.append(out_path)
+    return written, missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract city boundaries from GADM layers in one batch.")
+    parser.add_argument("config", help="JSON config with gadm_folder, output_folder and a cities list")
+    args = parser.parse_args()
+
+    with open(args.config, encoding="utf-8") as f:
+        config = json.load(f)
+
+    written, missing = extract_all(config)
+    print(f"\nWrote {len(written)} city shapefiles")
+    for path in written:
+        print(f"  {path}")
+    if missing:
+        print(f"No match for: {', '.join(missing)}")
+
+
+if __name__ == "__main__":
+    main()
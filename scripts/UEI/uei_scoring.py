@@ -0,0 +1,252 @@
+'''
+Shared UEI (Urban Environmental Integration) scoring used by 30_300_Scorer.py and the batch scorers.
+
+The score only needs two things from a city raster: the LCZ class histogram (30% Cover Score) and
+the number of compact LCZ pixels within the access radius of a natural-cover pixel (300m Access).
+Both can be computed tile by tile: the histogram is a plain sum, and the access count is exact as
+long as every tile is read with a halo equal to the access radius (a natural pixel within the radius
+of a core pixel is always inside that halo).
+
+Access radii are in metres: the pixel size comes from the raster's transform and CRS (degrees are
+converted at the tile's latitude, and the halo is sized from the tile's own rows), so "300 m" holds
+for any LCZ resolution and latitude. One distance transform per tile gives a histogram of
+compact-pixel distances in whole metres, from which the access count at every radius (the
+accessibility curve, e.g. 100 m to 1 km) is a cumulative sum.
+'''
+
+import numpy as np
+from rasterio.errors import CRSError
+from rasterio.windows import Window
+from scipy.ndimage import distance_transform_edt
+
+
+# LCZ classes handpicked by the UEI team (see 30_300_Scorer.py)
+TOTAL_AREA_CLASSES = list(range(1, 16))                      # LCZs counted in the total city area
+LOW_ENV_INTEG_CLASSES = [1, 2, 3, 7, 8, 10, 14, 15, 16]     # low pervious green cover
+HIGH_ENV_INTEG_CLASSES = [4, 5, 6, 9, 11, 12, 13]           # high pervious green cover (natural cover)
+COMPACT_CLASSES = [1, 2, 3, 7, 8]                            # compact/dense LCZs
+
+# 3 pixels ~ 300 m at the 100 m LCZ resolution (access_count() only; the scorers use metres)
+ACCESS_RADIUS_PX = 3
+
+# Radius of the "300m Access" score and the radii of the accessibility curve, in metres
+ACCESS_RADIUS_M = 300
+ACCESS_RADII_M = list(range(100, 1001, 100))
+METRES_PER_DEGREE = 111320.0
+
+TILE_SIZE = 2048
+
+# Whole-metre distances of distance_histogram(): radii up to 65533 m
+DISTANCE_DTYPE = np.uint16
+
+
+def class_histogram(pixels):
+    """Pixel count per LCZ class value (index = class)."""
+    return np.bincount(np.asarray(pixels, dtype="int64").ravel(), minlength=256)
+
+
+def access_count(pixels, radius_px=ACCESS_RADIUS_PX, core=None):
+    """
+    Number of compact pixels within radius_px of a natural-cover pixel.
+    core = (row0, row1, col0, col1) restricts the count to part of the array (the halo is only context).
+    """
+    mask_natural = np.isin(pixels, HIGH_ENV_INTEG_CLASSES)
+    mask_compact = np.isin(pixels, COMPACT_CLASSES)
+    return masked_access_count(mask_natural, mask_compact, radius_px, core)
+
+
+def core_mask(mask, core):
+    """Copy of mask with everything outside core = (row0, row1, col0, col1) cleared (None = unchanged)."""
+    if core is None:
+        return mask
+    row0, row1, col0, col1 = core
+    mask = mask.copy()
+    mask[:row0] = False
+    mask[row1:] = False
+    mask[:, :col0] = False
+    mask[:, col1:] = False
+    return mask
+
+
+def masked_access_count(mask_natural, mask_compact, radius_px=ACCESS_RADIUS_PX, core=None):
+    """access_count() for precomputed natural/compact masks (e.g. already restricted to one city)."""
+    mask_compact = core_mask(mask_compact, core)
+    if not mask_natural.any() or not mask_compact.any():
+        return 0
+
+    # Distance to nearest natural cover (in pixels)
+    dist_to_natural = distance_transform_edt(~mask_natural)
+    return int(np.count_nonzero(mask_compact & (dist_to_natural <= radius_px)))
+
+
+def pixel_size_m(transform, crs, lat=None):
+    """
+    (width, height) of a pixel in metres. For a geographic CRS the width shrinks with cos(latitude);
+    lat defaults to the latitude of the transform's origin.
+    """
+    dx, dy = abs(transform.a), abs(transform.e)
+    if crs is not None and crs.is_geographic:
+        lat = transform.f if lat is None else lat
+        return dx * METRES_PER_DEGREE * np.cos(np.deg2rad(lat)), dy * METRES_PER_DEGREE
+    try:
+        factor = crs.linear_units_factor[1] if crs is not None else 1.0
+    except CRSError:
+        factor = 1.0
+    return dx * factor, dy * factor
+
+
+def window_pixel_size_m(src, window):
+    """pixel_size_m() at the centre row of a window of an open rasterio dataset."""
+    transform = src.window_transform(window)
+    return pixel_size_m(transform, src.crs, transform.f + transform.e * window.height / 2)
+
+
+def tile_halo_px(src, row0, row1, radius_m):
+    """
+    (rows, cols) of halo that cover radius_m around the raster rows [row0, row1), clamped to the raster.
+    Pixel heights are the same at every latitude; the columns are sized from the narrowest pixel those
+    rows and their halo reach (the row farthest from the equator), so a polar row elsewhere in the
+    raster does not blow up the halo of every tile.
+    """
+    _, height_m = pixel_size_m(src.transform, src.crs)
+    rows = min(int(np.ceil(radius_m / height_m)), src.height)
+    top, bottom = max(row0 - rows, 0), min(row1 + rows, src.height) - 1
+    width_m = min(window_pixel_size_m(src, Window(0, row, src.width, 1))[0] for row in (top, bottom))
+    cols = int(np.ceil(radius_m / width_m)) if width_m > 0 else src.width
+    return rows, min(cols, src.width)
+
+
+def distance_histogram(mask_natural, mask_compact, pixel_m, max_radius_m, core=None):
+    """
+    Histogram of the distance from each compact pixel to the nearest natural pixel in whole metres
+    (rounded up): bin d counts distances in (d - 1, d], the last bin (max_radius_m + 1) everything
+    farther, including every compact pixel when there is no natural cover at all.
+    pixel_m = (width, height) in metres; core as in masked_access_count().
+    """
+    n_bins = int(max_radius_m) + 2
+    if n_bins > np.iinfo(DISTANCE_DTYPE).max:
+        raise ValueError(f"max_radius_m {max_radius_m} does not fit the {DISTANCE_DTYPE} distance bins")
+    histogram = np.zeros(n_bins, dtype="int64")
+    mask_compact = core_mask(mask_compact, core)
+    rows, cols = np.nonzero(mask_compact)
+    if len(rows) == 0:
+        return histogram
+
+    # Natural pixels more than max_radius_m outside the compact pixels' bounding box only decide
+    # distances that land in the last bin anyway, so the distance transform runs on that box plus a
+    # max_radius_m margin instead of the whole tile and halo
+    width_m, height_m = pixel_m
+    margin_rows, margin_cols = int(np.ceil(max_radius_m / height_m)) + 1, int(np.ceil(max_radius_m / width_m)) + 1
+    r0, c0 = max(rows.min() - margin_rows, 0), max(cols.min() - margin_cols, 0)
+    r1, c1 = min(rows.max() + 1 + margin_rows, mask_natural.shape[0]), min(cols.max() + 1 + margin_cols, mask_natural.shape[1])
+    natural = mask_natural[r0:r1, c0:c1]
+    if not natural.any():
+        histogram[-1] = len(rows)
+        return histogram
+
+    # scipy only returns float64 distances; they are turned into whole metres clipped to the overflow
+    # bin (uint16, a quarter of the size) straight away, so only one float64 field of the box exists
+    # at a time and the per-pixel distances kept for the lookup are the compact ones
+    metres = distance_transform_edt(~natural, sampling=(height_m, width_m))
+    metres -= 1e-6
+    np.ceil(metres, out=metres)
+    np.minimum(metres, n_bins - 1, out=metres)
+    metres = metres.astype(DISTANCE_DTYPE)
+    return histogram + np.bincount(metres[rows - r0, cols - c0], minlength=n_bins)
+
+
+def distance_counts(pixels, pixel_m, max_radius_m, core=None):
+    """distance_histogram() of an LCZ class array."""
+    return distance_histogram(np.isin(pixels, HIGH_ENV_INTEG_CLASSES), np.isin(pixels, COMPACT_CLASSES),
+                              pixel_m, max_radius_m, core)
+
+
+def access_curve(histogram, radii_m):
+    """{radius: compact pixels within radius metres of natural cover} from a distance histogram."""
+    within = np.cumsum(histogram)
+    return {int(r): int(within[int(r)]) for r in radii_m if int(r) < len(histogram) - 1}
+
+
+def access_curve_fields(curve, compact_total):
+    """Result fields of an access curve, named like the 300m ones in uei_scores()."""
+    fields = {}
+    for radius, count in curve.items():
+        fields[f'Areas within {radius}m NatCov'] = count
+        fields[f'Areas within {radius}m NatCov Relative Frequency'] = \
+            round((count / compact_total) * 100, 2) if compact_total else 0.0
+    return fields
+
+
+def iter_tiles(width, height, tile_size=TILE_SIZE, halo=0):
+    """
+    Yield (padded window, core slice within it) covering a width x height raster.
+    halo: pixels on every side, or a function (row0, row1) -> (rows, cols) giving each tile row its own halo.
+    """
+    for row in range(0, height, tile_size):
+        core_h = min(tile_size, height - row)
+        halo_rows, halo_cols = halo(row, row + core_h) if callable(halo) else (halo, halo)
+        for col in range(0, width, tile_size):
+            core_w = min(tile_size, width - col)
+            row0, col0 = max(row - halo_rows, 0), max(col - halo_cols, 0)
+            row1, col1 = min(row + core_h + halo_rows, height), min(col + core_w + halo_cols, width)
+            window = Window(col0, row0, col1 - col0, row1 - row0)
+            core = (row - row0, row - row0 + core_h, col - col0, col - col0 + core_w)
+            yield window, core
+
+
+def windowed_counts(src, radius_px=ACCESS_RADIUS_PX, tile_size=TILE_SIZE, band=1):
+    """
+    Class histogram and access count of an open rasterio dataset, read tile by tile with a halo of
+    radius_px. Memory is bounded by the tile size, and the result equals the full-raster computation.
+    """
+    halo = int(np.ceil(radius_px))
+    histogram = np.zeros(256, dtype="int64")
+    access = 0
+    for window, core in iter_tiles(src.width, src.height, tile_size, halo):
+        pixels = src.read(band, window=window)
+        row0, row1, col0, col1 = core
+        histogram += class_histogram(pixels[row0:row1, col0:col1])
+        access += access_count(pixels, radius_px, core=core)
+    return histogram, access
+
+
+def windowed_distance_counts(src, max_radius_m=max(ACCESS_RADII_M), tile_size=TILE_SIZE, band=1):
+    """
+    Class histogram and compact-pixel distance histogram of an open rasterio dataset, read tile by tile
+    with a halo covering max_radius_m at the tile's latitude; each tile uses the pixel size at its own latitude.
+    """
+    histogram = np.zeros(256, dtype="int64")
+    distances = np.zeros(int(max_radius_m) + 2, dtype="int64")
+
+    def halo(row0, row1):
+        return tile_halo_px(src, row0, row1, max_radius_m)
+
+    for window, core in iter_tiles(src.width, src.height, tile_size, halo):
+        pixels = src.read(band, window=window)
+        row0, row1, col0, col1 = core
+        histogram += class_histogram(pixels[row0:row1, col0:col1])
+        distances += distance_counts(pixels, window_pixel_size_m(src, window), max_radius_m, core=core)
+    return histogram, distances
+
+
+def uei_scores(histogram, areas_nearby):
+    """UEI fields (same keys as the cities_uei_data CSV) from a class histogram and an access count."""
+    total_areas = int(histogram[TOTAL_AREA_CLASSES].sum())
+    high_envInteg_total = int(histogram[HIGH_ENV_INTEG_CLASSES].sum())
+    compact_total = int(histogram[COMPACT_CLASSES].sum())
+
+    high_envInteg_relFreq = round((high_envInteg_total / total_areas) * 100, 2) if total_areas else 0.0
+    cover30_score = min(round((high_envInteg_relFreq / 30) * 100, 2), 100)
+    areas_nearby_relFreq = round((areas_nearby / compact_total) * 100, 2) if compact_total else 0.0
+    uei_score = round((cover30_score + areas_nearby_relFreq) / 2, 2)
+
+    return {
+        'Areas With 30% Cover': high_envInteg_total,
+        'Areas With 30% Cover Relative Frequency': high_envInteg_relFreq,
+        '30% Ideal Cover Score': cover30_score,
+        'Areas within 300m NatCov': int(areas_nearby),
+        'Areas within 300m NatCov Relative Frequency': areas_nearby_relFreq,
+        'Total Compact Areas': compact_total,
+        'Total Areas': total_areas,
+        'UEI Score': uei_score
+    }
@@ -1,5 +1,19 @@
+import os
+import sys
+import argparse
+
 import pandas as pd
 
+# Weights and category thresholds come from scripts/vital_scoring.json
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from vital_scoring import categorize, load_config, wss_scores
+
+config = load_config()["wss"]
+
+parser = argparse.ArgumentParser(description="Water and Sanitation Score (WSS) of the VITAL cities.")
+parser.add_argument("--output", help="Also save the table as CSV (as data/all_data.xlsx's WSS table)")
+args = parser.parse_args()
+
 # Data for cities
 data = {
     "City": ["Athens", "Berlin", "Cairo", "Delhi", "Istanbul", "Lagos", "Manila", "New York", "Paris", "São Paulo"],
@@ -13,23 +27,14 @@ data = {
 df = pd.DataFrame(data)
 
 # Compute W&S Index
-df["W&S_Score"] = (0.40 * df["W"]) + (0.35 * df["S"]) + (0.25 * df["T"])
-df["W&S_Score"] = df["W&S_Score"].round(2)
-
-# Define new category thresholds
-def categorize(score):
-    if score <= 25:
-        return "At-Risk"
-    elif score <= 50:
-        return "Poor"
-    elif score <= 75:
-        return "Moderate"
-    elif score < 100:
-        return "Good"
-    else:
-        return "Excellent"
-
-df["Category"] = df["W&S_Score"].apply(categorize)
+df["W&S_Score"] = wss_scores(df["W"], df["S"], df["T"], config)
+
+# Categorize with the configured thresholds
+df["Category"] = categorize(df["W&S_Score"], config["bins"])
 
 # Display final table
 print(df.to_string(index=False))
+
+if args.output:
+    df.to_csv(args.output, index=False)
+    print(f"\nSaved {len(df)} cities to {args.output}")
@@ -0,0 +1,298 @@
+'''
+Benchmark suite for the VITAL pipeline stages on synthetic data (see synthetic.py).
+
+Every case runs in its own Python process so its peak RSS is its own; the child reports wall time,
+CPU time (including worker processes), peak RSS and, with --tracemalloc, the peak of Python
+allocations. Results are printed as a table and saved as JSON; --baseline compares against a previous
+results file and fails on regressions beyond --tolerance.
+
+Usage:
+    python run_benchmarks.py --scale small
+    python run_benchmarks.py --scale medium --cases extract_eager extract_parallel --repeat 3
+    python run_benchmarks.py --cities 300 --days 730 --output bench_300.json --baseline bench_main.json
+'''
+
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.dirname(BENCH_DIR)
+
+# Configuration (Update paths as needed)
+work_folder = os.path.join(BENCH_DIR, "synthetic_data")
+RESULT_PREFIX = "BENCH_RESULT "
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process and of its finished children, in MB."""
+    try:
+        import resource
+        per_mb = 1024 * 1024 if sys.platform == "darwin" else 1024  # ru_maxrss: bytes on macOS, KB on Linux
+        own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        return max(own, children) / per_mb
+    except ImportError:
+        import psutil  # Windows
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+
+
+def cpu_seconds():
+    """CPU time of this process plus its finished children (process-pool workers)."""
+    try:
+        import resource
+        own, children = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+        return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+    except ImportError:
+        return time.process_time()
+
+
+def fresh_folder(path):
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    return path
+
+
+def use_stage(stage):
+    sys.path.insert(0, os.path.join(SCRIPTS_DIR, stage))
+
+
+# ---------------------------------------------------------------------------------------------
+# Cases: each takes (data folder, scratch folder, params) and runs one stage end to end
+# ---------------------------------------------------------------------------------------------
+
+def run_unzip(data, scratch, params, incremental):
+    use_stage("CHSS")
+    import unzip_nc
+    unzip_nc.input_folder = os.path.join(data, "era5-land-nc")
+    unzip_nc.output_folder = fresh_folder(os.path.join(scratch, "unzipped"))
+    sys.argv = ["unzip_nc.py"] + (["--incremental"] if incremental else [])
+    unzip_nc.main()
+
+
+def run_extract(data, scratch, params, mode):
+    use_stage("CHSS")
+    import extract_rm2_tm2
+    from synthetic import month_days
+    months = sorted(month_days(params["days"]))
+    extract_rm2_tm2.nc_folder = os.path.join(data, "era5-land-unzipped")
+    extract_rm2_tm2.cities_folder = os.path.join(data, "cities")
+    extract_rm2_tm2.output_folder = fresh_folder(os.path.join(scratch, "city_daily_csv"))
+    extract_rm2_tm2.parquet_folder = fresh_folder(os.path.join(scratch, "city_daily_parquet"))
+    extract_rm2_tm2.ERA5_BOUNDS = tuple(params["bounds"])
+    sys.argv = ["extract_rm2_tm2.py", "--start", "%d-%02d" % months[0], "--end", "%d-%02d" % months[-1]]
+    if mode == "lazy":
+        sys.argv.append("--lazy")
+    elif mode == "parallel":
+        sys.argv += ["--workers", str(min(os.cpu_count() or 1, 8)), "--scratch", scratch]
+    extract_rm2_tm2.main()
+
+
+def run_pivot(data, scratch, params):
+    import runpy
+    folder = fresh_folder(os.path.join(scratch, "pivot"))
+    for path in glob.glob(os.path.join(data, "city_daily_long", "*.csv")):
+        shutil.copy(path, folder)
+    sys.argv = ["pivot.py", "--folder", folder, "--yes"]
+    runpy.run_path(os.path.join(SCRIPTS_DIR, "CHSS", "pivot.py"), run_name="__main__")
+
+
+def city_shapefiles(data):
+    return sorted(glob.glob(os.path.join(data, "cities", "*", "*.shp")))
+
+
+def run_uei_clip(data, scratch, params):
+    use_stage("UEI")
+    from Raster_Map_Clipper import clip_raster
+    out = fresh_folder(os.path.join(scratch, "clipped"))
+    for shp in city_shapefiles(data):
+        name = os.path.basename(os.path.dirname(shp))
+        clip_raster(os.path.join(data, "lcz.tif"), shp, os.path.join(out, f"{name}_clipped.tif"), use_cache=False)
+
+
+def run_uei_score(data, scratch, params):
+    use_stage("UEI")
+    import rasterio
+    from rasterio.windows import Window
+    from uei_scoring import (ACCESS_RADII_M, ACCESS_RADIUS_M, access_curve, class_histogram, distance_counts,
+                             uei_scores, window_pixel_size_m)
+    clipped = sorted(glob.glob(os.path.join(scratch, "clipped", "*_clipped.tif")))
+    if not clipped:
+        raise RuntimeError("Run the uei_clip case first (its clipped rasters are the scorer's input)")
+    for path in clipped:
+        with rasterio.open(path) as src:
+            pixels = src.read(1)
+            pixel_m = window_pixel_size_m(src, Window(0, 0, src.width, src.height))
+        curve = access_curve(distance_counts(pixels, pixel_m, max(ACCESS_RADII_M)), ACCESS_RADII_M)
+        uei_scores(class_histogram(pixels), curve[ACCESS_RADIUS_M])
+
+
+def run_uei_batch(data, scratch, params):
+    use_stage("UEI")
+    import rasterio
+    from batch_uei_scorer import load_cities, score_cities
+    cities = load_cities(os.path.join(data, "cities"))
+    with rasterio.open(os.path.join(data, "lcz.tif")) as src:
+        score_cities(src, cities.to_crs(src.crs))
+
+
+def run_paqs(data, scratch, params, workers):
+    use_stage("PAQS")
+    from pm25_extraction import extract_concurrent
+    extract_concurrent(os.path.join(data, "pm25.tif"), os.path.join(data, "cities"), workers=workers)
+
+
+CASES = {
+    "unzip_legacy": lambda d, s, p: run_unzip(d, s, p, incremental=False),
+    "unzip_incremental": lambda d, s, p: run_unzip(d, s, p, incremental=True),
+    "extract_eager": lambda d, s, p: run_extract(d, s, p, "eager"),
+    "extract_lazy": lambda d, s, p: run_extract(d, s, p, "lazy"),
+    "extract_parallel": lambda d, s, p: run_extract(d, s, p, "parallel"),
+    "pivot": run_pivot,
+    "uei_clip": run_uei_clip,
+    "uei_score": run_uei_score,
+    "uei_batch": run_uei_batch,
+    "paqs_serial": lambda d, s, p: run_paqs(d, s, p, workers=1),
+    "paqs_threads": lambda d, s, p: run_paqs(d, s, p, workers=8),
+}
+
+
+def run_case_in_process(name, data, scratch, use_tracemalloc):
+    """Child side: run one case and print its measurements as one JSON line."""
+    sys.path.insert(0, BENCH_DIR)
+    with open(os.path.join(data, "params.json"), encoding="utf-8") as f:
+        params = json.load(f)
+    os.makedirs(scratch, exist_ok=True)
+
+    if use_tracemalloc:
+        import tracemalloc
+        tracemalloc.start()
+    rss_before = peak_rss_mb()
+    cpu_start, wall_start = cpu_seconds(), time.perf_counter()
+    CASES[name](data, scratch, params)
+    result = {
+        "case": name,
+        "wall_s": time.perf_counter() - wall_start,
+        "cpu_s": cpu_seconds() - cpu_start,
+        "peak_rss_mb": peak_rss_mb(),
+        "startup_rss_mb": rss_before,
+    }
+    if use_tracemalloc:
+        result["py_peak_mb"] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    print(RESULT_PREFIX + json.dumps(result), flush=True)
+
+
+def run_case(name, data, scratch, use_tracemalloc, verbose):
+    """Parent side: run one case in a fresh interpreter and parse its measurements."""
+    command = [sys.executable, os.path.abspath(__file__), "--child", name, "--data", data, "--scratch", scratch]
+    if use_tracemalloc:
+        command.append("--tracemalloc")
+    proc = subprocess.run(command, capture_output=True, text=True)
+    if verbose:
+        print(proc.stdout)
+    for line in proc.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    tail = "\n".join((proc.stdout + proc.stderr).strip().splitlines()[-15:])
+    return {"case": name, "error": f"exit {proc.returncode}\n{tail}"}
+
+
+def summarize(runs):
+    """Median wall/CPU and worst peak RSS over the repeats of one case."""
+    ok = [r for r in runs if "error" not in r]
+    if not ok:
+        return runs[-1]
+    summary = {"case": ok[0]["case"], "runs": len(ok),
+               "wall_s": statistics.median(r["wall_s"] for r in ok),
+               "cpu_s": statistics.median(r["cpu_s"] for r in ok),
+               "peak_rss_mb": max(r["peak_rss_mb"] for r in ok),
+               "startup_rss_mb": min(r["startup_rss_mb"] for r in ok)}
+    if "py_peak_mb" in ok[0]:
+        summary["py_peak_mb"] = max(r["py_peak_mb"] for r in ok)
+    return summary
+
+
+def compare(results, baseline_path, tolerance):
+    """Cases slower (median wall) or bigger (peak RSS) than the baseline by more than tolerance."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {r["case"]: r for r in json.load(f)["results"] if "error" not in r}
+    regressions = []
+    for r in results:
+        base = baseline.get(r["case"])
+        if base is None or "error" in r:
+            continue
+        for metric in ("wall_s", "peak_rss_mb"):
+            if r[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{r['case']}: {metric} {base[metric]:.2f} -> {r[metric]:.2f}")
+    return regressions
+
+
+def main():
+    from synthetic import PRESETS, generate
+
+    parser = argparse.ArgumentParser(description="Time and memory-profile the pipeline stages on synthetic data.")
+    parser.add_argument("--scale", choices=list(PRESETS), default="small", help="Preset sizes (overridable below)")
+    parser.add_argument("--cities", type=int)
+    parser.add_argument("--days", type=int)
+    parser.add_argument("--lcz-res", type=float, help="LCZ pixel size in degrees")
+    parser.add_argument("--workdir", default=work_folder)
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--tracemalloc", action="store_true", help="Also record Python allocation peaks (slower)")
+    parser.add_argument("--output", help="Results JSON (default: <workdir>/results_<scale>.json)")
+    parser.add_argument("--baseline", help="Previous results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown/growth vs baseline (0.2 = 20%%)")
+    parser.add_argument("--verbose", action="store_true", help="Show the stages' own output")
+    args = parser.parse_args()
+
+    params = dict(PRESETS[args.scale])
+    for key, value in (("cities", args.cities), ("days", args.days), ("lcz_res", args.lcz_res)):
+        if value is not None:
+            params[key] = value
+    data = os.path.join(args.workdir, f"{args.scale}_{params['cities']}c_{params['days']}d")
+    scratch = os.path.join(args.workdir, "scratch")
+    generate(data, **params)
+
+    results = []
+    print(f"\n{'case':<20} {'wall s':>9} {'cpu s':>9} {'peak MB':>9}")
+    for name in args.cases:
+        summary = summarize([run_case(name, data, scratch, args.tracemalloc, args.verbose) for _ in range(args.repeat)])
+        results.append(summary)
+        if "error" in summary:
+            print(f"{name:<20} FAILED: {summary['error']}")
+        else:
+            print(f"{name:<20} {summary['wall_s']:>9.2f} {summary['cpu_s']:>9.2f} {summary['peak_rss_mb']:>9.1f}")
+
+    output = args.output or os.path.join(args.workdir, f"results_{args.scale}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"params": params, "python": platform.python_version(), "machine": platform.platform(),
+                   "cpus": os.cpu_count(), "results": results}, f, indent=2)
+    print(f"\nSaved results to {output}")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            exit(1)
+
+
+if __name__ == "__main__":
+    if "--child" in sys.argv:
+        child = argparse.ArgumentParser()
+        child.add_argument("--child")
+        child.add_argument("--data")
+        child.add_argument("--scratch")
+        child.add_argument("--tracemalloc", action="store_true")
+        child_args = child.parse_args()
+        run_case_in_process(child_args.child, child_args.data, child_args.scratch, child_args.tracemalloc)
+    else:
+        main()
@@ -0,0 +1,178 @@
+'''
+Synthetic inputs for the pipeline benchmarks, shaped like the real downloads:
+- city polygons:     cities/<City>/<city>.shp (EPSG:4326 star-shaped polygons, like the GADM extracts)
+- ERA5-Land cubes:   era5-land-unzipped/2m_temperature_YYYY_MM_daily-mean.nc (+ dewpoint), dims
+                     (valid_time, latitude, longitude), latitude north to south, values in Kelvin
+- ERA5 zips:         era5-land-nc/era5_land_YYYY_MM.nc (zip archives, as the CDS delivers them)
+- long-format CSVs:  city_daily_long/<city>_daily_values.csv (city, shapefile, date, variable, value)
+- LCZ raster:        lcz.tif (uint8 classes 1-17 in patches, tiled)
+- PM2.5 raster:      pm25.tif (float32 smooth field with nodata, like the SEDAC GeoTIFF)
+
+All layers cover the same bounds so every city intersects every raster. Scale is set by the number of
+cities, the number of days and the raster resolutions; generation is skipped when the folder already
+holds data for the same parameters.
+'''
+
+import os
+import json
+import zipfile
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import rasterio
+import xarray as xr
+from rasterio.transform import from_origin
+from shapely.geometry import Polygon
+
+
+PRESETS = {
+    "small": {"cities": 10, "days": 62, "bounds": [20.0, 35.0, 24.0, 38.0], "era5_res": 0.1, "lcz_res": 0.002, "pm_res": 0.01},
+    "medium": {"cities": 50, "days": 366, "bounds": [0.0, 30.0, 20.0, 45.0], "era5_res": 0.1, "lcz_res": 0.001, "pm_res": 0.01},
+    "large": {"cities": 200, "days": 366 * 3, "bounds": [-20.0, 20.0, 40.0, 55.0], "era5_res": 0.1, "lcz_res": 0.001, "pm_res": 0.01},
+}
+
+START_DATE = "2024-01-01"
+PARAMS_NAME = "params.json"
+
+
+def city_polygons(n, bounds, rng, vertices=24):
+    """n star-shaped city polygons scattered over bounds, radii scaled to the area per city."""
+    min_x, min_y, max_x, max_y = bounds
+    radius = 0.35 * np.sqrt((max_x - min_x) * (max_y - min_y) / n)
+    rows = []
+    for i in range(n):
+        r = radius * rng.uniform(0.3, 1.0)
+        cx, cy = rng.uniform(min_x + r, max_x - r), rng.uniform(min_y + r, max_y - r)
+        angles = np.sort(rng.uniform(0, 2 * np.pi, vertices))
+        radii = r * rng.uniform(0.5, 1.0, vertices)
+        ring = list(zip(cx + radii * np.cos(angles), cy + radii * np.sin(angles)))
+        rows.append({"city": f"City{i + 1:04d}", "geometry": Polygon(ring).buffer(0)})
+    return gpd.GeoDataFrame(rows, geometry="geometry", crs="EPSG:4326")
+
+
+def write_cities(cities, folder):
+    for row in cities.itertuples(index=False):
+        city_dir = os.path.join(folder, row.city)
+        os.makedirs(city_dir, exist_ok=True)
+        gpd.GeoDataFrame({"NAME": [row.city]}, geometry=[row.geometry], crs="EPSG:4326") \
+            .to_file(os.path.join(city_dir, f"{row.city.lower()}.shp"))
+
+
+def era5_grid(bounds, res, pad=0.5):
+    min_x, min_y, max_x, max_y = bounds
+    lon = np.round(np.arange(min_x - pad, max_x + pad + res / 2, res), 4)
+    lat = np.round(np.arange(max_y + pad, min_y - pad - res / 2, -res), 4)  # north to south, like ERA5
+    return lon, lat
+
+
+def month_days(days):
+    """{(year, month): DatetimeIndex} for the first `days` days from START_DATE."""
+    dates = pd.date_range(START_DATE, periods=days, freq="D")
+    months = sorted(set(zip(dates.year, dates.month)))
+    return {(y, m): dates[(dates.year == y) & (dates.month == m)] for y, m in months}
+
+
+def write_era5(folder, zip_folder, bounds, res, days, rng):
+    """Monthly t2m/d2m cubes, plus the same files zipped the way the CDS delivers them."""
+    os.makedirs(folder, exist_ok=True)
+    os.makedirs(zip_folder, exist_ok=True)
+    lon, lat = era5_grid(bounds, res)
+    base = 300.0 - 0.4 * np.abs(lat)[:, None] + 2 * np.sin(np.deg2rad(lon))[None, :]
+    for (year, month), dates in month_days(days).items():
+        season = 8 * np.sin(2 * np.pi * (dates.dayofyear.to_numpy() - 110) / 365.25)[:, None, None]
+        t2m = (base[None] + season + rng.normal(0, 1.5, (len(dates), len(lat), len(lon)))).astype("float32")
+        d2m = (t2m - rng.uniform(2, 12, t2m.shape)).astype("float32")
+
+        members = []
+        for var, values, prefix in (("t2m", t2m, "2m_temperature"), ("d2m", d2m, "2m_dewpoint_temperature")):
+            ds = xr.Dataset({var: (("valid_time", "latitude", "longitude"), values)},
+                            coords={"valid_time": dates.to_numpy(), "latitude": lat, "longitude": lon})
+            path = os.path.join(folder, f"{prefix}_{year}_{month:02d}_daily-mean.nc")
+            ds.to_netcdf(path)
+            members.append((path, f"{prefix}_0_daily-mean.nc"))
+
+        with zipfile.ZipFile(os.path.join(zip_folder, f"era5_land_{year}_{month:02d}.nc"), "w", zipfile.ZIP_DEFLATED) as zf:
+            for path, name in members:
+                zf.write(path, name)
+    return lon, lat
+
+
+def write_long_csvs(folder, cities, days, rng):
+    """Per-city long-format CSVs, the input pivot.py converts."""
+    os.makedirs(folder, exist_ok=True)
+    dates = pd.date_range(START_DATE, periods=days, freq="D").strftime("%Y-%m-%d")
+    for city in cities["city"]:
+        n = len(dates)
+        frame = pd.DataFrame({
+            "city": city,
+            "shapefile": city.lower(),
+            "date": np.tile(dates, 2),
+            "variable": np.repeat(["t2m", "d2m"], n),
+            "value": np.concatenate([rng.normal(290, 6, n), rng.normal(282, 6, n)]).round(3),
+        })
+        frame.to_csv(os.path.join(folder, f"{city}_daily_values.csv"), index=False)
+
+
+def write_raster(path, data, bounds, res, nodata):
+    min_x, _, _, max_y = bounds
+    profile = {"driver": "GTiff", "height": data.shape[0], "width": data.shape[1], "count": 1,
+               "dtype": data.dtype, "crs": "EPSG:4326", "transform": from_origin(min_x, max_y, res, res),
+               "nodata": nodata, "tiled": True, "blockxsize": 512, "blockysize": 512, "compress": "deflate"}
+    with rasterio.open(path, "w", **profile) as dst:
+        dst.write(data, 1)
+
+
+def raster_shape(bounds, res):
+    min_x, min_y, max_x, max_y = bounds
+    return int(round((max_y - min_y) / res)), int(round((max_x - min_x) / res))
+
+
+def lcz_classes(shape, rng, patch=16):
+    """LCZ-like class map: random classes 1-17 in square patches (so distance transforms see real edges)."""
+    coarse = rng.integers(1, 18, size=(shape[0] // patch + 1, shape[1] // patch + 1), dtype="uint8")
+    return np.repeat(np.repeat(coarse, patch, axis=0), patch, axis=1)[:shape[0], :shape[1]]
+
+
+def pm25_field(shape, rng, nodata=-9999.0):
+    """Smooth PM2.5 field (µg/m³) with hot spots and a few nodata pixels."""
+    rows, cols = np.ogrid[:shape[0], :shape[1]]
+    field = 15 + 10 * np.sin(rows / max(shape[0], 1) * 6) * np.cos(cols / max(shape[1], 1) * 9)
+    field = field + rng.gamma(2.0, 4.0, size=shape)
+    field = field.astype("float32")
+    field[rng.random(shape) < 0.001] = nodata
+    return field
+
+
+def generate(folder, cities=10, days=62, bounds=PRESETS["small"]["bounds"], era5_res=0.1,
+             lcz_res=0.002, pm_res=0.01, seed=0, force=False):
+    """Write every synthetic layer into folder (skipped if it already holds the same parameters)."""
+    params = {"cities": cities, "days": days, "bounds": list(bounds), "era5_res": era5_res,
+              "lcz_res": lcz_res, "pm_res": pm_res, "seed": seed}
+    params_path = os.path.join(folder, PARAMS_NAME)
+    if not force and os.path.exists(params_path):
+        with open(params_path, encoding="utf-8") as f:
+            if json.load(f) == params:
+                print(f"Synthetic data in {folder} is up to date")
+                return params
+
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    polygons = city_polygons(cities, bounds, rng)
+    print(f"Writing {cities} city polygons")
+    write_cities(polygons, os.path.join(folder, "cities"))
+    print(f"Writing {days} days of ERA5-like cubes at {era5_res}°")
+    write_era5(os.path.join(folder, "era5-land-unzipped"), os.path.join(folder, "era5-land-nc"), bounds, era5_res, days, rng)
+    print("Writing long-format city CSVs")
+    write_long_csvs(os.path.join(folder, "city_daily_long"), polygons, days, rng)
+
+    lcz_shape = raster_shape(bounds, lcz_res)
+    print(f"Writing LCZ raster {lcz_shape[1]}x{lcz_shape[0]}")
+    write_raster(os.path.join(folder, "lcz.tif"), lcz_classes(lcz_shape, rng), bounds, lcz_res, 0)
+    pm_shape = raster_shape(bounds, pm_res)
+    print(f"Writing PM2.5 raster {pm_shape[1]}x{pm_shape[0]}")
+    write_raster(os.path.join(folder, "pm25.tif"), pm25_field(pm_shape, rng), bounds, pm_res, -9999.0)
+
+    with open(params_path, "w", encoding="utf-8") as f:
+        json.dump(params, f, indent=2)
+    return params
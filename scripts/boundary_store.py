@@ -0,0 +1,189 @@
+'''
+Shared city boundary store for every VITAL stage (CHSS, PAQS, UEI).
+
+Builds ONE GeoParquet file from the city_shape_files/cities folders with, for each (city, shapefile):
+- the repaired geometry (buffer(0), invalid parts dropped, dissolved) in EPSG:4326
+- cached reprojections for the other CRSs the stages use (WKB columns "geom_epsg_<code>")
+- precomputed bboxes per CRS ("minx_epsg_<code>" ...) for spatial filtering without touching geometries
+- the size/mtime of the source shapefile and its sidecars (.shx/.dbf/.prj/.cpg), so rebuilds only re-read
+  shapefiles that changed (a new .prj or attribute table counts as a change)
+
+The folder-based paths of the stages (PAQS/UEI --cities) use the same rule through city_shapefiles() and
+shapefiles_geometry(): every shapefile of a city (the _fixed version when there is one), repaired and unioned.
+
+load_boundaries() returns a GeoDataFrame in the requested CRS in milliseconds; its .sindex (STRtree)
+serves as the spatial index. Usage:
+    python boundary_store.py --cities <cities folder> --store city_boundaries.parquet --crs EPSG:4326 EPSG:3857
+'''
+
+import os
+import argparse
+
+import pandas as pd
+import geopandas as gpd
+from pyproj import CRS
+from shapely.geometry import box
+
+
+BASE_CRS = "EPSG:4326"
+SIDECAR_EXTENSIONS = (".shp", ".shx", ".dbf", ".prj", ".cpg")
+
+
+def crs_tag(crs):
+    """'EPSG:3857' -> 'epsg_3857' (column suffix of a cached CRS), None for CRSs without an EPSG code."""
+    epsg = CRS.from_user_input(crs).to_epsg()
+    return None if epsg is None else f"epsg_{epsg}"
+
+
+def list_shapefiles(cities_folder):
+    """(city, shapefile name, path) for every city shapefile, preferring the manually verified _fixed version."""
+    entries = []
+    for city_name in sorted(os.listdir(cities_folder)):
+        city_path = os.path.join(cities_folder, city_name)
+        if not os.path.isdir(city_path):
+            continue
+        for shp_file in sorted(os.listdir(city_path)):
+            if not shp_file.endswith(".shp"):
+                continue
+            if shp_file.endswith("_fixed.shp") and os.path.exists(os.path.join(city_path, shp_file.replace("_fixed.shp", ".shp"))):
+                continue
+            fixed_shp = shp_file.replace(".shp", "_fixed.shp")
+            chosen = fixed_shp if os.path.exists(os.path.join(city_path, fixed_shp)) else shp_file
+            entries.append((city_name, chosen.replace(".shp", ""), os.path.join(city_path, chosen)))
+    return entries
+
+
+def city_shapefiles(cities_folder):
+    """{city: [shapefile paths]} with the shapefiles list_shapefiles() picks, i.e. the rows the store holds per city."""
+    groups = {}
+    for city, _, shp_path in list_shapefiles(cities_folder):
+        groups.setdefault(city, []).append(shp_path)
+    return groups
+
+
+def source_key(shp_path):
+    """'ext:size:mtime' of the shapefile and every sidecar present; any change means the geometry must be re-read."""
+    base = os.path.splitext(shp_path)[0]
+    parts = []
+    for ext in SIDECAR_EXTENSIONS:
+        if os.path.exists(base + ext):
+            stat = os.stat(base + ext)
+            parts.append(f"{ext}:{stat.st_size}:{stat.st_mtime}")
+    return ";".join(parts)
+
+
+def repaired_geometry(shp_path):
+    """Dissolved, repaired geometry of a shapefile in BASE_CRS (None if nothing valid is left)."""
+    gdf = gpd.read_file(shp_path)
+    gdf['geometry'] = gdf['geometry'].buffer(0)  # Fixes invalid polygons
+    gdf = gdf[gdf.geometry.is_valid & ~gdf.geometry.is_empty]
+    if gdf.empty:
+        return None
+    if gdf.crs is None:
+        gdf = gdf.set_crs(BASE_CRS)  # assume lat/lon, as the CHSS extractor did
+    geoms = gdf.to_crs(BASE_CRS).geometry
+    return geoms.union_all() if hasattr(geoms, "union_all") else geoms.unary_union
+
+
+def shapefiles_geometry(shp_paths, crs=BASE_CRS):
+    """Union of the repaired geometries of a city's shapefiles in crs (what city_geometries() gives from the store)."""
+    geoms = [g for g in (repaired_geometry(p) for p in shp_paths) if g is not None]
+    if not geoms:
+        return None
+    series = gpd.GeoSeries(geoms, crs=BASE_CRS).to_crs(crs)
+    return series.union_all() if hasattr(series, "union_all") else series.unary_union
+
+
+def build_store(cities_folder, store_path, crs_list=(BASE_CRS,), rebuild=False):
+    """(Re)build the store. Unchanged shapefiles (same source_key() and CRS set) are reused from the old store."""
+    tags = {crs_tag(crs) for crs in crs_list}
+    if None in tags:
+        raise ValueError(f"Only EPSG CRSs can be cached in the boundary store, got {list(crs_list)}")
+    tags = sorted(tags - {crs_tag(BASE_CRS)})
+    previous = {}
+    if os.path.exists(store_path) and not rebuild:
+        old = gpd.read_parquet(store_path)
+        if "source_key" in old.columns and all(f"geom_{tag}" in old.columns for tag in tags):
+            previous = {(row.city, row.shapefile): row for row in old.itertuples(index=False)}
+
+    rows, reused = [], 0
+    for city, shapefile, shp_path in list_shapefiles(cities_folder):
+        stat = os.stat(shp_path)
+        key = source_key(shp_path)
+        old_row = previous.get((city, shapefile))
+        if old_row is not None and old_row.source_key == key:
+            rows.append(old_row._asdict())
+            reused += 1
+            continue
+
+        geometry = repaired_geometry(shp_path)
+        if geometry is None:
+            print(f"  Error: No valid geometries after repair. Skipping {city}/{shapefile}.")
+            continue
+        row = {"city": city, "shapefile": shapefile, "source_path": shp_path,
+               "source_size": stat.st_size, "source_mtime": stat.st_mtime, "source_key": key, "geometry": geometry}
+        row.update(dict(zip([f"{c}_{crs_tag(BASE_CRS)}" for c in ("minx", "miny", "maxx", "maxy")], geometry.bounds)))
+        for tag in tags:
+            projected = gpd.GeoSeries([geometry], crs=BASE_CRS).to_crs(tag.replace("epsg_", "EPSG:")).iloc[0]
+            row[f"geom_{tag}"] = projected.wkb
+            row.update(dict(zip([f"{c}_{tag}" for c in ("minx", "miny", "maxx", "maxy")], projected.bounds)))
+        rows.append(row)
+
+    store = gpd.GeoDataFrame(rows, geometry="geometry", crs=BASE_CRS)
+    tmp_path = store_path + ".tmp"
+    store.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, store_path)
+    print(f"Boundary store: {len(store)} shapefiles ({reused} unchanged) -> {store_path}")
+    return store
+
+
+def load_boundaries(store_path, crs=BASE_CRS, cities=None, bbox=None):
+    """
+    City boundaries as a GeoDataFrame (city, shapefile, geometry + bbox columns) in crs, using the cached
+    reprojection when the store has one. cities limits the rows; bbox (in crs) keeps rows whose bbox intersects it.
+    """
+    tag = crs_tag(crs)
+    store = pd.read_parquet(store_path)
+    if cities is not None:
+        store = store[store["city"].isin(list(cities))]
+    if bbox is not None and tag is not None and f"minx_{tag}" in store.columns:
+        min_x, min_y, max_x, max_y = bbox
+        store = store[(store[f"minx_{tag}"] < max_x) & (store[f"maxx_{tag}"] > min_x) &
+                      (store[f"miny_{tag}"] < max_y) & (store[f"maxy_{tag}"] > min_y)]
+
+    if tag == crs_tag(BASE_CRS):
+        geometry = gpd.GeoSeries.from_wkb(store["geometry"], crs=BASE_CRS)
+    elif tag is not None and f"geom_{tag}" in store.columns:
+        geometry = gpd.GeoSeries.from_wkb(store[f"geom_{tag}"], crs=crs)
+    else:
+        geometry = gpd.GeoSeries.from_wkb(store["geometry"], crs=BASE_CRS).to_crs(crs)
+
+    keep = [c for c in store.columns if c != "geometry" and not c.startswith("geom_")]
+    return gpd.GeoDataFrame(store[keep].reset_index(drop=True), geometry=geometry.reset_index(drop=True), crs=crs)
+
+
+def query_bbox(boundaries, bbox):
+    """Rows of a loaded boundaries frame intersecting bbox, through its spatial index."""
+    return boundaries.iloc[boundaries.sindex.query(box(*bbox), predicate="intersects")]
+
+
+def city_geometries(boundaries):
+    """{city: union of its shapefiles' geometries}."""
+    geometries = {}
+    for city, part in boundaries.groupby("city", sort=True):
+        geometries[city] = part.geometry.union_all() if hasattr(part.geometry, "union_all") else part.geometry.unary_union
+    return geometries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the shared city boundary store (GeoParquet).")
+    parser.add_argument("--cities", required=True, help="city_shape_files/cities folder")
+    parser.add_argument("--store", default="city_boundaries.parquet")
+    parser.add_argument("--crs", nargs="+", default=[BASE_CRS], help="CRSs to cache reprojections for")
+    parser.add_argument("--rebuild", action="store_true", help="Re-read every shapefile")
+    args = parser.parse_args()
+    build_store(args.cities, args.store, args.crs, args.rebuild)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+'''
+Timing/memory instrumentation and leveled logging shared by the pipeline scripts.
+
+Wrap a unit of work in a span and it records wall time, CPU time, peak RSS and the bytes the process
+read/wrote while it ran:
+    with span("reduce", var="t2m", file=nc_path.name):
+        ...
+Spans nest (stage > city > file); each finished span is one JSON line in the trace file (--trace) and
+is kept in memory for summary(), which aggregates them by name. Process pools pass
+initializer=worker_init; workers return take_records() and the parent add_records() them.
+
+Progress goes through logging instead of print: INFO for per-stage progress, DEBUG for per-file and
+per-city detail. DEBUG records that carry extra={"city": ...} are only shown for the cities selected
+with setup_instrumentation(cities=[...]), so one city can be traced without a hard-coded name.
+
+Memory and I/O figures are process-wide: with threads, a span's byte counts include the other threads'
+reads. Peak RSS uses resource (Linux/macOS) or psutil; I/O uses /proc/self/io or psutil. A figure that
+no backend can provide is recorded as null.
+'''
+
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+LOGGER_NAME = "vital"
+LOG_FORMAT = "%(message)s"
+
+_state = threading.local()
+_lock = threading.Lock()
+_records = []
+_sink = None
+
+
+def get_logger(name):
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+class CityFilter(logging.Filter):
+    """Drop DEBUG records tagged with a city outside `cities` (records without a city always pass)."""
+
+    def __init__(self, cities):
+        super().__init__()
+        self.cities = {c.lower() for c in cities}
+
+    def filter(self, record):
+        city = getattr(record, "city", None)
+        return record.levelno > logging.DEBUG or city is None or str(city).lower() in self.cities
+
+
+def setup_instrumentation(level="INFO", cities=None, trace_path=None):
+    """
+    Configure the "vital" loggers: messages to stdout at `level`, DEBUG detail only for `cities`
+    (None = every city), and spans appended to trace_path as JSON lines (None = in memory only).
+    """
+    global _sink
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    if cities:
+        handler.addFilter(CityFilter(cities))
+    logger.addHandler(handler)
+    logger.propagate = False
+
+    with _lock:
+        if _sink is not None:
+            _sink.close()
+        _sink = open(trace_path, "a", encoding="utf-8") if trace_path else None
+    return logger
+
+
+def peak_rss_mb():
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KB on Linux
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / 1024 ** 2
+    return None
+
+
+def io_bytes():
+    """(read, written) bytes of this process so far, including reads served from the page cache."""
+    try:
+        with open("/proc/self/io", encoding="ascii") as f:
+            counters = dict(line.split(":") for line in f if ":" in line)
+        return int(counters["rchar"]), int(counters["wchar"])
+    except (OSError, KeyError, ValueError):
+        pass
+    if psutil is not None:
+        try:
+            counters = psutil.Process().io_counters()
+        except (AttributeError, psutil.Error):
+            return None
+        return (getattr(counters, "read_chars", counters.read_bytes),
+                getattr(counters, "write_chars", counters.write_bytes))
+    return None
+
+
+def _cpu_time():
+    # thread_time on worker threads so parallel spans don't count each other's CPU
+    return time.process_time() if threading.current_thread() is threading.main_thread() else time.thread_time()
+
+
+def _emit(record):
+    with _lock:
+        _records.append(record)
+        if _sink is not None:
+            _sink.write(json.dumps(record, default=str) + "\n")
+            _sink.flush()
+
+
+@contextmanager
+def span(name, **tags):
+    """Time the enclosed block; tags (city, file, var, ...) are stored with the span."""
+    stack = getattr(_state, "stack", None)
+    if stack is None:
+        stack = _state.stack = []
+    parent = stack[-1] if stack else None
+    stack.append(name)
+
+    io_start = io_bytes()
+    cpu_start = _cpu_time()
+    wall_start = time.perf_counter()
+    status = "ok"
+    try:
+        yield tags
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        wall = time.perf_counter() - wall_start
+        cpu = _cpu_time() - cpu_start
+        io_end = io_bytes()
+        stack.pop()
+        record = {"span": name, "parent": parent, **tags, "status": status,
+                  "start": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(time.time() - wall)),
+                  "wall_s": round(wall, 4), "cpu_s": round(cpu, 4),
+                  "peak_rss_mb": None, "read_mb": None, "written_mb": None, "pid": os.getpid()}
+        peak = peak_rss_mb()
+        if peak is not None:
+            record["peak_rss_mb"] = round(peak, 1)
+        if io_start is not None and io_end is not None:
+            record["read_mb"] = round((io_end[0] - io_start[0]) / 1024 ** 2, 3)
+            record["written_mb"] = round((io_end[1] - io_start[1]) / 1024 ** 2, 3)
+        _emit(record)
+
+
+def records():
+    with _lock:
+        return list(_records)
+
+
+def take_records():
+    """Remove and return the spans recorded so far (a worker process ships them back to the parent)."""
+    with _lock:
+        taken = list(_records)
+        _records.clear()
+    return taken
+
+
+def worker_init():
+    """
+    Pool initializer for worker processes. A forked worker inherits the parent's recorded spans and
+    its open trace file; both are dropped so the worker's spans reach the trace (and the summary)
+    only once, when the parent add_records() what take_records() shipped back.
+    """
+    global _lock, _sink
+    _lock = threading.Lock()  # may have been held by another parent thread at fork time
+    _records.clear()
+    if _sink is not None:
+        _sink.close()  # the parent's copy stays open; every write is already flushed
+    _sink = None
+
+
+def add_records(spans):
+    """Record spans finished in a worker process as if they had run here."""
+    for record in spans:
+        _emit(record)
+
+
+def summary(spans=None):
+    """Per span name: count, total/max wall, total CPU, total MB read/written and the highest peak RSS."""
+    rows = {}
+    for r in spans if spans is not None else records():
+        row = rows.setdefault(r["span"], {"span": r["span"], "count": 0, "errors": 0, "wall_s": 0.0, "max_wall_s": 0.0,
+                                          "cpu_s": 0.0, "read_mb": 0.0, "written_mb": 0.0, "peak_rss_mb": None})
+        row["count"] += 1
+        row["errors"] += r["status"] != "ok"
+        row["wall_s"] += r["wall_s"]
+        row["max_wall_s"] = max(row["max_wall_s"], r["wall_s"])
+        row["cpu_s"] += r["cpu_s"]
+        row["read_mb"] += r["read_mb"] or 0.0
+        row["written_mb"] += r["written_mb"] or 0.0
+        if r["peak_rss_mb"] is not None:
+            row["peak_rss_mb"] = max(row["peak_rss_mb"] or 0.0, r["peak_rss_mb"])
+    return sorted(rows.values(), key=lambda row: -row["wall_s"])
+
+
+def format_summary(rows):
+    lines = [f"{'span':<20} {'count':>6} {'wall s':>9} {'max s':>8} {'cpu s':>9} {'read MB':>9} {'write MB':>9} {'peak MB':>8}"]
+    for row in rows:
+        peak = f"{row['peak_rss_mb']:.0f}" if row["peak_rss_mb"] is not None else "-"
+        lines.append(f"{row['span']:<20} {row['count']:>6} {row['wall_s']:>9.2f} {row['max_wall_s']:>8.2f} "
+                     f"{row['cpu_s']:>9.2f} {row['read_mb']:>9.1f} {row['written_mb']:>9.1f} {peak:>8}")
+    return "\n".join(lines)
+
+
+def write_summary(path=None, logger=None):
+    """Log the summary table, and write it as JSON to path if given."""
+    rows = summary()
+    (logger or get_logger("instrumentation")).info("\n" + format_summary(rows))
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+    return rows
+
+
+def load_trace(path):
+    """Spans of a --trace JSON lines file, e.g. to summarize a finished run: summary(load_trace(path))."""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def add_arguments(parser):
+    """The shared --log-level/--debug-city/--trace/--summary options."""
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="Logging level (DEBUG adds per-file and per-city detail)")
+    parser.add_argument("--debug-city", nargs="+", metavar="CITY",
+                        help="Only show DEBUG detail for these cities")
+    parser.add_argument("--trace", help="Append every timing span to this JSON lines file")
+    parser.add_argument("--summary", help="Write the per-span summary to this JSON file")
+
+
+def setup_from_args(args):
+    return setup_instrumentation(args.log_level, args.debug_city, args.trace)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize a --trace JSON lines file by span name.")
+    parser.add_argument("trace")
+    args = parser.parse_args()
+    print(format_summary(summary(load_trace(args.trace))))
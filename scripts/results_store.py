@@ -0,0 +1,251 @@
+'''
+Per-city results store shared by the scorers.
+
+One SQLite table keyed by (country, city, metric, vintage): re-running a scorer overwrites its rows
+instead of appending duplicates (the country always comes from city_countries.json when the city is
+listed there, and an empty country is refused), batches of thousands of rows go in as one transaction, and concurrent
+writers wait on each other (WAL + busy timeout) instead of corrupting a CSV. The CSV/Excel tables in
+data/ are exported from the store on demand:
+    python results_store.py export --layout uei_scores --output "UEI_Scores.csv"
+    python results_store.py export --output all_data.xlsx --stacked
+    python results_store.py import "../data/UEI DATA/UEI_Scores.csv" --layout uei_scores
+'''
+
+import os
+import json
+import time
+import sqlite3
+import argparse
+
+import pandas as pd
+
+
+# Configuration (Update paths as needed)
+results_db = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vital_results.sqlite")
+DEFAULT_VINTAGE = "default"
+
+# City -> country of every row written to the store, whatever country (or none) the writer passed, so
+# "Turkey"/"Türkiye" or ""/"Greece" never become separate keys. Cities missing here need an explicit country.
+countries_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "city_countries.json")
+
+# Export layouts: {table: {column header: metric}}, headers as in the files under data/
+LAYOUTS = {
+    "uei_scores": {
+        "Areas With 30% Cover": "Areas With 30% Cover",
+        "Areas With 30% Cover RF": "Areas With 30% Cover Relative Frequency",
+        "30% Ideal Cover Score": "30% Ideal Cover Score",
+        "Access within 300m NatCov": "Areas within 300m NatCov",
+        "Access within 300m NatCov RF": "Areas within 300m NatCov Relative Frequency",
+        "Total Compact Areas": "Total Compact Areas",
+        "Total Areas": "Total Areas",
+        "UEI Score": "UEI Score",
+    },
+    "wss": {
+        "W": "W",
+        "S": "S",
+        "T": "T",
+        "W&S_Score": "W&S_Score",
+        "Category": "WSS Category",
+    },
+    "pds": {
+        "Population (2023)": "Population",
+        "Area km²": "Area km²",
+        "Urban Density": "Urban Density",
+        "ULS": "PDS",
+        "ULS_Category": "PDS Category",
+    },
+    "vital": {
+        "PM2.5 AIR QUALITY SCORE (PAQS)": "PAQS",
+        " CHRONIC HEAT SAFETY SCORE (CHSS)": "CHSS",
+        " URBAN ENVIRONMENTAL INTEGRATION SCORE (UEI)": "UEI Score",
+        "POPULATION DENSITY SCORE (PDS)": "PDS",
+        "WATER AND SANITATION SCORE (WSS)": "W&S_Score",
+        "VITAL Score": "VITAL Score",
+        "Description": "VITAL Description",
+        "Classification": "Classification",
+    },
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    country TEXT NOT NULL,
+    city    TEXT NOT NULL,
+    metric  TEXT NOT NULL,
+    vintage TEXT NOT NULL,
+    value,
+    source  TEXT,
+    updated TEXT NOT NULL,
+    PRIMARY KEY (country, city, metric, vintage)
+)
+"""
+
+UPSERT = """
+INSERT INTO results (country, city, metric, vintage, value, source, updated) VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (country, city, metric, vintage) DO UPDATE SET
+    value = excluded.value, source = excluded.source, updated = excluded.updated
+"""
+
+
+def clean_value(value):
+    """SQLite-storable value: NaN/None -> NULL, NumPy scalars -> Python numbers."""
+    if value is None:
+        return None
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def load_countries(path=countries_file):
+    """{city: country} lookup ({} if the file does not exist)."""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class ResultsStore:
+    def __init__(self, path=results_db, countries=None):
+        """countries: {city: country} lookup (default: countries_file)."""
+        self.path = path
+        self.countries = load_countries() if countries is None else dict(countries)
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(SCHEMA)
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def country_of(self, city, country=None):
+        """The stored country of city: the lookup's, else the given one; ValueError if neither has one."""
+        resolved = self.countries.get(str(city)) or (country.strip() if isinstance(country, str) else "")
+        if not resolved:
+            raise ValueError(f"No country for city {city!r}: pass one or add the city to {countries_file}")
+        return resolved
+
+    def upsert_many(self, rows, source=None):
+        """rows: iterable of (country, city, metric, vintage, value); all written in ONE transaction."""
+        updated = time.strftime("%Y-%m-%d %H:%M:%S")
+        batch = [(self.country_of(city, country), str(city), str(metric), str(vintage or DEFAULT_VINTAGE),
+                  clean_value(value), source, updated)
+                 for country, city, metric, vintage, value in rows]
+        with self.conn:  # commits, or rolls the whole batch back on error
+            self.conn.executemany(UPSERT, batch)
+        return len(batch)
+
+    def upsert(self, country, city, values, vintage=DEFAULT_VINTAGE, source=None):
+        """Write one city's {metric: value} results."""
+        return self.upsert_many(((country, city, metric, vintage, value) for metric, value in values.items()), source)
+
+    def upsert_frame(self, frame, metrics, vintage=DEFAULT_VINTAGE, source=None,
+                     country_column="Country", city_column="City"):
+        """Write the metrics columns of a per-city DataFrame."""
+        countries = frame[country_column] if country_column in frame.columns else [None] * len(frame)
+        rows = ((country, city, metric, vintage, value)
+                for (country, city), values in zip(zip(countries, frame[city_column]), frame[metrics].to_dict("records"))
+                for metric, value in values.items())
+        return self.upsert_many(rows, source)
+
+    def table(self, metrics=None, vintage=None):
+        """
+        Wide table (Country, City, one column per metric). vintage=None takes each value's latest
+        vintage (highest by string order, e.g. "2024" over "2023"); DEFAULT_VINTAGE counts as the
+        oldest, so a dated vintage always wins over undated results.
+        """
+        query = "SELECT country, city, metric, vintage, value FROM results"
+        params = []
+        clauses = []
+        if metrics:
+            clauses.append(f"metric IN ({', '.join('?' * len(metrics))})")
+            params += list(metrics)
+        if vintage is not None:
+            clauses.append("vintage = ?")
+            params.append(vintage)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        long = pd.read_sql_query(query, self.conn, params=params)
+        if long.empty:
+            return pd.DataFrame(columns=["Country", "City"] + list(metrics or []))
+        long["dated"] = long["vintage"] != DEFAULT_VINTAGE
+        long = long.sort_values(["dated", "vintage"]).drop_duplicates(["country", "city", "metric"], keep="last")
+        wide = long.pivot(index=["country", "city"], columns="metric", values="value").reset_index()
+        wide = wide.rename(columns={"country": "Country", "city": "City"})
+        wide.columns.name = None
+        return wide
+
+
+def layout_frame(store, layout, vintage=None):
+    """One export table: Country, City and the layout's headers, rows with no value for the layout dropped."""
+    columns = LAYOUTS[layout]
+    wide = store.table(list(columns.values()), vintage)
+    for metric in columns.values():
+        if metric not in wide.columns:
+            wide[metric] = None
+    wide = wide.dropna(subset=list(columns.values()), how="all")
+    out = wide[["Country", "City"]].copy()
+    for header, metric in columns.items():
+        out[header] = wide[metric].to_numpy()
+    return out.sort_values(["City", "Country"]).reset_index(drop=True)
+
+
+def export(store, output, layouts=None, vintage=None, stacked=False):
+    """CSV (one layout) or Excel: one sheet per layout, or all tables stacked on one sheet like data/all_data.xlsx."""
+    layouts = layouts or list(LAYOUTS)
+    if output.lower().endswith(".csv"):
+        if len(layouts) != 1:
+            raise ValueError("CSV export needs exactly one --layout")
+        layout_frame(store, layouts[0], vintage).to_csv(output, index=False)
+        return
+    with pd.ExcelWriter(output) as writer:
+        row = 0
+        for layout in layouts:
+            frame = layout_frame(store, layout, vintage)
+            if stacked:
+                frame.to_excel(writer, sheet_name="Sheet1", startrow=row, index=False)
+                row += len(frame) + 2  # header + one blank row between tables
+            else:
+                frame.to_excel(writer, sheet_name=layout, index=False)
+
+
+def import_table(store, path, layout, vintage=DEFAULT_VINTAGE):
+    """Load an existing export (e.g. data/UEI DATA/UEI_Scores.csv) into the store."""
+    frame = pd.read_csv(path) if path.lower().endswith(".csv") else pd.read_excel(path)
+    frame = frame.rename(columns=LAYOUTS[layout])
+    metrics = [m for m in LAYOUTS[layout].values() if m in frame.columns]
+    return store.upsert_frame(frame, metrics, vintage, source=os.path.basename(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export/import per-city results from the VITAL results store.")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", nargs="?", help="File to import")
+    parser.add_argument("--store", default=results_db)
+    parser.add_argument("--layout", nargs="+", choices=list(LAYOUTS), help="Tables to export (default: all)")
+    parser.add_argument("--vintage", help="Only this vintage (default: latest per value)")
+    parser.add_argument("--output", help="Export file (.csv or .xlsx)")
+    parser.add_argument("--stacked", action="store_true", help="Excel: all tables on one sheet, like data/all_data.xlsx")
+    args = parser.parse_args()
+    if args.command == "import" and not (args.path and args.layout):
+        parser.error("import needs a file and --layout")
+    if args.command == "export" and not args.output:
+        parser.error("export needs --output")
+
+    with ResultsStore(args.store) as store:
+        if args.command == "import":
+            n = import_table(store, args.path, args.layout[0], args.vintage or DEFAULT_VINTAGE)
+            print(f"Upserted {n} values from {args.path}")
+        else:
+            export(store, args.output, args.layout, args.vintage, args.stacked)
+            print(f"Exported {', '.join(args.layout or LAYOUTS)} to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+'''
+Orchestrator for the VITAL pipeline.
+
+Stages (pipeline.json) declare a script command, input and output paths/globs and upstream stages.
+A stage's key is a hash of its command, the content of its script and of every local module the script
+imports (zonal_engine.py, vital_scoring.py, ...), every input file, and the output hashes of its
+upstream stages. A stage is skipped when its key matches the last successful run and its outputs still
+exist with the same content, so e.g. changing one city boundary only re-runs the stages that read the
+cities folder, and an upstream re-run that rewrites identical outputs does not cascade downstream. Ready stages run as parallel subprocesses, so the independent CHSS, UEI and PAQS
+branches progress side by side.
+
+File hashes (sha256) are cached in the state file by (size, mtime), so unchanged multi-GB ERA5 files are
+only hashed once.
+
+Usage:
+    python run_pipeline.py                      # run whatever is out of date
+    python run_pipeline.py --dry-run            # only show what would run
+    python run_pipeline.py --only uei_scores    # a stage and everything upstream of it
+    python run_pipeline.py --force chss_extract # re-run a stage regardless (downstream follows if its outputs change)
+'''
+
+import os
+import sys
+import ast
+import glob
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Configuration (Update paths as needed)
+pipeline_config = os.path.join(SCRIPTS_DIR, "pipeline.json")
+STATE_NAME = ".pipeline_state.json"
+MAX_PARALLEL = 3
+
+
+def load_config(path):
+    """Stages by name, with {variables} in paths and commands substituted."""
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    variables = {"scripts": SCRIPTS_DIR, **config.get("variables", {})}
+
+    def expand(value):
+        return value.format(**variables)
+
+    stages = {}
+    for stage in config["stages"]:
+        if not stage.get("enabled", True):
+            continue
+        stages[stage["name"]] = {
+            "name": stage["name"],
+            "branch": stage.get("branch", ""),
+            "command": [expand(part) for part in stage["command"]],
+            "cwd": expand(stage.get("cwd", config.get("cwd", "."))),
+            "inputs": [expand(p) for p in stage.get("inputs", [])],
+            "outputs": [expand(p) for p in stage.get("outputs", [])],
+            "after": [name for name in stage.get("after", []) if name != stage["name"]],
+        }
+    for stage in stages.values():
+        stage["after"] = [name for name in stage["after"] if name in stages]  # disabled stages drop out
+    state_path = expand(config.get("state", os.path.join(SCRIPTS_DIR, STATE_NAME)))
+    return stages, state_path
+
+
+def topological_order(stages):
+    order, visiting, done = [], set(), set()
+
+    def visit(name):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"Cycle in pipeline stages at {name}")
+        visiting.add(name)
+        for upstream in stages[name]["after"]:
+            visit(upstream)
+        visiting.discard(name)
+        done.add(name)
+        order.append(name)
+
+    for name in stages:
+        visit(name)
+    return order
+
+
+def expand_paths(patterns, cwd):
+    """Sorted files matched by the patterns (directories are walked)."""
+    files = set()
+    for pattern in patterns:
+        pattern = pattern if os.path.isabs(pattern) else os.path.join(cwd, pattern)
+        for path in glob.glob(pattern, recursive=True):
+            if os.path.isdir(path):
+                for root, _, names in os.walk(path):
+                    files.update(os.path.join(root, n) for n in names)
+            else:
+                files.add(path)
+    return sorted(files)
+
+
+class HashCache:
+    """sha256 per file, reused while the file's size and mtime are unchanged."""
+
+    def __init__(self, entries):
+        self.entries = entries
+
+    def digest(self, path):
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        cached = self.entries.get(key)
+        if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            return cached["sha256"]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        self.entries[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest.hexdigest()}
+        return digest.hexdigest()
+
+    def fingerprint(self, paths):
+        return {os.path.abspath(p): self.digest(p) for p in paths}
+
+
+def local_imports(path, found=None):
+    """
+    path plus every module it imports (at any depth, lazy imports included) that is a .py file next to
+    it or in SCRIPTS_DIR, recursively. Third-party and standard modules are not files there.
+    """
+    found = set() if found is None else found
+    if path in found:
+        return found
+    found.add(path)
+    try:
+        with open(path, encoding="utf-8") as f:
+            tree = ast.parse(f.read(), path)
+    except (OSError, SyntaxError, ValueError):
+        return found
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            modules = [node.module]
+        else:
+            continue
+        for module in modules:
+            for folder in (os.path.dirname(path), SCRIPTS_DIR):
+                candidate = os.path.join(folder, module.split(".")[0] + ".py")
+                if os.path.exists(candidate):
+                    local_imports(candidate, found)
+                    break
+    return found
+
+
+def script_paths(stage):
+    """The .py files a stage's command runs and the local modules they import; their content is part of the stage key."""
+    found = set()
+    for part in stage["command"]:
+        path = os.path.join(SCRIPTS_DIR, part)
+        if part.endswith(".py") and os.path.exists(path):
+            local_imports(path, found)
+    return sorted(found)
+
+
+def stage_key(stage, hashes, upstream_outputs):
+    """upstream_outputs: {upstream stage: its output hashes (or its key if it declares no outputs)}."""
+    inputs = hashes.fingerprint(expand_paths(stage["inputs"], stage["cwd"]) + script_paths(stage))
+    payload = json.dumps({"command": stage["command"], "inputs": inputs, "after": upstream_outputs}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def outputs_unchanged(stage, hashes, recorded):
+    outputs = expand_paths(stage["outputs"], stage["cwd"])
+    if stage["outputs"] and not outputs:
+        return False
+    return hashes.fingerprint(outputs) == recorded
+
+
+def run_stage(stage, log_folder):
+    """Run one stage's command; its stdout/stderr go to <log_folder>/<stage>.log."""
+    command = [sys.executable if part == "python" else part for part in stage["command"]]
+    command = [os.path.join(SCRIPTS_DIR, part) if part.endswith(".py") and not os.path.isabs(part) else part
+               for part in command]
+    os.makedirs(log_folder, exist_ok=True)
+    log_path = os.path.join(log_folder, f"{stage['name']}.log")
+    start = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log:
+        result = subprocess.run(command, cwd=stage["cwd"], stdout=log, stderr=subprocess.STDOUT)
+    return result.returncode, time.perf_counter() - start, log_path
+
+
+def save_state(state, state_path):
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp_path, state_path)
+
+
+def select(stages, only):
+    """The requested stages and everything upstream of them."""
+    keep = set()
+
+    def add(name):
+        if name not in keep:
+            keep.add(name)
+            for upstream in stages[name]["after"]:
+                add(upstream)
+
+    for name in only:
+        if name not in stages:
+            raise ValueError(f"Unknown stage {name}; known: {', '.join(stages)}")
+        add(name)
+    return {name: stage for name, stage in stages.items() if name in keep}
+
+
+def run_pipeline(stages, state_path, force=(), dry_run=False, max_parallel=MAX_PARALLEL):
+    state = {"hashes": {}, "stages": {}}
+    if os.path.exists(state_path):
+        with open(state_path, encoding="utf-8") as f:
+            state = json.load(f)
+    hashes = HashCache(state.setdefault("hashes", {}))
+    records = state.setdefault("stages", {})
+    log_folder = os.path.join(os.path.dirname(os.path.abspath(state_path)), "pipeline_logs")
+
+    order = topological_order(stages)
+    keys, status = {}, {}
+    forced = set(force)
+    pending = list(order)
+    running = {}
+
+    def ready(name):
+        return all(status.get(up) in ("skipped", "done", "would run") for up in stages[name]["after"])
+
+    with ThreadPoolExecutor(max_workers=max_parallel) as pool:
+        while pending or running:
+            for name in [n for n in pending if ready(n)]:
+                pending.remove(name)
+                stage = stages[name]
+                upstream_outputs = {up: records.get(up, {}).get("outputs", {}) if stages[up]["outputs"] else keys[up]
+                                    for up in stage["after"]}
+                keys[name] = stage_key(stage, hashes, upstream_outputs)
+                record = records.get(name, {})
+                # In a dry run the upstream outputs a "would run" stage writes are not known yet
+                upstream_pending = any(status[up] == "would run" for up in stage["after"])
+                up_to_date = (name not in forced and not upstream_pending and record.get("key") == keys[name]
+                              and outputs_unchanged(stage, hashes, record.get("outputs", {})))
+                if up_to_date:
+                    status[name] = "skipped"
+                    print(f"  [skip] {name} (up to date)")
+                elif dry_run:
+                    status[name] = "would run"
+                    print(f"  [run]  {name}: {' '.join(stage['command'])}")
+                else:
+                    print(f"  [start] {name}" + (f" ({stage['branch']})" if stage["branch"] else ""))
+                    running[pool.submit(run_stage, stage, log_folder)] = name
+
+            if not running:
+                if pending and not any(ready(n) for n in pending):
+                    for name in pending:
+                        status[name] = "blocked"
+                        print(f"  [blocked] {name} (an upstream stage failed)")
+                    pending = []
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                returncode, seconds, log_path = future.result()
+                if returncode == 0:
+                    status[name] = "done"
+                    outputs = expand_paths(stages[name]["outputs"], stages[name]["cwd"])
+                    records[name] = {"key": keys[name], "outputs": hashes.fingerprint(outputs),
+                                     "finished": time.strftime("%Y-%m-%d %H:%M:%S"), "seconds": round(seconds, 1)}
+                    print(f"  [done] {name} in {seconds:.1f}s")
+                else:
+                    status[name] = "failed"
+                    print(f"  [FAILED] {name} (exit {returncode}), see {log_path}")
+                if not dry_run:
+                    save_state(state, state_path)
+
+    if not dry_run:
+        save_state(state, state_path)
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the VITAL pipeline stages that are out of date.")
+    parser.add_argument("--config", default=pipeline_config)
+    parser.add_argument("--only", nargs="+", help="Run these stages (and their upstream stages) only")
+    parser.add_argument("--force", nargs="+", default=[], help="Re-run these stages even if up to date")
+    parser.add_argument("--dry-run", action="store_true", help="Show what would run, run nothing")
+    parser.add_argument("--parallel", type=int, default=MAX_PARALLEL, help="Stages run at the same time")
+    args = parser.parse_args()
+
+    stages, state_path = load_config(args.config)
+    if args.only:
+        stages = select(stages, args.only)
+    status = run_pipeline(stages, state_path, args.force, args.dry_run, args.parallel)
+
+    counts = {}
+    for result in status.values():
+        counts[result] = counts.get(result, 0) + 1
+    print("\n" + ", ".join(f"{n} {result}" for result, n in sorted(counts.items())))
+    if any(result in ("failed", "blocked") for result in status.values()):
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+'''
+Vectorized scoring engine for WSS, PDS and the combined VITAL index.
+
+Reads per-city metric tables (CSV, Parquet, or Excel sheets with several tables stacked and separated
+by blank rows, like data/all_data.xlsx), joins them on City and scores every city in one call:
+- WSS   = weighted sum of W, S and T
+- PDS   = log-scaled urban density score, 100 at the least dense city, 0 at the density cap
+- VITAL = weighted mean of PAQS, CHSS, UEI, PDS and WSS
+
+Every score is a NumPy expression over whole columns and categories are binned with np.select, so
+thousands of cities score as fast as ten. Weights, caps, category thresholds, labels and descriptions
+come from vital_scoring.json; the defaults reproduce the scores in data/all_data.xlsx. PDS categories
+are binned like compute_PDS.py, on the score rounded once to an integer: the workbook binned Cairo's
+25.9 as "Unhealthy", this gives "Poor" (26).
+
+Usage:
+    python vital_scoring.py ../data/all_data.xlsx --output vital_scores.xlsx
+'''
+
+import os
+import json
+import argparse
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+
+# Configuration (Update paths as needed)
+scoring_config = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vital_scoring.json")
+
+# Columns written to the results store with --store (UEI Score comes from the UEI scorers)
+STORED_METRICS = ["PAQS", "CHSS", "W", "S", "T", "W&S_Score", "WSS Category", "Population", "Area km²",
+                  "Urban Density", "PDS", "PDS Category", "VITAL Score", "VITAL Description", "Classification"]
+
+
+def load_config(path=scoring_config):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def round_half_up(values, decimals=0):
+    """Excel ROUND (halves away from zero), not NumPy's round-half-to-even."""
+    scale = 10.0 ** decimals
+    values = np.asarray(values, dtype="float64")
+    return np.sign(values) * np.floor(np.abs(values) * scale + 0.5) / scale
+
+
+def categorize(scores, bins, field="label"):
+    """
+    Bin scores like the workbook's IFS chains: bins are tried in order, each with an inclusive "max" or
+    "min" bound or an exclusive "below" bound; a bin with none catches everything left. NaN scores get "".
+    """
+    scores = np.asarray(scores, dtype="float64")
+    conditions = []
+    for b in bins:
+        if "max" in b:
+            conditions.append(scores <= b["max"])
+        elif "below" in b:
+            conditions.append(scores < b["below"])
+        elif "min" in b:
+            conditions.append(scores >= b["min"])
+        else:
+            conditions.append(np.isfinite(scores))
+    choices = [b.get(field, "") for b in bins]
+    return np.where(np.isfinite(scores), np.select(conditions, choices, default=""), "")
+
+
+def wss_scores(w, s, t, config):
+    weights = config["weights"]
+    score = weights["W"] * np.asarray(w, dtype="float64") + weights["S"] * np.asarray(s, dtype="float64") \
+        + weights["T"] * np.asarray(t, dtype="float64")
+    return round_half_up(score, config["decimals"])
+
+
+def urban_density(population, area_km2):
+    """People per km² (UN-Habitat SDG 11.3.1)."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.asarray(population, dtype="float64") / np.asarray(area_km2, dtype="float64")
+
+
+def pds_raw_scores(density, config):
+    """Unrounded log-scaled density score; min_density defaults to the least dense city in the table."""
+    cap = config["cap_density"]
+    density = np.minimum(np.asarray(density, dtype="float64"), cap)
+    min_density = config.get("min_density")
+    if min_density is None:
+        min_density = np.nanmin(density)
+    return 100 * (np.log(cap + 1) - np.log(density + 1)) / (np.log(cap + 1) - np.log(min_density + 1))
+
+
+def pds_scores(density, config):
+    """PDS as displayed (config["decimals"]); bin pds_bin_scores() instead, not these."""
+    return round_half_up(pds_raw_scores(density, config), config["decimals"])
+
+
+def pds_bin_scores(raw, config):
+    """
+    Scores the PDS categories are binned on: with categorize_rounded, the raw score rounded ONCE to
+    an integer (compute_PDS.py's categorize(round(pds))), so 75.46 is 75 "Moderate" even though it
+    displays as 75.5; otherwise the raw score.
+    """
+    return round_half_up(raw) if config.get("categorize_rounded") else np.asarray(raw, dtype="float64")
+
+
+def vital_scores(components, config):
+    """Weighted mean of the component scores (NaN if any component is missing), rounded like ROUND(AVERAGE())."""
+    weights = config["weights"]
+    total = sum(weights.values())
+    score = sum(weight * np.asarray(components[name], dtype="float64") for name, weight in weights.items()) / total
+    return round_half_up(score, config["decimals"])
+
+
+def split_stacked_sheet(raw):
+    """Tables of a header=None sheet where each table starts with a header row after a blank row."""
+    blank = raw.isna().all(axis=1).to_numpy()
+    tables, start = [], None
+    for i in range(len(raw) + 1):
+        if i < len(raw) and not blank[i]:
+            if start is None:
+                start = i
+            continue
+        if start is not None:
+            block = raw.iloc[start:i].dropna(axis=1, how="all")
+            header = [str(h).strip() for h in block.iloc[0]]
+            tables.append(pd.DataFrame(block.iloc[1:].to_numpy(), columns=header))
+            start = None
+    return tables
+
+
+def read_tables(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return [pd.read_csv(path)]
+    if ext == ".parquet":
+        return [pd.read_parquet(path)]
+    sheets = pd.read_excel(path, sheet_name=None, header=None)
+    return [table for raw in sheets.values() for table in split_stacked_sheet(raw)]
+
+
+def city_key(name, aliases):
+    name = unicodedata.normalize("NFC", str(name).strip())
+    return aliases.get(name, name)
+
+
+def read_metrics(paths, config):
+    """One row per city with the metric columns named as in config["columns"], merged across every table."""
+    columns, aliases = config["columns"], config.get("city_aliases", {})
+    merged = None
+    for path in paths:
+        for table in read_tables(path):
+            table = table.rename(columns={c: columns[c] for c in table.columns if c in columns})
+            table = table.loc[:, ~table.columns.duplicated()]
+            keep = [c for c in dict.fromkeys(columns.values()) if c in table.columns and c != "City"]
+            if "City" not in table.columns or not keep:
+                continue
+            part = table[["City"] + keep].dropna(subset=["City"])
+            part = part.assign(City=[city_key(c, aliases) for c in part["City"]]).drop_duplicates("City").set_index("City")
+            merged = part if merged is None else merged.combine_first(part)
+    if merged is None:
+        raise ValueError(f"No metric tables with a City column in {paths}")
+    for column in merged.columns:
+        if column != "Country":
+            merged[column] = pd.to_numeric(merged[column], errors="coerce")
+    return merged.reset_index()
+
+
+def score_table(metrics, config):
+    """Score every city of metrics (City, W, S, T, Population, Area km², PAQS, CHSS, UEI) in one pass."""
+    out = metrics.copy()
+    for column in ["W", "S", "T", "Population", "Area km²", "PAQS", "CHSS", "UEI"]:
+        if column not in out.columns:
+            out[column] = np.nan
+
+    wss = wss_scores(out["W"], out["S"], out["T"], config["wss"])
+    out["W&S_Score"] = wss
+    out["WSS Category"] = categorize(wss, config["wss"]["bins"])
+    out["WSS Description"] = categorize(wss, config["wss"]["bins"], "description")
+
+    density = urban_density(out["Population"], out["Area km²"])
+    raw_pds = pds_raw_scores(density, config["pds"])
+    pds = round_half_up(raw_pds, config["pds"]["decimals"])
+    pds_binned = pds_bin_scores(raw_pds, config["pds"])
+    out["Urban Density"] = round_half_up(density, 1)
+    out["PDS"] = pds
+    out["PDS Category"] = categorize(pds_binned, config["pds"]["bins"])
+    out["PDS Description"] = categorize(pds_binned, config["pds"]["bins"], "description")
+
+    vital = vital_scores({"PAQS": out["PAQS"], "CHSS": out["CHSS"], "UEI": out["UEI"], "PDS": pds, "WSS": wss},
+                         config["vital"])
+    out["VITAL Score"] = vital
+    out["Description"] = categorize(vital, config["vital"]["bins"], "description")
+    out["Classification"] = categorize(vital, config["vital"]["bins"])
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score WSS, PDS and the VITAL index for every city in the metric tables.")
+    parser.add_argument("inputs", nargs="+", help="Metric tables: .xlsx (stacked tables allowed), .csv or .parquet")
+    parser.add_argument("--config", default=scoring_config)
+    parser.add_argument("--output", help="Write the scored table (.csv or .xlsx)")
+    parser.add_argument("--store", help="Also upsert the scores into this results store (results_store.py)")
+    parser.add_argument("--vintage", default="default", help="Vintage stored with --store")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    scored = score_table(read_metrics(args.inputs, config), config)
+    print(scored[["City", "PAQS", "CHSS", "UEI", "PDS", "W&S_Score", "VITAL Score", "Classification"]].to_string(index=False))
+
+    if args.output:
+        if args.output.lower().endswith(".csv"):
+            scored.to_csv(args.output, index=False)
+        else:
+            scored.to_excel(args.output, index=False)
+        print(f"\nSaved {len(scored)} cities to {args.output}")
+
+    if args.store:
+        from results_store import ResultsStore
+
+        with ResultsStore(args.store) as store:
+            n = store.upsert_frame(scored.rename(columns={"Description": "VITAL Description"}), STORED_METRICS,
+                                   args.vintage, source="vital_scoring")
+        print(f"Upserted {n} values into {args.store}")
+
+
+if __name__ == "__main__":
+    main()
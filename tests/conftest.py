@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The pipeline scripts import their shared modules by folder (scripts/, scripts/CHSS/, scripts/UEI/)
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts")
+for folder in (SCRIPTS_DIR, os.path.join(SCRIPTS_DIR, "CHSS"), os.path.join(SCRIPTS_DIR, "UEI")):
+    if folder not in sys.path:
+        sys.path.insert(0, folder)
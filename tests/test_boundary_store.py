@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+gpd = pytest.importorskip("geopandas")
+pytest.importorskip("pyarrow")
+
+from shapely.geometry import box  # noqa: E402
+
+from boundary_store import (build_store, city_geometries, city_shapefiles, load_boundaries,  # noqa: E402
+                            shapefiles_geometry, source_key)
+
+
+def write_shapefile(path, *geometries, crs="EPSG:4326"):
+    gpd.GeoDataFrame({"id": list(range(len(geometries)))}, geometry=list(geometries), crs=crs).to_file(path)
+
+
+@pytest.fixture
+def cities(tmp_path):
+    folder = tmp_path / "cities"
+    (folder / "Athens").mkdir(parents=True)
+    (folder / "Cairo").mkdir()
+    (folder / "Empty").mkdir()
+    write_shapefile(folder / "Athens" / "a_core.shp", box(23.6, 37.9, 23.8, 38.1))
+    write_shapefile(folder / "Athens" / "b_port.shp", box(23.5, 37.8, 23.65, 37.95))
+    write_shapefile(folder / "Cairo" / "cairo.shp", box(31.0, 29.9, 31.2, 30.1))
+    write_shapefile(folder / "Cairo" / "cairo_fixed.shp", box(31.0, 29.9, 31.4, 30.2))
+    return str(folder)
+
+
+def test_folder_paths_use_every_shapefile_of_a_city(cities):
+    groups = city_shapefiles(cities)
+    assert sorted(groups) == ["Athens", "Cairo"]
+    assert [os.path.basename(p) for p in groups["Athens"]] == ["a_core.shp", "b_port.shp"]
+    assert [os.path.basename(p) for p in groups["Cairo"]] == ["cairo_fixed.shp"]
+
+
+@pytest.mark.parametrize("crs", ["EPSG:4326", "EPSG:3857"])
+def test_folder_geometry_matches_the_store(cities, tmp_path, crs):
+    store_path = str(tmp_path / "boundaries.parquet")
+    build_store(cities, store_path, crs_list=["EPSG:4326", "EPSG:3857"])
+    from_store = city_geometries(load_boundaries(store_path, crs=crs))
+    for city, shp_paths in city_shapefiles(cities).items():
+        from_folder = shapefiles_geometry(shp_paths, crs)
+        assert from_folder.symmetric_difference(from_store[city]).area <= 1e-9 * from_folder.area
+
+
+def test_sidecar_change_invalidates_the_store_row(cities, tmp_path):
+    store_path = str(tmp_path / "boundaries.parquet")
+    build_store(cities, store_path)
+    shp_path = os.path.join(cities, "Cairo", "cairo_fixed.shp")
+    key = source_key(shp_path)
+    prj_path = shp_path[:-4] + ".prj"
+    stat = os.stat(prj_path)
+
+    # Same .shp, different CRS: the reused row would keep the wrong geometry
+    write_shapefile(os.path.join(str(tmp_path), "moved.shp"), box(31.0, 29.9, 31.4, 30.2), crs="EPSG:3857")
+    with open(os.path.join(str(tmp_path), "moved.prj")) as f:
+        prj = f.read()
+    with open(prj_path, "w") as f:
+        f.write(prj)
+    os.utime(prj_path, (stat.st_atime, stat.st_mtime + 10))
+    assert source_key(shp_path) != key
+
+    store = build_store(cities, store_path)
+    cairo = store[store["city"] == "Cairo"].geometry.iloc[0]
+    assert cairo.bounds[2] < 1  # 31.4 m east of the origin, not 31.4 degrees
@@ -0,0 +1,71 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("pyarrow")
+
+from city_day_store import write_parquet  # noqa: E402
+from climate_query import ClimateStore, KELVIN_OFFSET, parse_day  # noqa: E402
+
+
+DATES = ["2023-12-30", "2023-12-31", "2024-01-01", "2024-01-02", "2024-01-31", "2024-02-01"]
+
+
+@pytest.fixture
+def store(tmp_path):
+    frames = []
+    for offset, city in enumerate(["Athens", "Cairo"]):
+        frames.append(pd.DataFrame({
+            "city": city,
+            "shapefile": f"{city}_1",
+            "date": pd.to_datetime(DATES),
+            "d2m": [280.0 + offset] * len(DATES),
+            "t2m": [KELVIN_OFFSET + 30 + i + 10 * offset for i in range(len(DATES))],
+        }))
+    write_parquet(pd.concat(frames, ignore_index=True), str(tmp_path))
+    return ClimateStore(str(tmp_path))
+
+
+def rows(store, **kwargs):
+    table = store.dataset.to_table(columns=["city", "date"], filter=store.filter(**kwargs)).to_pandas()
+    return sorted((city, str(date.date())) for city, date in zip(table["city"], table["date"]))
+
+
+def test_parse_day_expands_years_and_months_to_their_last_day():
+    assert parse_day("2024") == pd.Timestamp("2024-01-01")
+    assert parse_day("2024", end=True) == pd.Timestamp("2024-12-31")
+    assert parse_day("2024-02", end=True) == pd.Timestamp("2024-02-29")
+    assert parse_day("2024-02-10", end=True) == pd.Timestamp("2024-02-10")
+    assert parse_day(None) is None
+
+
+def test_filter_without_restrictions_is_none(store):
+    assert store.filter() is None
+    assert len(rows(store)) == 2 * len(DATES)
+
+
+def test_filter_by_city(store):
+    assert {city for city, _ in rows(store, cities=["Cairo"])} == {"Cairo"}
+    assert rows(store, cities=["Nowhere"]) == []
+
+
+def test_filter_by_inclusive_month_range(store):
+    assert rows(store, cities=["Athens"], start="2024-01", end="2024-01") == [
+        ("Athens", "2024-01-01"), ("Athens", "2024-01-02"), ("Athens", "2024-01-31")]
+
+
+def test_filter_across_a_year_boundary(store):
+    assert rows(store, cities=["Athens"], start="2023-12-31", end="2024-01-01") == [
+        ("Athens", "2023-12-31"), ("Athens", "2024-01-01")]
+    assert rows(store, cities=["Athens"], end="2023") == [("Athens", "2023-12-30"), ("Athens", "2023-12-31")]
+    assert rows(store, cities=["Athens"], start="2024-02") == [("Athens", "2024-02-01")]
+
+
+def test_select_and_hot_days_use_the_filter(store):
+    frame = store.select(["Athens", "Cairo"], "2024-01-02", "2024-01-02", ["t2m"])
+    assert list(frame.columns) == ["city", "shapefile", "date", "t2m"]
+    assert frame["city"].tolist() == ["Athens", "Cairo"]
+
+    hot = store.hot_days("t2m", 33.5, start="2024").set_index("city")
+    # Athens is 30 + i °C, Cairo 40 + i °C on day i
+    assert hot.loc["Athens", "hot_days"] == 2 and hot.loc["Athens", "days"] == 4
+    assert hot.loc["Cairo", "hot_days"] == 4
@@ -0,0 +1,64 @@
+import datetime
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("pyarrow")
+openpyxl = pytest.importorskip("openpyxl")
+
+import csv_to_excel  # noqa: E402
+from city_day_store import write_parquet  # noqa: E402
+from csv_to_excel import export, parquet_cities  # noqa: E402
+
+
+@pytest.fixture
+def parquet_root(tmp_path):
+    frame = pd.DataFrame({
+        "city": ["Athens"] * 3 + ["Cairo"] * 2,
+        "shapefile": ["Athens_1"] * 3 + ["Cairo_1"] * 2,
+        "date": pd.to_datetime(["2024-01-01", "2024-01-02", "2025-01-01", "2024-01-01", "2024-01-02"]),
+        "d2m": [280.0, 281.0, 282.0, 290.0, float("nan")],
+        "t2m": [290.0, 291.0, 292.0, 300.0, 301.0],
+    })
+    root = tmp_path / "parquet"
+    write_parquet(frame, str(root))
+    return str(root)
+
+
+def sheet_rows(path):
+    workbook = openpyxl.load_workbook(path)
+    return {sheet.title: [list(row) for row in sheet.iter_rows(values_only=True)] for sheet in workbook.worksheets}
+
+
+def test_parquet_sheets_export_one_sheet_per_city(parquet_root, tmp_path):
+    output = str(tmp_path / "daily.xlsx")
+    assert export(parquet_cities(parquet_root), "sheets", output) == [output]
+
+    sheets = sheet_rows(output)
+    assert list(sheets) == ["Athens", "Cairo"]
+    header = sheets["Athens"][0]
+    assert header.count("city") == 1 and header[:3] == ["city", "shapefile", "date"]
+    assert len(sheets["Athens"]) == 4 and len(sheets["Cairo"]) == 3
+
+    row = dict(zip(header, sheets["Athens"][1]))
+    assert row["city"] == "Athens" and row["date"] == datetime.datetime(2024, 1, 1)
+    assert row["t2m"] == 290.0
+    assert dict(zip(header, sheets["Cairo"][2]))["d2m"] is None  # NaN -> empty cell
+
+
+def test_parquet_combined_export_rolls_over_at_the_row_limit(parquet_root, tmp_path, monkeypatch):
+    monkeypatch.setattr(csv_to_excel, "EXCEL_MAX_ROWS", 4)  # header + 3 rows per sheet
+    output = str(tmp_path / "combined.xlsx")
+    export(parquet_cities(parquet_root), "combined", output)
+
+    sheets = sheet_rows(output)
+    assert list(sheets) == ["CHSS daily", "CHSS daily 2"]
+    assert all(rows[0][0] == "city" for rows in sheets.values())
+    cities = [row[0] for rows in sheets.values() for row in rows[1:]]
+    assert cities == ["Athens"] * 3 + ["Cairo"] * 2
+
+
+def test_parquet_export_with_an_empty_store_writes_nothing(tmp_path):
+    (tmp_path / "empty").mkdir()
+    output = str(tmp_path / "none.xlsx")
+    assert export(parquet_cities(str(tmp_path / "empty")), "sheets", output) == []
@@ -0,0 +1,128 @@
+import json
+import zipfile
+
+import download
+from download import DEFAULT_AREA, Manifest, StubClient, plan_areas, plan_requests, run_downloads
+
+
+ATHENS = (23.6, 37.9, 23.9, 38.1)
+PIRAEUS = (23.0, 37.5, 23.3, 37.7)
+CAIRO = (31.1, 29.9, 31.4, 30.2)
+
+
+def test_plan_areas_snaps_one_padded_city_to_the_grid():
+    assert plan_areas([ATHENS]) == [[38.6, 23.1, 37.4, 24.4]]
+
+
+def test_plan_areas_merges_nearby_cities_and_keeps_distant_ones_apart():
+    areas = plan_areas([ATHENS, CAIRO, PIRAEUS])
+    assert areas == [[38.6, 22.5, 37.0, 24.4], [30.7, 30.6, 29.4, 31.9]]
+
+
+def test_plan_areas_falls_back_to_the_default_area_when_clusters_cover_as_much():
+    # Opposite corners of DEFAULT_AREA: two small clusters, far smaller than the union bbox
+    corners = [(-74, -24, -73, -23), (124, 54, 124.5, 54.5)]
+    assert len(plan_areas(corners)) == 2
+    assert plan_areas(corners, pad=60) == [DEFAULT_AREA]
+    assert plan_areas([]) == [DEFAULT_AREA]
+
+
+def test_plan_areas_widens_the_gap_past_max_areas():
+    cities = [(10.0 * i, 0.0, 10.0 * i + 0.1, 0.1) for i in range(5)]
+    assert len(plan_areas(cities, max_areas=8)) == 5
+    assert len(plan_areas(cities, max_areas=2)) <= 2
+
+
+def test_plan_requests_names_one_file_per_month_and_area():
+    jobs = plan_requests([2024], [1, 2], [[1, 0, 0, 1]])
+    assert [job["outfile"] for job in jobs] == ["era5_land_2024_01.nc", "era5_land_2024_02.nc"]
+
+    jobs = plan_requests([2024], [1], [[1, 0, 0, 1], [3, 2, 2, 3]])
+    assert [job["outfile"] for job in jobs] == ["era5_land_2024_01_a1.nc", "era5_land_2024_01_a2.nc"]
+    assert [job["request"]["area"] for job in jobs] == [[1, 0, 0, 1], [3, 2, 2, 3]]
+
+
+def test_run_downloads_with_the_stub_resumes_from_the_manifest(tmp_path):
+    jobs = plan_requests([2024], [1, 2, 3], [[1, 0, 0, 1]])
+    client = StubClient()
+    downloaded, skipped, failed = run_downloads(client, jobs, str(tmp_path), max_parallel=2, backoff=0)
+    assert sorted(downloaded) == [job["outfile"] for job in jobs]
+    assert (skipped, failed) == ([], [])
+    with zipfile.ZipFile(tmp_path / "era5_land_2024_01.nc") as z:
+        assert sorted(z.namelist()) == ["2m_dewpoint_temperature_0_daily-mean.nc", "2m_temperature_0_daily-mean.nc"]
+    manifest = Manifest(str(tmp_path / download.MANIFEST_NAME))
+    assert all(manifest.get(job["outfile"])["stub"] for job in jobs)
+
+    downloaded, skipped, failed = run_downloads(StubClient(), jobs, str(tmp_path), backoff=0)
+    assert downloaded == [] and sorted(skipped) == [job["outfile"] for job in jobs]
+
+
+def test_run_downloads_retries_stub_failures(tmp_path):
+    jobs = plan_requests([2024], range(1, 7), [[1, 0, 0, 1]])
+    client = StubClient(fail_rate=0.3, seed=1)
+    downloaded, _, failed = run_downloads(client, jobs, str(tmp_path), retries=10, backoff=0, sleep=lambda s: None)
+    assert failed == [] and len(downloaded) == len(jobs)
+    assert len(client.calls) > len(jobs)
+    assert not list(tmp_path.glob("*.part"))
+
+
+def test_stub_files_never_count_as_real_downloads(tmp_path):
+    jobs = plan_requests([2024], [1], [[1, 0, 0, 1]])
+    run_downloads(StubClient(), jobs, str(tmp_path), backoff=0)
+
+    class RealClient:
+        """Not a StubClient: stands in for cdsapi.Client."""
+
+        def __init__(self):
+            self.requests = []
+
+        def retrieve(self, name, request):
+            self.requests.append(request)
+            return download._StubResult(request)
+
+    client = RealClient()
+    downloaded, skipped, _ = run_downloads(client, jobs, str(tmp_path), backoff=0)
+    assert downloaded == ["era5_land_2024_01.nc"] and skipped == []
+    entry = json.loads((tmp_path / download.MANIFEST_NAME).read_text())["files"]["era5_land_2024_01.nc"]
+    assert "stub" not in entry
+
+
+def test_unzip_names_keep_the_area_suffix():
+    from unzip_nc import output_name, parse_zip_name
+
+    assert parse_zip_name("era5_land_2024_01.nc") == ("2024", "01", "")
+    assert parse_zip_name("era5_land_2024_01_a2.nc") == ("2024", "01", "a2")
+    assert parse_zip_name("notes.txt") is None
+    assert output_name("2m_temperature_0_daily-mean.nc", "2024", "01") == "2m_temperature_2024_01_daily-mean.nc"
+    assert output_name("2m_temperature_0_daily-mean.nc", "2024", "01", "a2") == "2m_temperature_2024_01_a2_daily-mean.nc"
+
+
+def test_unzip_incremental_never_leaves_a_partial_member(tmp_path, monkeypatch):
+    import zipfile
+
+    import unzip_nc
+
+    zip_path = tmp_path / "era5_land_2024_01.nc"
+    with zipfile.ZipFile(zip_path, "w") as zf:
+        zf.writestr("2m_temperature_0_daily-mean.nc", b"new" * 1000)
+    out = tmp_path / "out"
+    out.mkdir()
+    final = out / "2m_temperature_2024_01_daily-mean.nc"
+    final.write_bytes(b"old")
+    monkeypatch.setattr(unzip_nc, "output_folder", str(out))
+
+    def broken_copy(src, dst, length=0):
+        dst.write(src.read(10))
+        raise OSError("disk full")
+
+    monkeypatch.setattr(unzip_nc.shutil, "copyfileobj", broken_copy)
+    _, entries, errors = unzip_nc.unpack_zip_incremental(str(zip_path), {})
+    assert entries == [] and errors and final.read_bytes() == b"old"
+    assert sorted(p.name for p in out.iterdir()) == [final.name]
+
+    monkeypatch.undo()
+    monkeypatch.setattr(unzip_nc, "output_folder", str(out))
+    _, entries, errors = unzip_nc.unpack_zip_incremental(str(zip_path), {})
+    assert errors == [] and entries[0]["status"] == "extracted"
+    assert final.read_bytes() == b"new" * 1000
+    assert sorted(p.name for p in out.iterdir()) == [final.name]
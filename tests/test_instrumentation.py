@@ -0,0 +1,50 @@
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import instrumentation
+from instrumentation import add_records, records, setup_instrumentation, span, summary, take_records, worker_init
+
+
+def work(i):
+    with span("work", i=i):
+        pass
+    return take_records()
+
+
+@pytest.fixture
+def trace(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    take_records()
+    setup_instrumentation(trace_path=str(path))
+    yield path
+    setup_instrumentation()
+    take_records()
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_forked_workers_report_their_spans_once(trace):
+    with span("load_zones"):
+        pass
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(max_workers=2, mp_context=context, initializer=worker_init) as pool:
+        for spans in pool.map(work, range(4)):
+            add_records(spans)
+
+    counts = {row["span"]: row["count"] for row in summary()}
+    assert counts == {"load_zones": 1, "work": 4}
+    lines = [json.loads(line)["span"] for line in trace.read_text().splitlines()]
+    assert sorted(lines) == ["load_zones"] + ["work"] * 4
+
+
+def test_spans_nest_and_record_errors(trace):
+    with pytest.raises(ValueError):
+        with span("stage"):
+            with span("city", city="Athens"):
+                raise ValueError("boom")
+    city, stage = records()
+    assert (city["span"], city["parent"], city["city"], city["status"]) == ("city", "stage", "Athens", "error")
+    assert (stage["span"], stage["parent"]) == ("stage", None)
+    assert instrumentation.load_trace(str(trace)) == [city, stage]
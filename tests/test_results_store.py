@@ -0,0 +1,72 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from results_store import DEFAULT_VINTAGE, ResultsStore  # noqa: E402
+
+
+COUNTRIES = {"Athens": "Greece", "Cairo": "Egypt"}
+
+
+@pytest.fixture
+def store(tmp_path):
+    with ResultsStore(str(tmp_path / "results.sqlite"), countries=COUNTRIES) as store:
+        yield store
+
+
+def rows(store):
+    return store.conn.execute("SELECT country, city, metric, vintage, value FROM results ORDER BY 1, 2, 3, 4").fetchall()
+
+
+def test_upsert_overwrites_instead_of_duplicating(store):
+    store.upsert("Greece", "Athens", {"UEI Score": 41.0, "Total Areas": 4943})
+    store.upsert("Greece", "Athens", {"UEI Score": 42.5})
+    assert rows(store) == [("Greece", "Athens", "Total Areas", DEFAULT_VINTAGE, 4943),
+                           ("Greece", "Athens", "UEI Score", DEFAULT_VINTAGE, 42.5)]
+
+
+def test_country_comes_from_the_lookup_for_every_writer(store):
+    store.upsert("", "Athens", {"UEI Score": 41.0})
+    store.upsert(None, "Athens", {"PAQS": 70})
+    store.upsert("GRC", "Athens", {"UEI Score": 43.0})
+    assert {row[0] for row in rows(store)} == {"Greece"}
+    assert len(rows(store)) == 2
+
+
+def test_unknown_city_needs_a_country(store):
+    store.upsert("Germany", "Berlin", {"UEI Score": 83.24})
+    assert rows(store) == [("Germany", "Berlin", "UEI Score", DEFAULT_VINTAGE, 83.24)]
+    with pytest.raises(ValueError):
+        store.upsert("", "Lagos", {"UEI Score": 10.0})
+    with pytest.raises(ValueError):
+        store.upsert_many([("Nigeria", "Lagos", "UEI Score", None, 1.0), (" ", "Manila", "UEI Score", None, 2.0)])
+    assert not any(row[1] in ("Lagos", "Manila") for row in rows(store))  # nothing of the rejected batch is written
+
+
+def test_nan_and_numpy_values_are_stored_as_null_and_numbers(store):
+    np = pytest.importorskip("numpy")
+    store.upsert("", "Cairo", {"a": np.float64(1.5), "b": np.int64(3), "c": float("nan"), "d": None})
+    assert [row[4] for row in rows(store)] == [1.5, 3, None, None]
+
+
+def test_table_takes_the_latest_vintage_with_default_lowest(store):
+    store.upsert("", "Athens", {"UEI Score": 40.0}, vintage="2023")
+    store.upsert("", "Athens", {"UEI Score": 41.0}, vintage=DEFAULT_VINTAGE)
+    store.upsert("", "Athens", {"UEI Score": 42.0}, vintage="2024")
+    store.upsert("", "Cairo", {"UEI Score": 30.0}, vintage=DEFAULT_VINTAGE)
+
+    table = store.table(["UEI Score"]).set_index("City")
+    assert table.loc["Athens", "UEI Score"] == 42.0
+    assert table.loc["Athens", "Country"] == "Greece"
+    assert table.loc["Cairo", "UEI Score"] == 30.0
+
+    assert store.table(["UEI Score"], vintage=DEFAULT_VINTAGE).set_index("City").loc["Athens", "UEI Score"] == 41.0
+    assert store.table(["UEI Score"], vintage="2023").set_index("City").loc["Athens", "UEI Score"] == 40.0
+
+
+def test_table_is_wide_and_empty_safe(store):
+    assert list(store.table(["UEI Score", "PAQS"]).columns) == ["Country", "City", "UEI Score", "PAQS"]
+    store.upsert_frame(pd.DataFrame({"City": ["Athens", "Cairo"], "PAQS": [70, 20], "CHSS": [1, 2]}),
+                       ["PAQS", "CHSS"])
+    table = store.table(["PAQS", "CHSS"]).sort_values("City").reset_index(drop=True)
+    assert table[["Country", "City", "PAQS", "CHSS"]].values.tolist() == [["Greece", "Athens", 70, 1], ["Egypt", "Cairo", 20, 2]]
@@ -0,0 +1,78 @@
+import json
+import os
+import sys
+
+import run_pipeline
+from run_pipeline import load_config, local_imports, run_pipeline as run, script_paths
+
+
+def write_config(tmp_path, stages):
+    path = tmp_path / "pipeline.json"
+    path.write_text(json.dumps({"cwd": str(tmp_path), "state": str(tmp_path / "state.json"), "stages": stages}))
+    return load_config(str(path))
+
+
+def copy_stage(name, source, target, after=()):
+    code = f"open({target!r}, 'w').write(open({source!r}).read())"
+    return {"name": name, "command": [sys.executable, "-c", code], "after": list(after),
+            "inputs": [source], "outputs": [target]}
+
+
+def test_script_paths_include_local_imports():
+    paths = {os.path.relpath(p, run_pipeline.SCRIPTS_DIR).replace(os.sep, "/")
+             for p in script_paths({"command": ["python", "CHSS/download.py"]})}
+    assert {"CHSS/download.py", "CHSS/zonal_engine.py"} <= paths
+    assert not any("cdsapi" in p or "json" in p for p in paths)
+
+
+def test_local_imports_follow_sibling_modules(tmp_path, monkeypatch):
+    monkeypatch.setattr(run_pipeline, "SCRIPTS_DIR", str(tmp_path))
+    (tmp_path / "stage").mkdir()
+    (tmp_path / "stage" / "main.py").write_text("import os\nfrom helper import f\n\ndef g():\n    import shared\n")
+    (tmp_path / "stage" / "helper.py").write_text("import shared\n")
+    (tmp_path / "shared.py").write_text("x = 1\n")
+    found = {os.path.relpath(p, tmp_path) for p in local_imports(str(tmp_path / "stage" / "main.py"))}
+    assert found == {os.path.join("stage", "main.py"), os.path.join("stage", "helper.py"), "shared.py"}
+
+
+def test_downstream_follows_upstream_outputs_not_upstream_runs(tmp_path):
+    (tmp_path / "in.txt").write_text("1")
+    stages, state_path = write_config(tmp_path, [
+        {"name": "a", "command": [sys.executable, "-c", "open('a.txt', 'w').write('constant')"],
+         "inputs": ["in.txt"], "outputs": ["a.txt"]},
+        copy_stage("b", "a.txt", "b.txt", after=["a"]),
+    ])
+    assert run(stages, state_path) == {"a": "done", "b": "done"}
+
+    # a re-runs on a new input but writes the same output: b stays up to date
+    (tmp_path / "in.txt").write_text("2")
+    assert run(stages, state_path) == {"a": "done", "b": "skipped"}
+    assert run(stages, state_path) == {"a": "skipped", "b": "skipped"}
+
+
+def test_downstream_reruns_when_upstream_outputs_change(tmp_path):
+    (tmp_path / "in.txt").write_text("1")
+    stages, state_path = write_config(tmp_path, [
+        copy_stage("a", "in.txt", "a.txt"),
+        copy_stage("b", "a.txt", "b.txt", after=["a"]),
+    ])
+    run(stages, state_path)
+    (tmp_path / "in.txt").write_text("2")
+    assert run(stages, state_path, dry_run=True) == {"a": "would run", "b": "would run"}
+    assert run(stages, state_path) == {"a": "done", "b": "done"}
+    assert (tmp_path / "b.txt").read_text() == "2"
+
+
+def test_stage_reruns_when_its_outputs_are_missing(tmp_path):
+    (tmp_path / "in.txt").write_text("1")
+    stages, state_path = write_config(tmp_path, [copy_stage("a", "in.txt", "a.txt")])
+    run(stages, state_path)
+    os.remove(tmp_path / "a.txt")
+    assert run(stages, state_path) == {"a": "done"}
+
+
+def test_pds_and_wss_stages_declare_inputs_and_outputs():
+    stages, _ = load_config(run_pipeline.pipeline_config)
+    for name in ("pds", "wss"):
+        assert stages[name]["inputs"] and stages[name]["outputs"]
+        assert stages[name]["inputs"][0].startswith(run_pipeline.SCRIPTS_DIR)
@@ -0,0 +1,49 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+ndimage = pytest.importorskip("scipy.ndimage")
+pytest.importorskip("rasterio")
+
+from uei_scoring import access_curve, core_mask, distance_histogram  # noqa: E402
+
+
+def reference_histogram(mask_natural, mask_compact, pixel_m, max_radius_m, core=None):
+    """float64 distance transform of the whole array, binned the same way."""
+    n_bins = int(max_radius_m) + 2
+    mask_compact = core_mask(mask_compact, core)
+    if not mask_natural.any():
+        return np.bincount(np.full(int(mask_compact.sum()), n_bins - 1), minlength=n_bins)
+    width_m, height_m = pixel_m
+    distance = ndimage.distance_transform_edt(~mask_natural, sampling=(height_m, width_m))
+    metres = np.minimum(np.ceil(distance[mask_compact] - 1e-6), n_bins - 1).astype("int64")
+    return np.bincount(metres, minlength=n_bins)
+
+
+@pytest.mark.parametrize("pixel_m", [(100.0, 100.0), (76.3, 111.3), (30.0, 30.0)])
+@pytest.mark.parametrize("natural_share", [0.02, 0.2, 0.0])
+def test_distance_histogram_matches_the_float64_reference(pixel_m, natural_share):
+    rng = np.random.default_rng(7)
+    classes = rng.random((180, 140))
+    mask_natural = classes < natural_share
+    mask_compact = (classes > 0.6) & ~mask_natural
+    expected = reference_histogram(mask_natural, mask_compact, pixel_m, 1000)
+    result = distance_histogram(mask_natural, mask_compact, pixel_m, 1000)
+    assert result.dtype == np.int64
+    np.testing.assert_array_equal(result, expected)
+    assert result.sum() == mask_compact.sum()
+
+
+def test_distance_histogram_with_a_core_and_far_natural_cover():
+    mask_natural = np.zeros((200, 200), dtype=bool)
+    mask_natural[0, 0] = True                 # far outside the compact box plus margin
+    mask_natural[120, 150] = True
+    mask_compact = np.zeros_like(mask_natural)
+    mask_compact[100:110, 100:140] = True
+    core = (95, 108, 90, 200)
+    expected = reference_histogram(mask_natural, mask_compact, (100.0, 100.0), 500, core)
+    np.testing.assert_array_equal(distance_histogram(mask_natural, mask_compact, (100.0, 100.0), 500, core), expected)
+
+
+def test_access_curve_is_the_cumulative_histogram():
+    histogram = np.array([0, 2, 0, 3, 5])  # max radius 3 m, 5 beyond
+    assert access_curve(histogram, [1, 2, 3, 4]) == {1: 2, 2: 2, 3: 5}
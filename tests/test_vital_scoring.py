@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pandas")
+
+from vital_scoring import (categorize, city_key, load_config, pds_bin_scores, read_metrics, read_tables,  # noqa: E402
+                           score_table, wss_scores)
+
+WORKBOOK = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "all_data.xlsx")
+
+
+@pytest.fixture(scope="module")
+def config():
+    return load_config()
+
+
+def test_wss_bins_at_the_99_and_100_edges(config):
+    bins = config["wss"]["bins"]
+    labels = categorize([98.99, 99, 99.01, 99.5, 99.99, 100], bins)
+    assert list(labels) == ["Well-Served"] * 5 + ["Exemplary"]
+
+
+def test_wss_bins_at_the_lower_edges(config):
+    labels = categorize([0, 25, 25.01, 50, 50.01, 75, 75.01], config["wss"]["bins"])
+    assert list(labels) == ["Critical", "Critical", "Deficient", "Deficient", "Developing", "Developing", "Well-Served"]
+
+
+def test_wss_scores_just_below_100_are_not_exemplary(config):
+    score = wss_scores([100], [100], [99], config["wss"])  # 0.40 * 100 + 0.35 * 100 + 0.25 * 99
+    assert score[0] == 99.75
+    assert categorize(score, config["wss"]["bins"])[0] == "Well-Served"
+    assert categorize(wss_scores([100], [100], [100], config["wss"]), config["wss"]["bins"])[0] == "Exemplary"
+
+
+def test_pds_bins_at_the_99_and_100_edges(config):
+    bins = config["pds"]["bins"]
+    assert list(categorize([99, 99.4, 100], bins)) == ["Healthy", "Healthy", "Very Healthy"]
+    assert categorize(pds_bin_scores([99.5], config["pds"]), bins)[0] == "Very Healthy"  # categorize_rounded
+
+
+def test_pds_is_rounded_once_before_binning(config):
+    bins = config["pds"]["bins"]
+    # 75.46 displays as 75.5, but rounding that again would give 76 "Healthy"
+    assert list(pds_bin_scores([75.46, 75.5, 25.87], config["pds"])) == [75, 76, 26]
+    assert list(categorize(pds_bin_scores([75.46, 25.87], config["pds"]), bins)) == ["Moderate", "Poor"]
+
+
+def test_scores_match_the_workbook_rows(config):
+    pytest.importorskip("openpyxl")
+    pds_table = next(t for t in read_tables(WORKBOOK) if "ULS" in t.columns)
+    scored = score_table(read_metrics([WORKBOOK], config), config).set_index("City")
+    for row in pds_table.to_dict("records"):
+        city = city_key(row["City"], config["city_aliases"])
+        assert scored.loc[city, "PDS"] == pytest.approx(float(row["ULS"]), abs=0.05)
+        expected = row["ULS_Category"].strip()
+        if city == "Cairo":
+            expected = "Poor"  # the workbook binned 25.9 as Unhealthy; compute_PDS.py bins round(25.87) = 26
+        assert scored.loc[city, "PDS Category"] == expected
+
+
+def test_categorize_bounds_and_nan():
+    bins = [{"max": 10, "label": "low"}, {"below": 20, "label": "mid"}, {"min": 20, "label": "high"}]
+    assert list(categorize([10, 10.5, 19.99, 20, np.nan], bins)) == ["low", "mid", "mid", "high", ""]
+    assert list(categorize([5], bins, "description")) == [""]